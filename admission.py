@@ -0,0 +1,142 @@
+"""
+Admission control for frame analysis.
+
+A table is analyzed one frame at a time. While its frame is being
+analyzed, the newest frame that arrives for it waits in a single slot and
+replaces any older one there: a recommendation for a hand that is already
+over is worthless, so the older frame is dropped instead of queued.
+Across tables at most max_active frames are analyzed at once and at most
+max_queued wait. Past that depth, or once a frame has waited deadline
+seconds, it is rejected straight away with a hint of when to retry.
+"""
+
+import asyncio
+import math
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class Rejected(Exception):
+    """A frame was not admitted. reason is superseded, queue_full or deadline."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__({
+            "superseded": "Superseded by a newer frame for this table",
+            "queue_full": "Server busy: too many frames waiting",
+            "deadline": "Server busy: frame waited too long",
+        }[reason])
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Table:
+    __slots__ = ("active", "waiting")
+
+    def __init__(self):
+        self.active = False
+        self.waiting: Optional[asyncio.Future] = None
+
+
+class AdmissionControl:
+    """Per-table single-flight with a latest-frame-wins slot and a global bound."""
+
+    def __init__(self, max_active: int = 16, max_queued: int = 64, deadline: float = 2.0,
+                 retry_after: float = 1.0):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self.active = 0
+        self.admitted = 0
+        self.dropped = {"superseded": 0, "queue_full": 0, "deadline": 0}
+        self._tables: Dict[str, _Table] = {}
+        self._waiting: "OrderedDict[str, _Table]" = OrderedDict()  # tables with a waiting frame, oldest first
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+    async def acquire(self, table_id: str) -> None:
+        """Wait for this frame's turn. Raises Rejected if it is dropped instead."""
+        table = self._tables.get(table_id)
+        if table is None:
+            table = self._tables[table_id] = _Table()
+        # Waiting frames only outrank this one if they could start, and a
+        # free slot would already have gone to them
+        if not table.active and self.active < self.max_active:
+            self._start(table)
+            return
+
+        if table.waiting is not None:
+            # Latest frame wins: the older one gives up its place to this one
+            self._drop(table.waiting, "superseded")
+        elif len(self._waiting) >= self.max_queued:
+            self.dropped["queue_full"] += 1
+            self._discard(table_id, table)
+            raise Rejected("queue_full", self.retry_after)
+        else:
+            self._waiting[table_id] = table
+        future = asyncio.get_running_loop().create_future()
+        table.waiting = future
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.deadline)
+        except asyncio.TimeoutError:
+            if table.waiting is future:
+                self._drop(future, "deadline")
+                table.waiting = None
+                self._waiting.pop(table_id, None)
+                self._discard(table_id, table)
+        except asyncio.CancelledError:
+            # The client went away: give up the place, or the slot if it was just granted
+            if table.waiting is future:
+                table.waiting = None
+                self._waiting.pop(table_id, None)
+                self._discard(table_id, table)
+            elif future.done() and not future.cancelled() and future.exception() is None:
+                self.release(table_id)
+            raise
+        future.result()
+
+    def release(self, table_id: str) -> None:
+        """Finish the table's running frame and start the next waiting ones."""
+        table = self._tables.get(table_id)
+        if table is None or not table.active:
+            return
+        table.active = False
+        self.active -= 1
+        self._discard(table_id, table)
+        self._dispatch()
+
+    def _start(self, table: _Table) -> None:
+        table.active = True
+        self.active += 1
+        self.admitted += 1
+
+    def _drop(self, future: asyncio.Future, reason: str) -> None:
+        self.dropped[reason] += 1
+        if not future.done():
+            future.set_exception(Rejected(reason, self.retry_after))
+
+    def _discard(self, table_id: str, table: _Table) -> None:
+        if not table.active and table.waiting is None:
+            self._tables.pop(table_id, None)
+
+    def _dispatch(self) -> None:
+        for table_id, table in list(self._waiting.items()):
+            if self.active >= self.max_active:
+                break
+            if table.active:
+                continue
+            del self._waiting[table_id]
+            future, table.waiting = table.waiting, None
+            self._start(table)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        """Frames running and waiting, and how many were dropped and why."""
+        return {"active": self.active, "queued": self.queued, "admitted": self.admitted, "dropped": dict(self.dropped)}
@@ -0,0 +1,306 @@
+"""
+Append-only archive of analyzed frames.
+
+Each analyzed frame is stored with its session, the vision model's reply
+and the resulting GameState, so production sessions can be replayed
+(see replay.py) and recognition changes checked against real tables.
+
+Records are appended to numbered segment files. Each segment has an
+index of fixed-size entries (offset, length, timestamp). Readers map the
+index with mmap and jump straight to any record. A record is added to
+the index only after its bytes are written, so a crash can leave an
+unindexed tail on a segment but never an index entry without its
+record. The writer starts a new segment every time it opens, so it
+never appends after a torn tail.
+
+Request handlers only queue records. A background task writes them in
+batches after flush_every records or every flush_interval seconds.
+"""
+
+import asyncio
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from typing import Any, Iterator, List, NamedTuple, Optional
+
+# crc32 of the rest of the record, timestamp, then the lengths of the
+# session ID, image, model response and GameState JSON that follow
+_RECORD = struct.Struct("<IdHIII")
+# offset of the record in the segment, its length and timestamp
+_INDEX = struct.Struct("<QId")
+
+
+class CorruptRecord(ValueError):
+    """A record's checksum does not match its contents."""
+
+
+class ArchiveRecord(NamedTuple):
+    timestamp: float
+    session_id: str
+    image: bytes
+    model_response: Optional[str]
+    game_state: dict
+
+
+def encode_record(timestamp: float, session_id: str, image: bytes, model_response: Optional[str],
+                  game_state: bytes) -> bytes:
+    """Serialize one record; game_state is its JSON encoding."""
+    session = session_id.encode("utf-8")
+    response = model_response.encode("utf-8") if model_response is not None else b""
+    lengths = (len(session), len(image), len(response) if model_response is not None else 0xFFFFFFFF,
+               len(game_state))
+    body = b"".join((session, image, response, game_state))
+    crc = zlib.crc32(body, zlib.crc32(_RECORD.pack(0, timestamp, *lengths)[4:]))
+    return _RECORD.pack(crc, timestamp, *lengths) + body
+
+
+def decode_record(data, verify: bool = True) -> ArchiveRecord:
+    """Parse a record from bytes or a memoryview over them."""
+    crc, timestamp, session_len, image_len, response_len, state_len = _RECORD.unpack_from(data)
+    body = memoryview(data)[_RECORD.size:]
+    if verify and zlib.crc32(body, zlib.crc32(memoryview(data)[4:_RECORD.size])) != crc:
+        raise CorruptRecord("archive record checksum mismatch")
+    position = session_len + image_len
+    response = None
+    if response_len != 0xFFFFFFFF:
+        response = str(body[position:position + response_len], "utf-8")
+        position += response_len
+    return ArchiveRecord(
+        timestamp=timestamp,
+        session_id=str(body[:session_len], "utf-8"),
+        image=bytes(body[session_len:session_len + image_len]),
+        model_response=response,
+        game_state=json.loads(bytes(body[position:position + state_len])),
+    )
+
+
+def _segment_paths(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "segment-*.log")))
+
+
+def _index_path(segment_path: str) -> str:
+    return segment_path[:-len(".log")] + ".idx"
+
+
+class ArchiveWriter:
+    """Queues records on the request path and appends them in background batches."""
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, flush_interval: float = 1.0,
+                 flush_every: int = 32, max_pending: int = 256):
+        """
+        Segments roll over once they pass segment_bytes. At most max_pending
+        records wait to be written; beyond that new ones are dropped rather
+        than holding frames in memory.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.max_pending = max_pending
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self._pending = []
+        self._lock = threading.Lock()  # guards _pending
+        self._write_lock = threading.Lock()  # one flush at a time
+        self._segment = None
+        self._index = None
+        self._segment_number = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def append(self, session_id: str, image: bytes, model_response: Optional[str], game_state: Any) -> bool:
+        """
+        Queue a frame for the archive. game_state is a dict or a pydantic
+        model; it is serialized when written, not here. Returns False if
+        the frame was dropped because too many are waiting.
+        """
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((time.time(), session_id, image, model_response, game_state))
+            pending = len(self._pending)
+        if self._wake is not None and pending >= self.flush_every:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write every queued record. Returns how many were written."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            records = []
+            for timestamp, session_id, image, model_response, game_state in batch:
+                if hasattr(game_state, "model_dump_json"):
+                    state = game_state.model_dump_json().encode("utf-8")
+                else:
+                    state = json.dumps(game_state, separators=(",", ":")).encode("utf-8")
+                records.append((timestamp, encode_record(timestamp, session_id, image, model_response, state)))
+            self._write(records)
+            self.records += len(records)
+            return len(records)
+
+    def _write(self, records) -> None:
+        # Data first, then the index entries that point at it
+        while records:
+            if self._segment is None or self._segment.tell() >= self.segment_bytes:
+                self._roll()
+            offset = self._segment.tell()
+            chunk, entries = [], []
+            for timestamp, record in records:
+                if chunk and offset >= self.segment_bytes:
+                    break
+                entries.append(_INDEX.pack(offset, len(record), timestamp))
+                chunk.append(record)
+                offset += len(record)
+            records = records[len(chunk):]
+            data = b"".join(chunk)
+            self._segment.write(data)
+            self._segment.flush()
+            self._index.write(b"".join(entries))
+            self._index.flush()
+            self.bytes_written += len(data)
+
+    def _roll(self) -> None:
+        self._close_files()
+        if not self._segment_number:
+            os.makedirs(self.directory, exist_ok=True)
+            existing = _segment_paths(self.directory)
+            self._segment_number = int(os.path.basename(existing[-1])[8:-4]) if existing else 0
+        self._segment_number += 1
+        path = os.path.join(self.directory, f"segment-{self._segment_number:06d}.log")
+        self._segment = open(path, "ab")
+        self._index = open(_index_path(path), "ab")
+
+    def _close_files(self) -> None:
+        for f in (self._segment, self._index):
+            if f is not None:
+                f.close()
+        self._segment = self._index = None
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background writer, write what is queued and close the segment."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await asyncio.to_thread(self._flush_and_close)
+
+    def _flush_and_close(self) -> None:
+        self.flush()
+        with self._write_lock:
+            self._close_files()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except OSError:
+                pass  # The archive is best effort; keep serving frames
+
+    def stats(self) -> dict:
+        """Records written, waiting and dropped."""
+        return {"records": self.records, "pending": len(self._pending), "dropped": self.dropped,
+                "bytes": self.bytes_written}
+
+
+class _Segment:
+    __slots__ = ("first", "count", "data", "index")
+
+    def __init__(self, first: int, count: int, data: Optional[mmap.mmap], index: Optional[mmap.mmap]):
+        self.first = first
+        self.count = count
+        self.data = data
+        self.index = index
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ArchiveReader:
+    """
+    Random access to an archive's records by position, through mmapped
+    segments and indexes. Sees the records indexed when it was opened.
+    """
+
+    def __init__(self, directory: str, verify: bool = True):
+        self.verify = verify
+        self._segments: List[_Segment] = []
+        total = 0
+        for path in _segment_paths(directory):
+            index = _map(_index_path(path)) if os.path.exists(_index_path(path)) else None
+            count = len(index) // _INDEX.size if index is not None else 0
+            if not count:
+                if index is not None:
+                    index.close()
+                continue
+            self._segments.append(_Segment(total, count, _map(path), index))
+            total += count
+        self._firsts = [segment.first for segment in self._segments]
+        self._length = total
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int) -> ArchiveRecord:
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError("archive record out of range")
+        segment = self._segments[bisect_right(self._firsts, position) - 1]
+        offset, length, _ = _INDEX.unpack_from(segment.index, (position - segment.first) * _INDEX.size)
+        if segment.data is None or offset + length > len(segment.data):
+            raise CorruptRecord("archive index points past the end of its segment")
+        return decode_record(memoryview(segment.data)[offset:offset + length], self.verify)
+
+    def __iter__(self) -> Iterator[ArchiveRecord]:
+        for position in range(self._length):
+            yield self[position]
+
+    def timestamp(self, position: int) -> float:
+        """A record's timestamp, read from the index alone."""
+        segment = self._segments[bisect_right(self._firsts, position) - 1]
+        return _INDEX.unpack_from(segment.index, (position - segment.first) * _INDEX.size)[2]
+
+    def close(self) -> None:
+        for segment in self._segments:
+            for mapped in (segment.data, segment.index):
+                if mapped is not None:
+                    mapped.close()
+        self._segments = []
+        self._firsts = []
+        self._length = 0
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
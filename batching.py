@@ -0,0 +1,112 @@
+"""
+Micro-batching of vision requests.
+
+Frames submitted within a short window, possibly from different tables,
+are grouped and handed to a batch handler together, so several frames
+share one model request and one copy of the prompt.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+
+class MicroBatcher:
+    """
+    Collects submitted items for up to max_wait seconds, or until max_batch
+    items are waiting, then dispatches them to handler as one list. handler
+    must return one result per item, in order.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch: int = 4, max_wait: float = 0.005):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._pending = []  # (item, future)
+        self._holds = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()  # in-flight batches; the loop only keeps weak references
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result."""
+        return await self.enqueue(item)
+
+    def enqueue(self, item: Any) -> "asyncio.Future":
+        """Queue an item; the returned future resolves to its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return future
+
+    def hold(self) -> None:
+        """
+        Keep queued items back until the matching release(), other than as
+        full batches, so items a caller is still preparing can join them.
+        """
+        self._holds += 1
+
+    def release(self) -> None:
+        """Drop a hold; the last one dispatches whatever is queued."""
+        self._holds -= 1
+        if not self._holds and self._pending:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending and (not self._holds or len(self._pending) >= self.max_batch):
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            self.batches += 1
+            self.items += len(batch)
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # Already passed to the waiters; retrieved so it is not logged as unhandled
+
+    async def _run(self, batch) -> None:
+        try:
+            try:
+                results = await self.handler([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            if len(results) != len(batch):
+                error = ValueError(f"batch handler returned {len(results)} results for {len(batch)} items")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # A cancelled batch still releases its waiters
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+
+    def stats(self) -> dict:
+        """Number of dispatched batches and items."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "in_flight": len(self._tasks),
+            "holds": self._holds,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,131 @@
+"""
+Benchmark for the count store shared by worker processes.
+
+Starts N processes on one SharedCountStore database. Each process
+increments a few tables' counts, reads them back and runs frame updates
+(ShoeTracker.update inside shoe()) for a fixed time. The script reports
+increments/s and frame updates/s across all processes and the latency of
+a read, then checks that no increment was lost. The single-process
+in-memory CountStore is timed as a reference.
+
+Usage:
+    python benchmarks/bench_counts.py [--workers 4,8,16] [--seconds 3] [--output counts.json]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import build_results, check_baseline, write_results  # noqa: E402
+from persistence import CountStore, SharedCountStore  # noqa: E402
+from shoe import ShoeTracker  # noqa: E402
+from strategy import RANK_VALUES  # noqa: E402
+
+RANKS = list(RANK_VALUES)
+SUITS = ["hearts", "diamonds", "clubs", "spades"]
+TABLES = 4
+
+
+class Card:
+    __slots__ = ("rank", "suit")
+
+    def __init__(self, rank, suit):
+        self.rank, self.suit = rank, suit
+
+
+def hi_lo(rank):
+    value = RANK_VALUES[rank]
+    return 1 if value <= 6 else -1 if value >= 10 else 0
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def worker(path, mode, seconds, start, results):
+    """Run one operation mode until the deadline and report what was done."""
+    store = SharedCountStore(path, timeout=30.0)
+    rng = random.Random(os.getpid())
+    trackers = [ShoeTracker(hi_lo) for _ in range(TABLES)]
+    hands = [[Card(rng.choice(RANKS), rng.choice(SUITS)) for _ in range(3)] for _ in range(64)]
+    done = 0
+    reads = []
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        table = done % TABLES
+        if mode == "add":
+            store.add(1, f"add-{table}")
+            started = time.perf_counter()
+            store.get(f"add-{table}")
+            reads.append(time.perf_counter() - started)
+        else:
+            with store.shoe(f"frame-{table}", trackers[table]):
+                trackers[table].update(hands[done % len(hands)], [])
+        done += 1
+    results.put((done, reads))
+
+
+def run(path, processes, mode, seconds):
+    """Operations/s across all processes and the sorted read latencies."""
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(path, mode, seconds, start, results))
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    time.sleep(0.5)  # let every process open the database
+    start.set()
+    outcomes = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    done = sum(count for count, _ in outcomes)
+    reads = sorted(latency for _, latencies in outcomes for latency in latencies)
+    return done, done / seconds, reads
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="4,8,16")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    args = parser.parse_args()
+    out = sys.stderr if args.output == "-" else sys.stdout
+
+    local = CountStore(os.devnull)
+    local_ns = min(timeit.repeat(lambda: local.add(1, "t"), number=100000, repeat=5)) / 100000 * 1e9
+    print(f"in-memory CountStore (1 process): {local_ns:.0f} ns/increment", file=out)
+
+    metrics = {"local_increment_ns": local_ns}
+    for processes in [int(n) for n in args.workers.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "counts.db")
+            store = SharedCountStore(path)
+            increments, add_rate, reads = run(path, processes, "add", args.seconds)
+            total = sum(store.get(f"add-{table}") for table in range(TABLES))
+            assert total == increments, f"lost increments: {increments} sent, {total} stored"
+            _, frame_rate, _ = run(path, processes, "frame", args.seconds)
+        p50, p99 = percentile(reads, 0.5) * 1e6, percentile(reads, 0.99) * 1e6
+        print(f"{processes:3d} workers: {add_rate:9.0f} increments/s  {frame_rate:8.0f} frame updates/s  "
+              f"read p50 {p50:6.1f} us  p99 {p99:7.1f} us", file=out)
+        metrics[f"increments_per_s_{processes}"] = add_rate
+        metrics[f"frame_updates_per_s_{processes}"] = frame_rate
+        metrics[f"read_p50_us_{processes}"] = p50
+        metrics[f"read_p99_us_{processes}"] = p99
+
+    results = build_results("counts", {"workers": args.workers, "seconds": args.seconds, "tables": TABLES}, metrics)
+    write_results(results, args.output)
+    check_baseline(args.baseline, results, [name for name in metrics if "_per_s_" in name], args.tolerance)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,77 @@
+"""
+Throughput benchmark for the two frame ingestion paths.
+
+Posts the same UXGA (1600x1200) JPEG frame to /api/analyze-frame as base64
+JSON and to /frame as a raw image/jpeg body. The vision call is replaced
+with a fixed GameState so only ingestion, validation and encoding costs
+are measured.
+
+Usage:
+    python benchmarks/bench_ingest.py [--frames N] [--quality Q]
+"""
+
+import argparse
+import base64
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+import main  # noqa: E402
+
+
+def make_uxga_frame(quality):
+    """Render a noisy 1600x1200 table scene so the JPEG has a realistic size."""
+    rng = random.Random(0)
+    img = Image.effect_noise((1600, 1200), 40).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rng.randrange(0, 1400), rng.randrange(0, 1000)
+        draw.rectangle([x, y, x + 180, y + 260], fill='white', outline='black')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+
+async def fake_analyze_frame_with_gpt4(image_base64):
+    return main.GameState(total_running_count=0)
+
+
+def run(client, frames, send):
+    start = time.perf_counter()
+    for _ in range(frames):
+        response = send(client)
+        assert response.json()["success"], response.text
+    return frames / (time.perf_counter() - start)
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--quality", type=int, default=90)
+    args = parser.parse_args()
+
+    main.analyze_frame_with_gpt4 = fake_analyze_frame_with_gpt4
+    client = TestClient(main.app)
+
+    jpeg = make_uxga_frame(args.quality)
+    payload = {"image_base64": base64.b64encode(jpeg).decode('ascii')}
+    json_bytes = len(payload["image_base64"]) + len('{"image_base64": ""}')
+
+    base64_fps = run(client, args.frames, lambda c: c.post("/api/analyze-frame", json=payload))
+    raw_fps = run(client, args.frames, lambda c: c.post(
+        "/frame", content=jpeg, headers={"Content-Type": "image/jpeg"}))
+
+    print(f"frame: 1600x1200 JPEG, {len(jpeg)} bytes")
+    print(f"/api/analyze-frame (base64 JSON): {json_bytes:9d} bytes/request {base64_fps:8.1f} frames/s")
+    print(f"/frame (raw image/jpeg):          {len(jpeg):9d} bytes/request {raw_fps:8.1f} frames/s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmarks for the per-frame helpers on the request path.
+
+Times calculate_hand_value, get_strategy, calculate_running_count and
+get_recommendation over a fixed spread of hands and reports nanoseconds
+per call. Results can be written as JSON and checked against a baseline.
+
+Usage:
+    python benchmarks/bench_micro.py [--iterations N] [--output micro.json] [--baseline micro.json]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import build_results, check_baseline, write_results  # noqa: E402
+from main import Card, calculate_hand_value, calculate_running_count, get_recommendation  # noqa: E402
+from strategy import get_strategy  # noqa: E402
+
+# (player ranks, dealer upcard): hard, soft, pairs and multi-card hands
+HANDS = [
+    (["10", "6"], "9"),
+    (["A", "7"], "3"),
+    (["8", "8"], "10"),
+    (["5", "6"], "6"),
+    (["K", "Q"], "A"),
+    (["2", "3", "4", "5"], "7"),
+    (["A", "A", "5", "9"], "2"),
+]
+
+
+def cards(ranks):
+    return [Card(rank=rank, suit="spades", confidence=0.9) for rank in ranks]
+
+
+def bench(run, calls, iterations):
+    """Nanoseconds per call, best of five repeats."""
+    seconds = min(timeit.repeat(run, number=iterations, repeat=5))
+    return seconds / (iterations * calls) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    args = parser.parse_args()
+
+    hands = [(cards(ranks), Card(rank=dealer, suit="hearts", confidence=0.9)) for ranks, dealer in HANDS]
+    totals = [calculate_hand_value(player) for player, _ in hands]
+    two_card = [(dealer, ranks[0], ranks[1], calculate_hand_value(cards(ranks)))
+                for ranks, dealer in HANDS if len(ranks) == 2]
+
+    def hand_value():
+        for player, _ in hands:
+            calculate_hand_value(player)
+
+    def strategy():
+        for hand in two_card:
+            get_strategy(*hand)
+
+    def running_count():
+        for player, _ in hands:
+            calculate_running_count(player)
+
+    def recommendation():
+        for (player, dealer), total in zip(hands, totals):
+            get_recommendation(player, dealer, total)
+
+    metrics = {
+        "calculate_hand_value_ns": bench(hand_value, len(hands), args.iterations),
+        "get_strategy_ns": bench(strategy, len(two_card), args.iterations),
+        "calculate_running_count_ns": bench(running_count, len(hands), args.iterations),
+        "get_recommendation_ns": bench(recommendation, len(hands), args.iterations),
+    }
+    out = sys.stderr if args.output == "-" else sys.stdout
+    for name, ns in metrics.items():
+        print(f"{name[:-3]:26s} {ns:9.1f} ns/call", file=out)
+
+    results = build_results("micro", {"iterations": args.iterations, "hands": len(HANDS)}, metrics)
+    write_results(results, args.output)
+    check_baseline(args.baseline, results, [], args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
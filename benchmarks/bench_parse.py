@@ -0,0 +1,146 @@
+"""
+Micro-benchmark for turning a vision model response into cards.
+
+Compares the previous path (long prompt with count fields, regex JSON
+scraping, one validated Card per entry) against the compact prompt with
+structured output and the single-pass parser, reporting parse time and
+token usage per frame. Tokens are counted with tiktoken when installed,
+otherwise estimated at four characters per token.
+
+Usage:
+    python benchmarks/bench_parse.py [--iterations N]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import FRAME_PROMPT, Card, completion_options, parse_cards, parse_model_response  # noqa: E402
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+except ImportError:
+    def count_tokens(text):
+        return round(len(text) / 4)
+
+
+LEGACY_PROMPT = """Analyze this blackjack game image and identify all visible cards.
+
+        Please identify:
+        1. Player's cards (the cards in the player's hand)
+        2. Dealer's cards (the cards in the dealer's hand)
+
+        For each card, provide:
+        - Rank: A, 2, 3, 4, 5, 6, 7, 8, 9, 10, J, Q, K
+        - Suit: hearts, diamonds, clubs, or spades
+        - Confidence: your confidence level from 0.0 to 1.0
+
+        Additionally, perform Hi-Lo card counting using the following system:
+        - Cards 2, 3, 4, 5, 6 have a count value of +1
+        - Cards 7, 8, 9 have a count value of 0
+        - Cards 10, J, Q, K, A have a count value of -1
+
+        For each card, include its card counting value in a field called "count_value".
+        Also compute:
+        - player_running_count: the sum of count_value for all player cards
+        - dealer_running_count: the sum of count_value for all dealer cards
+        - total_running_count: the sum of count_value for all visible cards
+
+        Return the results in the following JSON format:
+        {
+        "player_cards": [
+            {"rank": "A", "suit": "hearts", "confidence": 0.95, "count_value": -1},
+            {"rank": "K", "suit": "spades", "confidence": 0.90, "count_value": -1}
+        ],
+        "dealer_cards": [
+            {"rank": "7", "suit": "diamonds", "confidence": 0.85, "count_value": 0}
+        ],
+        "player_running_count": -2,
+        "dealer_running_count": 0,
+        "total_running_count": -2
+        }
+
+        If you cannot clearly identify any cards, return empty arrays for player_cards and dealer_cards, and set all running counts to 0."""
+
+PLAYER = [("10", "spades", 0.95), ("6", "hearts", 0.93), ("3", "clubs", 0.9)]
+DEALER = [("9", "clubs", 0.91)]
+
+
+def legacy_response():
+    """What the model typically answered to LEGACY_PROMPT: fenced, indented, with counts."""
+    def card(rank, suit, confidence):
+        tag = "+1" if rank in "23456" else ("0" if rank in "789" else "-1")
+        return f'{{"rank": "{rank}", "suit": "{suit}", "confidence": {confidence}, "count_value": {tag}}}'
+
+    body = ",\n        ".join(card(*c) for c in PLAYER)
+    dealer = ",\n        ".join(card(*c) for c in DEALER)
+    return f"""Here is the analysis of the blackjack table:
+
+```json
+{{
+    "player_cards": [
+        {body}
+    ],
+    "dealer_cards": [
+        {dealer}
+    ],
+    "player_running_count": +1,
+    "dealer_running_count": 0,
+    "total_running_count": +1
+}}
+```"""
+
+
+def structured_response():
+    """What structured output returns for FRAME_PROMPT: the bare object."""
+    def cards(entries):
+        return [{"rank": r, "suit": s, "confidence": c} for r, s, c in entries]
+    return json.dumps({"player_cards": cards(PLAYER), "dealer_cards": cards(DEALER)})
+
+
+def legacy_parse(text):
+    """The previous parse_model_response and Card construction."""
+    match = re.search(r'```(?:json)?\s*(\{[\s\S]*?\})\s*```', text, re.IGNORECASE)
+    json_string = match.group(1) if match else re.search(r'\{[\s\S]*\}', text).group()
+    json_string = re.sub(r':\s*\+(\d+)', r': \1', json_string)
+    result = json.loads(json_string)
+    return [
+        Card(rank=card.get("rank"), suit=card.get("suit"), confidence=card.get("confidence", 0.0))
+        for key in ("player_cards", "dealer_cards") for card in result.get(key, [])
+    ]
+
+
+def structured_parse(text):
+    result = parse_model_response(text)
+    return parse_cards(result.get("player_cards")) + parse_cards(result.get("dealer_cards"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    schema = json.dumps(completion_options().get("response_format", {}))
+    cases = [
+        ("before", LEGACY_PROMPT, "", legacy_response(), legacy_parse),
+        ("after", FRAME_PROMPT, schema, structured_response(), structured_parse),
+    ]
+    for name, prompt, schema_text, response, parse in cases:
+        assert len(parse(response)) == len(PLAYER) + len(DEALER)
+        seconds = min(timeit.repeat(lambda: parse(response), number=args.iterations, repeat=5))
+        print(f"{name:6s} parse {seconds / args.iterations * 1e6:7.2f} us/frame   "
+              f"prompt {count_tokens(prompt) + count_tokens(schema_text):4d} tokens "
+              f"(schema {count_tokens(schema_text)})   output {count_tokens(response):4d} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Bytes saved and per-frame latency of preprocessing before the vision call.
+
+Runs a UXGA frame through process_frame against benchmarks/mock_openai.py
+with preprocessing off (original frame uploaded) and on (FRAME_MAX_EDGE /
+FRAME_JPEG_QUALITY / FRAME_ROI from the environment or flags).
+
+Usage:
+    python benchmarks/bench_preprocess.py [--max-edge 800] [--quality 80]
+        [--roi 0,0.2,1,1] [--uplink-mbps 20]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image  # noqa: E402
+
+from benchmarks.bench_ingest import make_uxga_frame  # noqa: E402
+from benchmarks.load_openai import start_mock_server  # noqa: E402
+from imaging import PreprocessConfig, parse_roi, preprocess_frame  # noqa: E402
+
+
+async def end_to_end(main, jpeg, config, frames):
+    main.preprocess_config = config
+    start = time.perf_counter()
+    for _ in range(frames):
+        response = await main.process_frame(jpeg)
+        assert response.success, response.error
+    return (time.perf_counter() - start) / frames * 1000
+
+
+async def run(args, jpeg):
+    import main
+    main.frame_cache.max_entries = 0
+
+    off = PreprocessConfig(max_edge=0)
+    on = PreprocessConfig(max_edge=args.max_edge, roi=parse_roi(args.roi), jpeg_quality=args.quality)
+    off_ms = await end_to_end(main, jpeg, off, args.frames)
+    on_ms = await end_to_end(main, jpeg, on, args.frames)
+    await main.get_openai_client().close()
+    return off_ms, on_ms, on
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-edge", type=int, default=800)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--roi", default=None)
+    parser.add_argument("--source-quality", type=int, default=90)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+
+    jpeg = make_uxga_frame(args.source_quality)
+    config = PreprocessConfig(max_edge=args.max_edge, roi=parse_roi(args.roi), jpeg_quality=args.quality)
+    start = time.perf_counter()
+    reduced = preprocess_frame(Image.open(io.BytesIO(jpeg)), jpeg, config)
+    preprocess_ms = (time.perf_counter() - start) * 1000
+
+    before = len(base64.b64encode(jpeg))
+    after = len(base64.b64encode(reduced))
+    upload = lambda size: size * 8 / (args.uplink_mbps * 1e6) * 1000  # noqa: E731
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    proc = start_mock_server(args.port, args.latency_ms)
+    try:
+        off_ms, on_ms, _ = asyncio.run(run(args, jpeg))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    size = Image.open(io.BytesIO(reduced)).size
+    print(f"preprocess: 1600x1200 -> {size[0]}x{size[1]} in {preprocess_ms:.1f} ms")
+    print(f"model payload (base64): {before} -> {after} bytes ({1 - after / before:.0%} saved)")
+    print(f"upload at {args.uplink_mbps:g} Mbit/s: {upload(before):.1f} -> {upload(after):.1f} ms")
+    print(f"end-to-end vs local mock: {off_ms:.1f} -> {on_ms:.1f} ms/frame")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,115 @@
+"""
+Throughput of the card recognition backends.
+
+Reports wall-clock frames/sec and frames per CPU-second (what one core
+sustains) for the local template recognizer, the remote vision model
+(served by benchmarks/mock_openai.py with a simulated latency) and hybrid
+mode on a mix of clear and fanned hands.
+
+Usage:
+    python benchmarks/bench_recognizers.py [--frames 200] [--latency-ms 300] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image  # noqa: E402
+
+from benchmarks.load_openai import start_mock_server  # noqa: E402
+from recognition import TemplateRecognizer, render_card  # noqa: E402
+
+
+def table_frame(fanned=False):
+    """An 800x600 JPEG, the size frames have after preprocessing."""
+    frame = Image.new("RGB", (800, 600), (30, 110, 50))
+    frame.paste(render_card("K", "spades", 110), (340, 40))
+    frame.paste(render_card("9", "hearts", 110), (250, 380))
+    frame.paste(render_card("7", "clubs", 110), (300 if fanned else 420, 390))
+    buf = io.BytesIO()
+    frame.save(buf, format="JPEG", quality=80)
+    return buf.getvalue()
+
+
+def report(name, frames, wall, cpu):
+    print(f"{name:8s} {frames / wall:9.1f} frames/s   {frames / cpu:9.1f} frames/CPU-s")
+
+
+async def run_concurrently(func, items, concurrency):
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            await func(queue.get_nowait())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def bench_local(frames):
+    recognizer = TemplateRecognizer()
+    data = table_frame()
+    recognizer.recognize(data)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(frames):
+        recognizer.recognize(data)
+    report("local", frames, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+async def bench_remote_and_hybrid(frames, concurrency):
+    import main
+
+    clear = table_frame()
+    fanned = table_frame(fanned=True)
+
+    async def remote(data):
+        await main.analyze_frame_with_gpt4(base64.b64encode(data).decode("ascii"))
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    await run_concurrently(remote, [clear] * frames, concurrency)
+    report("remote", frames, time.perf_counter() - wall, time.process_time() - cpu)
+
+    main.RECOGNIZER = "hybrid"
+    main.local_recognizer = TemplateRecognizer()
+
+    async def hybrid(data):
+        await main.recognize_frame(data, base64.b64encode(data).decode("ascii"))
+
+    mix = [clear, fanned] * (frames // 2)
+    wall, cpu = time.perf_counter(), time.process_time()
+    await run_concurrently(hybrid, mix, concurrency)
+    report("hybrid", len(mix), time.perf_counter() - wall, time.process_time() - cpu)
+    print(f"hybrid fallbacks: {main.recognizer_stats['fallbacks']} of {len(mix)} frames")
+    await main.get_openai_client().close()
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+
+    bench_local(args.frames)
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    proc = start_mock_server(args.port, args.latency_ms)
+    try:
+        asyncio.run(bench_remote_and_hybrid(args.frames, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,74 @@
+"""
+Benchmark for many concurrent table sessions.
+
+Drives process_frame for hundreds of sessions at once, each with its own
+stream of cards, and reports frames/s plus session lookup latency. The
+vision call is replaced with a generator of random hands.
+
+Usage:
+    python benchmarks/bench_sessions.py [--sessions 100,500,1000] [--frames 20]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+import main  # noqa: E402
+from persistence import CountStore  # noqa: E402
+from sessions import SessionStore  # noqa: E402
+
+RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUITS = ['hearts', 'diamonds', 'clubs', 'spades']
+
+
+async def fake_analyze_frame_with_gpt4(image_base64):
+    rng = random.Random()
+    card = lambda: main.Card(rank=rng.choice(RANKS), suit=rng.choice(SUITS), confidence=0.9)  # noqa: E731
+    return main.GameState(player_cards=[card(), card()], dealer_cards=[card()])
+
+
+async def run_sessions(jpeg, session_count, frames):
+    async def table(session_id):
+        for _ in range(frames):
+            response = await main.process_frame(jpeg, session_id=session_id)
+            assert response.success, response.error
+
+    start = time.perf_counter()
+    await asyncio.gather(*(table(f"table-{i}") for i in range(session_count)))
+    return session_count * frames / (time.perf_counter() - start)
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="100,500,1000")
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    buf = io.BytesIO()
+    Image.new('RGB', (320, 240), 'green').save(buf, format='JPEG')
+    jpeg = buf.getvalue()
+    main.analyze_frame_with_gpt4 = fake_analyze_frame_with_gpt4
+    main.frame_cache.max_entries = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for session_count in (int(n) for n in args.sessions.split(",")):
+            main.count_store = CountStore(os.path.join(tmp, "count.txt"))
+            main.sessions = SessionStore(main.create_shoe_tracker)
+            fps = asyncio.run(run_sessions(jpeg, session_count, args.frames))
+            lookup = min(timeit.repeat(lambda: main.sessions.get("table-0"), number=10000, repeat=3)) / 10000
+            print(f"{session_count:5d} sessions: {fps:9.1f} frames/s, "
+                  f"session lookup {lookup * 1e6:.2f} us, {len(main.count_store.counts)} counts tracked")
+
+
+if __name__ == "__main__":
+    benchmark()
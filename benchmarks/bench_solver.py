@@ -0,0 +1,77 @@
+"""
+Decision latency of the composition-dependent strategy solver.
+
+Cold: every decision starts from empty caches, as for the first frame
+after a new card appears. Warm: the same composition is asked again, as
+for the following frames of the same round.
+
+Usage:
+    python benchmarks/bench_solver.py [--decks N] [--repeat N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solver import Composition, StrategySolver  # noqa: E402
+
+# (player cards, dealer upcard) covering hard, soft, pair and multi-card hands
+HANDS = [
+    (['10', '6'], '10'),
+    (['10', '2'], '4'),
+    (['5', '6'], '6'),
+    (['A', '7'], '9'),
+    (['8', '8'], 'K'),
+    (['2', '2'], '7'),
+    (['3', '4', '5'], '8'),
+    (['2', '3'], 'A'),
+]
+
+
+def time_decisions(solver, decks, clear):
+    """Latency in ms of each decision in HANDS."""
+    latencies = []
+    for player, upcard in HANDS:
+        composition = Composition(decks)
+        for rank in player + [upcard]:
+            composition.remove(rank)
+        if clear:
+            solver.clear()
+        start = time.perf_counter()
+        solver.best_action(composition.key(), player, upcard)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:5s} mean {statistics.mean(latencies):8.3f} ms  p95 {p95:8.3f} ms  max {latencies[-1]:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    solver = StrategySolver()
+    cold = []
+    for _ in range(args.repeat):
+        cold += time_decisions(solver, args.decks, clear=True)
+
+    solver.clear()
+    time_decisions(solver, args.decks, clear=False)  # fill the caches
+    warm = []
+    for _ in range(args.repeat):
+        warm += time_decisions(solver, args.decks, clear=False)
+    report("cold", cold)
+    report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold-start profile of the API server.
+
+Reports how long `import main` takes and where the time goes, from
+python -X importtime: each module's own import time is charged to its
+top-level package, so the packages add up to the total. Then times
+uvicorn from process start to the first 200 from GET /health, the point
+an autoscaled replica can take traffic, over several runs.
+
+Children inherit the environment, so set PYTHONDONTWRITEBYTECODE or
+PYTHONPYCACHEPREFIX to compare cold and cached bytecode.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 12] [--env NAME=VALUE] [--output startup.json]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.results import build_results, check_baseline, write_results  # noqa: E402
+
+
+def import_profile(env):
+    """Total import time of main in ms and own import time per top-level package."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+        if name.strip() == "main":
+            total = int(cumulative_us) / 1000
+    return total, packages
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def health_ok(port):
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+            s.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            return s.recv(64).startswith(b"HTTP/1.1 200")
+    except OSError:
+        return False
+
+
+def time_to_healthy(env, timeout=30.0):
+    """Seconds from starting uvicorn until /health answers 200."""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        while time.perf_counter() - started < timeout:
+            if health_ok(port):
+                return time.perf_counter() - started
+            if proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.005)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="packages to list")
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE passed to the server")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    args = parser.parse_args()
+    out = sys.stderr if args.output == "-" else sys.stdout
+
+    extra = dict(pair.split("=", 1) for pair in args.env)
+    # The lifespan only warms the vision client when a key is configured
+    env = dict(os.environ, **{"OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-startup-benchmark")}, **extra)
+
+    profiles = [import_profile(env) for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in profiles)
+    packages = {name: statistics.median(p.get(name, 0.0) for _, p in profiles) for name in profiles[0][1]}
+    print(f"import main: {import_ms:.0f} ms (median of {args.runs})", file=out)
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:24s} {ms:7.1f} ms  {ms / import_ms:6.1%}", file=out)
+
+    healthy = sorted(time_to_healthy(env) * 1000 for _ in range(args.runs))
+    print(f"uvicorn start to first healthy /health: median {statistics.median(healthy):.0f} ms, "
+          f"min {healthy[0]:.0f} ms, max {healthy[-1]:.0f} ms", file=out)
+
+    metrics = {"import_main_ms": import_ms, "time_to_healthy_ms": statistics.median(healthy),
+               "time_to_healthy_min_ms": healthy[0]}
+    metrics.update({f"import_{name}_ms": ms for name, ms in packages.items() if ms >= 1.0})
+    results = build_results("startup", {"runs": args.runs, "env": extra}, metrics)
+    write_results(results, args.output)
+    check_baseline(args.baseline, results, [], args.tolerance)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,157 @@
+"""
+Micro-benchmark for basic strategy lookups.
+
+Compares the per-recommendation cost of the previous get_strategy, which
+built the strategy charts on every call and is copied here unchanged,
+against the precomputed table lookup.
+
+Usage:
+    python benchmarks/bench_strategy.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strategy import get_strategy  # noqa: E402
+
+# A spread of two-card hands covering hard, soft and pair lookups
+HANDS = [
+    ('7', '10', '6', 16),
+    ('A', 'A', '7', 18),
+    ('5', '8', '8', 16),
+    ('10', '9', '2', 11),
+    ('K', 'Q', 'J', 20),
+    ('6', '3', '4', 7),
+]
+
+
+def baseline_get_strategy(d, p1, p2, player_total):
+    """Previous get_strategy, copied unchanged: builds every chart on each call."""
+    hard_totals = {
+        (5, d): 'H' for d in range(2, 12)
+    } | {
+        (6, d): 'H' for d in range(2, 12)
+    } | {
+        (7, d): 'H' for d in range(2, 12)
+    } | {
+        (8, d): 'H' for d in range(2, 12)
+    } | {
+        (9, d): 'D' if d in [3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (10, d): 'D' if d not in [10, 11] else 'H' for d in range(2, 12)
+    } | {
+        (11, d): 'D' for d in range(2, 12)
+    } | {
+        (12, d): 'S' if d in [4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (13, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (14, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (15, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (16, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (17, d): 'S' for d in range(2, 12)
+    } | {
+        (18, d): 'S' for d in range(2, 12)
+    } | {
+        (19, d): 'S' for d in range(2, 12)
+    }
+
+    soft_totals = {
+        ('A,2', d): 'D' if d in [5, 6] else 'H' for d in range(2, 12)
+    } | {
+        ('A,3', d): 'D' if d in [5, 6] else 'H' for d in range(2, 12)
+    } | {
+        ('A,4', d): 'D' if d in [4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        ('A,5', d): 'D' if d in [4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        ('A,6', d): 'D' if d in [3, 4, 5, 6] else 'H' for d in range(2, 12)
+    } | {
+        ('A,7', d): 'D' if d in [2, 3, 4, 5, 6] else ('S' if d in [7, 8] else 'H') for d in range(2, 12)
+    } | {
+        ('A,8', d): 'D' if d == 6 else 'S' for d in range(2, 12)
+    } | {
+        ('A,9', d): 'S' for d in range(2, 12)
+    }
+
+    pairs = {
+        (2, 2, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
+    } | {
+        (3, 3, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
+    } | {
+        (4, 4, d): 'SP' if d in [5, 6] else 'H' for d in range(2, 12)
+    } | {
+        (5, 5, d): 'D' if d in [2, 3, 4, 5, 6, 7, 8, 9] else 'H' for d in range(2, 12)
+    } | {
+        (6, 6, d): 'SP' if d in [2, 3, 4, 5, 6] else ('H' if d in [7, 8, 9, 10, 11] else 'SP') for d in range(2, 12)
+    } | {
+        (7, 7, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
+    } | {
+        (8, 8, d): 'SP' for d in range(2, 12)
+    } | {
+        (9, 9, d): 'SP' if d in [2, 3, 4, 5, 6, 8, 9] else 'S' for d in range(2, 12)
+    } | {
+        (10, 10, d): 'S' for d in range(2, 12)
+    } | {
+        ('A', 'A', d): 'SP' for d in range(2, 12)
+    }
+
+    if p1 == 'A':
+        p1 = '11'
+    if p2 == 'A':
+        p2 = '11'
+    if d == 'A':
+        d = '11'
+
+    if p1 == 'J' or p1 == 'Q' or p1 == 'K':
+        p1 = '10'
+    if p2 == 'J' or p2 == 'Q' or p2 == 'K':
+        p2 = '10'
+    if d == 'J' or d == 'Q' or d == 'K':
+        d = '10'
+
+    if p1 == '11' or p2 == '11':
+        if p1 != '11':
+            return soft_totals[("A," + p1, int(d))]
+        elif p2 != '11':
+            return soft_totals[("A," + p2, int(d))]
+        else:
+            return pairs[('A', 'A', int(d))]
+    elif p1 == p2:
+        return pairs[(int(p1), int(p2), int(d))]
+    else:
+        return hard_totals[(player_total, int(d))]
+
+
+def bench(func, iterations):
+    """Return mean latency per recommendation in microseconds."""
+    def run():
+        for hand in HANDS:
+            func(*hand)
+    seconds = min(timeit.repeat(run, number=iterations, repeat=5))
+    return seconds / (iterations * len(HANDS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for hand in HANDS:
+        assert baseline_get_strategy(*hand) == get_strategy(*hand), hand
+    before = bench(baseline_get_strategy, max(args.iterations // 100, 1))
+    after = bench(get_strategy, args.iterations)
+    print(f"rebuild per call: {before:10.3f} us/recommendation")
+    print(f"precomputed:      {after:10.3f} us/recommendation")
+    print(f"speedup:          {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
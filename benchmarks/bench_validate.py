@@ -0,0 +1,95 @@
+"""
+Memory allocated per request on the frame ingestion paths.
+
+Calls the /api/analyze-frame (base64 JSON) and /frame (raw body, arriving
+in 64 KB chunks) handlers with a UXGA (1600x1200) JPEG, with the vision
+call replaced by a fixed GameState, and reports the peak Python memory
+allocated while each request is handled on top of the request itself,
+plus the time per request. Run it at two commits to compare validation
+paths.
+
+Usage:
+    python benchmarks/bench_validate.py [--requests N] [--quality Q]
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.bench_ingest import fake_analyze_frame_with_gpt4, make_uxga_frame  # noqa: E402
+
+CHUNK = 64 * 1024
+
+
+def raw_request(body):
+    """A /frame request whose body arrives in CHUNK-sized messages, like uvicorn delivers it."""
+    messages = [
+        {"type": "http.request", "body": body[i:i + CHUNK], "more_body": i + CHUNK < len(body)}
+        for i in range(0, len(body), CHUNK)
+    ]
+    scope = {
+        "type": "http", "method": "POST", "path": "/frame", "query_string": b"",
+        "headers": [(b"content-type", b"image/jpeg"), (b"content-length", str(len(body)).encode())],
+    }
+    pending = iter(messages)
+
+    async def receive():
+        return next(pending)
+
+    return Request(scope, receive)
+
+
+def measure(loop, handle, make_request, requests):
+    """Mean peak allocation in MB and mean ms per request."""
+    loop.run_until_complete(handle(make_request()))  # warm up imports and caches
+    peaks = []
+    elapsed = 0.0
+    tracemalloc.start()
+    for _ in range(requests):
+        request = make_request()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        response = loop.run_until_complete(handle(request))
+        elapsed += time.perf_counter() - started
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        assert response.success, response.error
+    tracemalloc.stop()
+    return sum(peaks) / len(peaks) / (1024 * 1024), elapsed / requests * 1000
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--quality", type=int, default=90)
+    args = parser.parse_args()
+
+    main.analyze_frame_with_gpt4 = fake_analyze_frame_with_gpt4
+    main.frame_cache.max_entries = 0  # every request takes the full path
+    jpeg = make_uxga_frame(args.quality)
+    encoded = base64.b64encode(jpeg).decode("ascii")
+    print(f"frame: 1600x1200 JPEG, {len(jpeg) / 2 ** 20:.2f} MB ({len(encoded) / 2 ** 20:.2f} MB base64)")
+
+    loop = asyncio.new_event_loop()
+    paths = [
+        ("/api/analyze-frame", lambda request: main.analyze_frame(request, None),
+         lambda: main.AnalyzeFrameRequest(image_base64=encoded)),
+        ("/frame", lambda request: main.ingest_frame(request, None, None), lambda: raw_request(jpeg)),
+    ]
+    for name, handle, make_request in paths:
+        peak, ms = measure(loop, handle, make_request, args.requests)
+        print(f"{name:20s} peak {peak:6.2f} MB allocated  {ms:6.1f} ms/request")
+    loop.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,303 @@
+"""
+End-to-end load test of the API server.
+
+Runs the real app (main:app) under uvicorn against benchmarks/mock_openai.py
+with a configurable model latency and error rate, replays a corpus of JPEG
+frames at a target rate (open loop) or concurrency (closed loop), and
+reports throughput, client-side tail latency (over all frames and over
+successful ones, since overload rejections return fast), the server's memory
+high-water mark and CPU time per frame, and its per-stage p95s from
+GET /metrics. Results are written as JSON (see benchmarks/results.py) and
+can be checked against a saved baseline.
+
+Open-loop latency is measured from each frame's scheduled send time, so a
+server that falls behind shows up as latency rather than as a lower send
+rate. Server CPU and memory are read from /proc and are only reported on
+Linux.
+
+Usage:
+    python benchmarks/load_app.py --concurrency 8 --frames 400
+    python benchmarks/load_app.py --rate 20 --duration 30 --error-rate 0.02 --output run.json
+    python benchmarks/load_app.py --corpus frames/ --env FRAME_CACHE_SIZE=0 --baseline run.json
+"""
+
+import argparse
+import asyncio
+import base64
+import glob
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+from PIL import Image, ImageFilter  # noqa: E402
+
+from benchmarks.load_openai import start_mock_server, start_uvicorn  # noqa: E402
+from benchmarks.results import build_results, check_baseline, write_results  # noqa: E402
+from recognition import render_card  # noqa: E402
+
+RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+SUITS = ["hearts", "diamonds", "clubs", "spades"]
+_STAGE_P95 = re.compile(r'^blackjack_stage_seconds\{stage="([^"]+)",quantile="0.95"\} (\S+)$', re.MULTILINE)
+
+
+def synthetic_corpus(count, size=(1024, 768), seed=0):
+    """Distinct table frames with random hands, JPEG encoded like the camera's."""
+    rng = random.Random(seed)
+    width, height = size
+    card_width = width // 8
+    frames = []
+    for _ in range(count):
+        frame = Image.new("RGB", size, (30, 110, 50))
+        frame = Image.blend(frame, Image.effect_noise(size, 30).convert("RGB"), 0.15)
+        for row, cards in ((0.08, rng.randint(1, 2)), (0.55, rng.randint(2, 4))):
+            x = rng.randint(width // 6, width // 3)
+            for _ in range(cards):
+                card = render_card(rng.choice(RANKS), rng.choice(SUITS), card_width)
+                frame.paste(card, (x, int(height * row) + rng.randint(-10, 10)))
+                x += card_width + rng.randint(8, 30)
+        buf = io.BytesIO()
+        frame.filter(ImageFilter.GaussianBlur(0.6)).save(buf, format="JPEG", quality=85)
+        frames.append(buf.getvalue())
+    return frames
+
+
+def load_corpus(directory):
+    paths = sorted(glob.glob(os.path.join(directory, "*.jp*g")))
+    if not paths:
+        raise SystemExit(f"no .jpg frames in {directory}")
+    frames = []
+    for path in paths:
+        with open(path, "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_memory_mb(pid, field):
+    """VmRSS or VmHWM of a process in MB, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class LoadRun:
+    """Sends frames to the app and collects per-frame outcomes."""
+
+    def __init__(self, base_url, frames, endpoint, sessions):
+        self.base_url = base_url
+        self.frames = frames
+        self.endpoint = endpoint
+        self.sessions = sessions
+        self.latencies = []
+        self.ok_latencies = []
+        self.outcomes = {}
+        self._payloads = [base64.b64encode(frame).decode("ascii") for frame in frames] \
+            if endpoint == "analyze-frame" else None
+
+    def _record(self, outcome, latency):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.latencies.append(latency)
+        if outcome == "ok":
+            self.ok_latencies.append(latency)
+
+    async def send(self, client, i, started):
+        session = f"table-{i % self.sessions}"
+        try:
+            if self.endpoint == "analyze-frame":
+                response = await client.post("/api/analyze-frame", headers={"X-Session-ID": session},
+                                             json={"image_base64": self._payloads[i % len(self.frames)]})
+            else:
+                response = await client.post(f"/frame/{session}", content=self.frames[i % len(self.frames)],
+                                             headers={"Content-Type": "image/jpeg"})
+            if response.status_code != 200:
+                outcome = f"http_{response.status_code}"
+            else:
+                outcome = "ok" if response.json().get("success") else "failed"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        self._record(outcome, time.perf_counter() - started)
+
+    async def closed_loop(self, client, concurrency, total):
+        counter = iter(range(total))
+
+        async def worker():
+            for i in counter:
+                await self.send(client, i, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(self, client, rate, total):
+        start = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(client, i, scheduled)))
+        await asyncio.gather(*tasks)
+
+
+async def drive(args, frames, pid):
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        warmup = LoadRun(base_url, frames, args.endpoint, args.sessions)
+        await warmup.closed_loop(client, min(args.concurrency or 4, args.warmup or 1), args.warmup)
+
+        run = LoadRun(base_url, frames, args.endpoint, args.sessions)
+        rss_start = process_memory_mb(pid, "VmRSS")
+        cpu_start = process_cpu_seconds(pid)
+        started = time.perf_counter()
+        if args.rate:
+            total = args.frames or int(args.rate * args.duration)
+            await run.open_loop(client, args.rate, total)
+        else:
+            total = args.frames or 200
+            await run.closed_loop(client, args.concurrency, total)
+        elapsed = time.perf_counter() - started
+        cpu_end = process_cpu_seconds(pid)
+
+        metrics_text = (await client.get("/metrics")).text
+    stages = {f"stage_{stage}_p95_ms": float(value) * 1000 for stage, value in _STAGE_P95.findall(metrics_text)}
+
+    latencies = sorted(run.latencies)
+    ok_latencies = sorted(run.ok_latencies)
+    results = {
+        "frames": total,
+        "ok": run.outcomes.get("ok", 0),
+        "error_ratio": 1 - run.outcomes.get("ok", 0) / total,
+        "duration_s": elapsed,
+        "throughput_fps": total / elapsed,
+        "latency_mean_ms": sum(latencies) / len(latencies) * 1000,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p90_ms": percentile(latencies, 0.9) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "latency_max_ms": latencies[-1] * 1000,
+        "ok_latency_p50_ms": percentile(ok_latencies, 0.5) * 1000,
+        "ok_latency_p99_ms": percentile(ok_latencies, 0.99) * 1000,
+        "rejected": run.outcomes.get("http_429", 0) + run.outcomes.get("http_503", 0),
+    }
+    if cpu_start is not None and cpu_end is not None:
+        results["server_cpu_ms_per_frame"] = (cpu_end - cpu_start) / total * 1000
+    if rss_start is not None:
+        results["server_rss_start_mb"] = rss_start
+        results["server_rss_hwm_mb"] = process_memory_mb(pid, "VmHWM")
+    results.update(stages)
+    return results, run.outcomes
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects NAME=VALUE, got {pair}")
+        env[name] = value
+    return env
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=8, help="closed loop: requests in flight")
+    load.add_argument("--rate", type=float, help="open loop: frames sent per second")
+    parser.add_argument("--frames", type=int, help="frames to send (default 200, or rate x duration)")
+    parser.add_argument("--duration", type=float, default=20.0, help="open loop seconds when --frames is not set")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--corpus", help="directory of .jpg frames (default: synthetic frames)")
+    parser.add_argument("--corpus-size", type=int, default=32)
+    parser.add_argument("--endpoint", choices=["frame", "analyze-frame"], default="frame")
+    parser.add_argument("--sessions", type=int, default=4, help="tables the frames are spread across")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE passed to the app")
+    parser.add_argument("--port", type=int, default=9100, help="mock OpenAI port")
+    parser.add_argument("--app-port", type=int, default=9200)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression as a fraction")
+    args = parser.parse_args()
+    if args.rate:
+        args.concurrency = None
+
+    frames = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.corpus_size)
+    app_env = {
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.port}/v1",
+        "OPENAI_API_KEY": "mock-key",
+        **parse_env(args.env),
+    }
+
+    mock = start_mock_server(args.port, args.latency_ms, args.error_rate)
+    try:
+        # Counts, COUNT_DB and any relative ARCHIVE_DIR go to a scratch directory, not the repo
+        with tempfile.TemporaryDirectory() as scratch:
+            app = start_uvicorn("main:app", args.app_port, app_env, ready_path="/health", cwd=scratch)
+            try:
+                metrics, outcomes = asyncio.run(drive(args, frames, app.pid))
+            finally:
+                app.terminate()
+                app.wait()
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    config = {
+        "mode": "open" if args.rate else "closed",
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "endpoint": args.endpoint,
+        "sessions": args.sessions,
+        "corpus": args.corpus or f"synthetic:{args.corpus_size}",
+        "corpus_mean_bytes": sum(map(len, frames)) // len(frames),
+        "mock_latency_ms": args.latency_ms,
+        "mock_error_rate": args.error_rate,
+        "env": parse_env(args.env),
+    }
+    results = build_results("load_app", config, metrics)
+
+    out = sys.stderr if args.output == "-" else sys.stdout
+    print(f"{metrics['frames']} frames in {metrics['duration_s']:.1f} s: {metrics['throughput_fps']:.1f} frames/s, "
+          f"outcomes {outcomes}", file=out)
+    print(f"latency ms  p50 {metrics['latency_p50_ms']:.1f}  p90 {metrics['latency_p90_ms']:.1f}  "
+          f"p99 {metrics['latency_p99_ms']:.1f}  max {metrics['latency_max_ms']:.1f}  "
+          f"(successful frames p50 {metrics['ok_latency_p50_ms']:.1f}  p99 {metrics['ok_latency_p99_ms']:.1f})",
+          file=out)
+    if "server_cpu_ms_per_frame" in metrics:
+        print(f"server      {metrics['server_cpu_ms_per_frame']:.2f} CPU-ms/frame, "
+              f"RSS {metrics['server_rss_start_mb']:.0f} MB at start, high-water {metrics['server_rss_hwm_mb']:.0f} MB",
+              file=out)
+    write_results(results, args.output)
+    check_baseline(args.baseline, results, ["throughput_fps", "ok"], args.tolerance)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,99 @@
+"""
+Load test for the shared AsyncOpenAI client.
+
+Starts benchmarks/mock_openai.py under uvicorn, points the OpenAI client at
+it and drives analyze_frame_with_gpt4 at increasing concurrency. With a
+pooled async client, requests/sec should grow with concurrency until
+OPENAI_MAX_CONCURRENCY is reached.
+
+Usage:
+    python benchmarks/load_openai.py [--latency-ms 200] [--requests 64]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def start_uvicorn(app, port, env=None, ready_path="/docs", cwd=ROOT):
+    """
+    Run app (module:attribute) under uvicorn and wait until it answers.
+    The app is imported from the repo root; cwd is where it writes files.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", ROOT, "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=dict(os.environ, **(env or {})),
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}{ready_path}")
+            return proc
+        except httpx.TransportError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError(f"{app} did not start")
+
+
+def start_mock_server(port, latency_ms, error_rate=0.0):
+    return start_uvicorn("benchmarks.mock_openai:app", port,
+                         {"MOCK_LATENCY_MS": str(latency_ms), "MOCK_ERROR_RATE": str(error_rate)})
+
+
+async def run_level(analyze, concurrency, total):
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            await analyze("")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def run(levels, total):
+    import main
+    for concurrency in levels:
+        rps = await run_level(main.analyze_frame_with_gpt4, concurrency, total)
+        print(f"concurrency {concurrency:3d}: {rps:8.1f} requests/s")
+    await main.get_openai_client().close()
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ.setdefault("OPENAI_MAX_CONCURRENCY", str(max(levels)))
+
+    proc = start_mock_server(args.port, args.latency_ms)
+    try:
+        print(f"mock latency {args.latency_ms:.0f} ms, {args.requests} requests per level")
+        asyncio.run(run(levels, args.requests))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with a canned card-detection response
+after a configurable delay, so the server can be load tested offline.
+A MOCK_ERROR_RATE fraction of requests fail with a 500 instead. Requests
+carrying several images get a {"frames": [...]} reply with one result per
+image, and usage reports rough token counts for the request and reply.
+
+Usage:
+    MOCK_LATENCY_MS=300 MOCK_ERROR_RATE=0.02 uvicorn benchmarks.mock_openai:app --port 9000
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=test python main.py
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Mock OpenAI")
+
+LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))
+# Uniform jitter of +/- this fraction of LATENCY_MS
+JITTER = float(os.getenv("MOCK_LATENCY_JITTER", "0"))
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+_random = random.Random(int(os.getenv("MOCK_SEED", "0")))
+
+# Roughly what a 512px image part costs in prompt tokens
+IMAGE_TOKENS = 255
+
+CARDS = {
+    "player_cards": [
+        {"rank": "10", "suit": "spades", "confidence": 0.95},
+        {"rank": "6", "suit": "hearts", "confidence": 0.93},
+    ],
+    "dealer_cards": [
+        {"rank": "9", "suit": "clubs", "confidence": 0.91},
+    ],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    latency = LATENCY_MS * (1 + JITTER * (2 * _random.random() - 1))
+    await asyncio.sleep(max(latency, 0) / 1000)
+    if _random.random() < ERROR_RATE:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "mock upstream error", "type": "server_error", "code": None}},
+        )
+
+    parts = [part for message in body.get("messages", []) for part in message.get("content", [])
+             if isinstance(part, dict)]
+    images = sum(1 for part in parts if part.get("type") == "image_url")
+    text = "".join(part.get("text", "") for part in parts)
+    content = json.dumps({"frames": [CARDS] * images} if images > 1 else CARDS)
+    prompt_tokens = estimate_tokens(text) + IMAGE_TOKENS * images
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
@@ -0,0 +1,86 @@
+"""
+Machine-readable benchmark results.
+
+Benchmarks write one JSON document per run: what was run, with which
+settings and at which commit, and the flat metrics measured. compare()
+checks a run against a saved baseline so a regression fails CI-style
+(exit code 1) instead of being read off a terminal.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_VERSION = 1
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_results(benchmark: str, config: dict, metrics: Dict[str, float]) -> dict:
+    """The result document for one run. metrics maps metric name to value."""
+    return {
+        "schema": SCHEMA_VERSION,
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "metrics": metrics,
+    }
+
+
+def write_results(results: dict, path: Optional[str]) -> None:
+    """Write results as JSON to path, or to stdout when path is "-"."""
+    if not path:
+        return
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+def compare(baseline: dict, current: dict, higher_is_better: List[str], tolerance: float) -> List[str]:
+    """
+    Metrics of current that are more than tolerance (a fraction) worse than
+    baseline. Metrics are lower-is-better unless named in higher_is_better.
+    Returns one description per regression.
+    """
+    regressions = []
+    for name, value in current["metrics"].items():
+        before = baseline.get("metrics", {}).get(name)
+        if not isinstance(before, (int, float)) or not isinstance(value, (int, float)) or before <= 0:
+            continue
+        change = (value - before) / before
+        worse = -change if name in higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {before:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+
+def check_baseline(path: Optional[str], current: dict, higher_is_better: List[str], tolerance: float) -> None:
+    """Compare against the baseline file at path, if any, exiting 1 on regressions."""
+    if not path:
+        return
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, higher_is_better, tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions beyond {tolerance:.0%} against {path}", file=sys.stderr)
@@ -0,0 +1,195 @@
+"""
+Push of game state changes to subscribed clients.
+
+Clients subscribe to a table (session) over a WebSocket. Each analyzed
+frame's GameState is compared field by field with the last one published
+for that table and only the fields that changed are sent. The message is
+serialized once and the same text is queued for every subscriber, so
+fanning out to many phones costs one json.dumps and a queue append each.
+
+Messages:
+    {"type": "snapshot", "session_id": ..., "seq": n, "state": {...}}
+    {"type": "diff", "session_id": ..., "seq": n, "changes": {...}}
+
+seq increases by one per diff. A client that sees a gap, or falls more
+than max_pending messages behind, gets a fresh snapshot instead.
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+CARD_FIELDS = ("player_cards", "dealer_cards")
+
+
+def _cards_key(cards) -> Optional[tuple]:
+    # Confidence wobbles from frame to frame; only rank and suit are news
+    if cards is None:
+        return None
+    return tuple((card.get("rank"), card.get("suit")) for card in cards)
+
+
+def diff_states(old: Optional[dict], new: dict) -> dict:
+    """Fields of new that differ from old. Fields missing from new are reported as None."""
+    if old is None:
+        return dict(new)
+    changes = {}
+    for field in new.keys() | old.keys():
+        before, after = old.get(field), new.get(field)
+        if field in CARD_FIELDS:
+            if _cards_key(before) != _cards_key(after):
+                changes[field] = after
+        elif before != after:
+            changes[field] = after
+    return changes
+
+
+def _encode(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"))
+
+
+class Subscription:
+    """One client's queue of encoded messages for a table."""
+
+    __slots__ = ("session_id", "hub", "pending", "resync", "dropped", "_ready")
+
+    def __init__(self, session_id: str, hub: "StateHub"):
+        self.session_id = session_id
+        self.hub = hub
+        self.pending = deque()
+        self.resync = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def put(self, text: str) -> None:
+        if len(self.pending) >= self.hub.max_pending:
+            # Too far behind for diffs to catch up; send the whole state next
+            self.dropped += len(self.pending)
+            self.pending.clear()
+            self.resync = True
+        else:
+            self.pending.append(text)
+        self._ready.set()
+
+    def request_resync(self) -> None:
+        """Replace whatever is queued with a fresh snapshot."""
+        self.pending.clear()
+        self.resync = True
+        self._ready.set()
+
+    async def get(self) -> str:
+        """Next message to send, waiting for one if needed."""
+        while True:
+            if self.resync:
+                # The snapshot is taken now, so it already covers anything queued
+                self.resync = False
+                self.pending.clear()
+                return self.hub.snapshot(self.session_id)
+            if self.pending:
+                return self.pending.popleft()
+            self._ready.clear()
+            await self._ready.wait()
+
+
+class _Table:
+    __slots__ = ("state", "seq", "subscribers", "snapshot")
+
+    def __init__(self):
+        self.state: Optional[dict] = None
+        self.seq = 0
+        self.subscribers: Set[Subscription] = set()
+        self.snapshot: Optional[str] = None  # encoded snapshot of state at seq
+
+
+class StateHub:
+    """
+    Latest published state and subscribers per table. All methods must be
+    called from the event loop thread.
+    """
+
+    def __init__(self, max_pending: int = 32):
+        self.max_pending = max_pending
+        self.published = 0
+        self.messages = 0
+        self._tables: Dict[str, _Table] = {}
+
+    def subscribe(self, session_id: str) -> Subscription:
+        """Subscribe to a table; the first message is a snapshot of its state."""
+        table = self._tables.get(session_id)
+        if table is None:
+            table = self._tables[session_id] = _Table()
+        subscription = Subscription(session_id, self)
+        table.subscribers.add(subscription)
+        subscription.request_resync()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        table = self._tables.get(subscription.session_id)
+        if table is None:
+            return
+        table.subscribers.discard(subscription)
+        if not table.subscribers and table.state is None:
+            del self._tables[subscription.session_id]
+
+    def snapshot(self, session_id: str) -> str:
+        """Encoded snapshot message of a table's current state."""
+        table = self._tables.get(session_id) or _Table()
+        if table.snapshot is None:
+            table.snapshot = _encode({
+                "type": "snapshot", "session_id": session_id, "seq": table.seq, "state": table.state or {},
+            })
+        return table.snapshot
+
+    def publish(self, session_id: str, state: Dict[str, Any]) -> int:
+        """
+        Record a table's new state and push the changed fields to its
+        subscribers. Returns the number of subscribers notified.
+        """
+        table = self._tables.get(session_id)
+        if table is None:
+            table = self._tables[session_id] = _Table()
+        return self._push(session_id, table, diff_states(table.state, state), state)
+
+    def patch(self, session_id: str, fields: Dict[str, Any]) -> int:
+        """Change some fields of a table's state, e.g. counts after a reset."""
+        table = self._tables.get(session_id)
+        if table is None or table.state is None:
+            return 0
+        state = dict(table.state, **fields)
+        return self._push(session_id, table, diff_states(table.state, state), state)
+
+    def _push(self, session_id: str, table: _Table, changes: dict, state: dict) -> int:
+        table.state = state
+        if not changes:
+            return 0
+        table.seq += 1
+        table.snapshot = None
+        self.published += 1
+        if not table.subscribers:
+            return 0
+        text = _encode({"type": "diff", "session_id": session_id, "seq": table.seq, "changes": changes})
+        for subscription in table.subscribers:
+            subscription.put(text)
+        self.messages += len(table.subscribers)
+        return len(table.subscribers)
+
+    def forget(self, session_id: str) -> None:
+        """Drop a table's state, keeping any connected subscribers."""
+        table = self._tables.get(session_id)
+        if table is None:
+            return
+        if table.subscribers:
+            table.state = None
+            table.snapshot = None
+        else:
+            del self._tables[session_id]
+
+    def stats(self) -> dict:
+        """Subscriber and message counters."""
+        return {
+            "tables": len(self._tables),
+            "subscribers": sum(len(table.subscribers) for table in self._tables.values()),
+            "published": self.published,
+            "messages": self.messages,
+        }
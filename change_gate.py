@@ -0,0 +1,151 @@
+"""
+Change-detection gate in front of the vision model.
+
+Each frame is reduced to a small grayscale thumbnail and compared with the
+thumbnail of the last frame that was actually analyzed. While the table
+looks the same, the previous result is reused. When it changes (a card
+landing, a hand reaching in) the gate waits until consecutive frames stop
+moving for settle_seconds, so the model sees the settled table once
+rather than every blurred frame of the motion.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+from PIL import Image
+
+from imaging import Roi
+
+
+def table_thumbnail(image: Image.Image, width: int = 64, roi: Optional[Roi] = None) -> np.ndarray:
+    """
+    Downsampled grayscale view of the table region as a float32 array in
+    [0, 1]. image must be freshly opened so JPEG frames decode as a draft.
+    """
+    image.draft('L', (width * 4, width * 4))
+    gray = image.convert('L')
+    if roi is not None:
+        w, h = gray.size
+        left, top, right, bottom = roi
+        gray = gray.crop((round(left * w), round(top * h), round(right * w), round(bottom * h)))
+    w, h = gray.size
+    height = max(1, round(width * h / w))
+    small = gray.resize((width, height), Image.BILINEAR)
+    return np.asarray(small, dtype=np.float32) / 255.0
+
+
+def frame_difference(a: np.ndarray, b: Optional[np.ndarray]) -> float:
+    """Mean absolute pixel difference in [0, 1]; 1.0 when b is missing or a different size."""
+    if b is None or a.shape != b.shape:
+        return 1.0
+    return float(np.abs(a - b).mean())
+
+
+class _GateState:
+    __slots__ = ("reference", "previous", "result", "still_since", "changed_at")
+
+    def __init__(self):
+        self.reference = None  # thumbnail of the last analyzed frame
+        self.previous = None  # thumbnail of the last frame seen
+        self.result = None  # result of the last analyzed frame
+        self.still_since = None  # when frame-to-frame motion last stopped
+        self.changed_at = None  # when the table first differed from the reference
+
+
+class ChangeGate:
+    """
+    Decides per stream (one per table session) whether a frame needs the
+    model. check() returns the previous result to reuse, or None when the
+    frame should be analyzed and then passed to record().
+
+    change_threshold: difference from the analyzed frame that counts as a change.
+    motion_threshold: difference between consecutive frames that counts as motion.
+    settle_seconds: how long motion must have stopped before analyzing a change.
+    max_wait_seconds: analyze a change anyway once it is this old.
+    """
+
+    def __init__(self, change_threshold: float = 0.03, motion_threshold: float = 0.01,
+                 settle_seconds: float = 0.2, max_wait_seconds: float = 1.5,
+                 thumbnail_width: int = 64, max_streams: int = 256):
+        self.change_threshold = change_threshold
+        self.motion_threshold = motion_threshold
+        self.settle_seconds = settle_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.thumbnail_width = thumbnail_width
+        self.max_streams = max_streams
+        self.frames = 0
+        self.analyzed = 0
+        self.skipped_unchanged = 0
+        self.skipped_moving = 0
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def thumbnail(self, image: Image.Image, roi: Optional[Roi] = None) -> np.ndarray:
+        """table_thumbnail() at this gate's thumbnail_width, for check() and record()."""
+        return table_thumbnail(image, self.thumbnail_width, roi)
+
+    def check(self, key: str, thumbnail: np.ndarray, now: Optional[float] = None) -> Optional[Any]:
+        """Previous result to reuse for this frame, or None to analyze it."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.frames += 1
+            state = self._streams.get(key)
+            if state is None:
+                state = self._streams[key] = _GateState()
+                while len(self._streams) > self.max_streams:
+                    self._streams.popitem(last=False)
+            self._streams.move_to_end(key)
+
+            motion = frame_difference(thumbnail, state.previous)
+            state.previous = thumbnail
+            if motion > self.motion_threshold or state.still_since is None:
+                state.still_since = now
+
+            if state.result is None:
+                self.analyzed += 1
+                return None
+            if frame_difference(thumbnail, state.reference) <= self.change_threshold:
+                state.changed_at = None
+                self.skipped_unchanged += 1
+                return state.result
+
+            if state.changed_at is None:
+                state.changed_at = now
+            settled = now - state.still_since >= self.settle_seconds
+            overdue = now - state.changed_at >= self.max_wait_seconds
+            if settled or overdue:
+                self.analyzed += 1
+                return None
+            self.skipped_moving += 1
+            return state.result
+
+    def record(self, key: str, thumbnail: np.ndarray, result: Any) -> None:
+        """Remember an analyzed frame and its result as the new reference."""
+        with self._lock:
+            state = self._streams.get(key)
+            if state is None:
+                return
+            state.reference = thumbnail
+            state.result = result
+            state.changed_at = None
+
+    def forget(self, key: str) -> None:
+        """Drop a stream's state, e.g. when its session ends or resets."""
+        with self._lock:
+            self._streams.pop(key, None)
+
+    def stats(self) -> dict:
+        """Frame counters and the fraction of frames that skipped the model."""
+        with self._lock:
+            skipped = self.skipped_unchanged + self.skipped_moving
+            return {
+                "frames": self.frames,
+                "analyzed": self.analyzed,
+                "skipped_unchanged": self.skipped_unchanged,
+                "skipped_moving": self.skipped_moving,
+                "skip_ratio": skipped / self.frames if self.frames else 0.0,
+                "streams": len(self._streams),
+            }
@@ -0,0 +1,146 @@
+"""
+Card counting systems, true count estimation and index-play deviations.
+
+Count systems are tables of tags indexed by card value (2-10, 11 = ace),
+so tagging a card is a single lookup for any system. Deviations from
+basic strategy are expanded at import time into tables laid out like
+strategy.STRATEGY_TABLE, so applying them is one index per decision.
+"""
+
+from typing import List, Optional, Tuple
+
+from strategy import HARD, HARD_HIT, PAIR, PAIR_HIT, RANK_VALUES, STRATEGY_TABLE, table_index
+
+CARDS_PER_DECK = 52
+MIN_DECKS_REMAINING = 0.5  # never divide by less than half a deck
+
+
+class CountSystem:
+    """
+    A counting system: one tag per card value. level is the system's tag
+    size relative to Hi-Lo, used to express its true count in Hi-Lo units
+    so one set of strategy indices serves every system.
+    """
+
+    def __init__(self, name: str, tags: Tuple[int, ...], level: int = 1):
+        self.name = name
+        self.tags = tags
+        self.level = level
+        self.rank_tags = {rank: tags[value] for rank, value in RANK_VALUES.items()}
+        # Net tag of one full deck; non-zero for unbalanced systems such as KO
+        self.imbalance = 4 * sum(tags[2:10]) + 16 * tags[10] + 4 * tags[11]
+
+    def value(self, rank: str) -> int:
+        """Tag of a card rank. Raises KeyError for an unknown rank."""
+        return self.rank_tags[rank]
+
+
+# Tags by card value:            -  -  2  3  4  5  6  7  8  9  10  A
+COUNT_SYSTEMS = {
+    "hi-lo": CountSystem("hi-lo", (0, 0, 1, 1, 1, 1, 1, 0, 0, 0, -1, -1)),
+    "ko": CountSystem("ko", (0, 0, 1, 1, 1, 1, 1, 1, 0, 0, -1, -1)),
+    "hi-opt-ii": CountSystem("hi-opt-ii", (0, 0, 1, 1, 2, 2, 1, 1, 0, 0, -2, 0), level=2),
+    "omega-ii": CountSystem("omega-ii", (0, 0, 1, 1, 2, 2, 2, 1, 0, -1, -2, 0), level=2),
+}
+
+
+def get_count_system(name: str) -> CountSystem:
+    """Look up a count system by name, raising ValueError for unknown names."""
+    try:
+        return COUNT_SYSTEMS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown count system: {name} (expected one of {', '.join(COUNT_SYSTEMS)})")
+
+
+def decks_remaining(cards_seen: int, decks: int) -> float:
+    """Estimate of undealt decks in the shoe."""
+    return max(decks * CARDS_PER_DECK - cards_seen, 0) / CARDS_PER_DECK
+
+
+def true_count(running_count: int, cards_seen: int, decks: int, system: CountSystem) -> float:
+    """
+    True count in Hi-Lo units: the running count, corrected for an
+    unbalanced system's expected drift, per deck remaining.
+    """
+    balanced = running_count - system.imbalance * cards_seen / CARDS_PER_DECK
+    remaining = max(decks_remaining(cards_seen, decks), MIN_DECKS_REMAINING)
+    return balanced / remaining / system.level
+
+
+INSURANCE_INDEX = 3
+
+
+def take_insurance(tc: float) -> bool:
+    """Insurance is the first Illustrious 18 play: take it at true count +3."""
+    return tc >= INSURANCE_INDEX
+
+
+# (hand class, player value, dealer value, index, action at or above index, action below)
+ILLUSTRIOUS_18 = [
+    (HARD, 16, 10, 0, 'S', 'H'),
+    (HARD, 15, 10, 4, 'S', 'H'),
+    (PAIR, 10, 5, 5, 'SP', 'S'),
+    (PAIR, 10, 6, 4, 'SP', 'S'),
+    (HARD, 10, 10, 4, 'D', 'H'),
+    (HARD, 12, 3, 2, 'S', 'H'),
+    (HARD, 12, 2, 3, 'S', 'H'),
+    (HARD, 11, 11, 1, 'D', 'H'),
+    (HARD, 9, 2, 1, 'D', 'H'),
+    (HARD, 10, 11, 4, 'D', 'H'),
+    (HARD, 9, 7, 3, 'D', 'H'),
+    (HARD, 16, 9, 5, 'S', 'H'),
+    (HARD, 13, 2, -1, 'S', 'H'),
+    (HARD, 12, 4, 0, 'S', 'H'),
+    (HARD, 12, 5, -2, 'S', 'H'),
+    (HARD, 12, 6, -1, 'S', 'H'),
+    (HARD, 13, 3, -2, 'S', 'H'),
+]
+
+# Late surrender plays; 'R' means surrender
+FAB_4 = [
+    (HARD, 14, 10, 3, 'R', None),
+    (HARD, 15, 10, 0, 'R', None),
+    (HARD, 15, 9, 2, 'R', None),
+    (HARD, 15, 11, 1, 'R', None),
+]
+
+
+def build_deviation_table(surrender: bool) -> List[Optional[tuple]]:
+    """
+    Expand index plays into a list parallel to STRATEGY_TABLE holding
+    (index, action at or above, action below) or None. Hit/stand plays also
+    cover hands of three or more cards. A surrender entry falls back to the
+    slot's other action (Illustrious 18 or basic).
+    """
+    table: List[Optional[tuple]] = [None] * len(STRATEGY_TABLE)
+    for hand_class, value, dealer, index, above, below in ILLUSTRIOUS_18:
+        table[table_index(hand_class, value, dealer)] = (index, above, below)
+        if hand_class == HARD and {above, below} == {'H', 'S'}:
+            table[table_index(HARD_HIT, value, dealer)] = (index, above, below)
+        elif hand_class == PAIR:
+            table[table_index(PAIR_HIT, value, dealer)] = (index, above, below)
+    if surrender:
+        for hand_class, value, dealer, index, above, _ in FAB_4:
+            slot = table_index(hand_class, value, dealer)
+            existing = table[slot]
+            if existing is None:
+                below = STRATEGY_TABLE[slot]
+            else:
+                # Below the surrender index, the Illustrious 18 play still applies
+                below = existing[1] if existing[0] <= index else existing[2]
+            table[slot] = (index, above, below)
+    return table
+
+
+DEVIATION_TABLE = build_deviation_table(surrender=False)
+SURRENDER_DEVIATION_TABLE = build_deviation_table(surrender=True)
+
+
+def apply_deviation(slot: int, action: str, tc: float, surrender: bool = False) -> str:
+    """Return the count-adjusted action for a strategy table slot."""
+    table = SURRENDER_DEVIATION_TABLE if surrender else DEVIATION_TABLE
+    deviation = table[slot]
+    if deviation is None:
+        return action
+    index, above, below = deviation
+    return above if tc >= index else below
@@ -0,0 +1,108 @@
+"""
+Perceptual-hash frame cache.
+
+Consecutive camera frames usually show the same cards, so frames whose
+difference hash is within a small Hamming distance of a recently analyzed
+frame from the same table reuse that frame's result instead of calling the
+vision model again.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Compute a difference hash of an image as a hash_size * hash_size bit int.
+
+    For JPEG images the decoder is asked for a reduced-size draft first, so
+    only a fraction of the full frame is decoded.
+    """
+    image.draft('L', (hash_size * 8, hash_size * 8))
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    row = hash_size + 1
+    for y in range(hash_size):
+        offset = y * row
+        for x in range(hash_size):
+            value = (value << 1) | (pixels[offset + x] > pixels[offset + x + 1])
+    return value
+
+
+class FrameCache:
+    """
+    LRU cache of analysis results keyed by (table, perceptual hash).
+
+    A lookup hits when a hash cached for the same table is within
+    max_distance bits of the frame's hash and the entry is younger than
+    ttl_seconds. Tables never share results, however alike their frames.
+    """
+
+    def __init__(self, max_entries: int = 64, ttl_seconds: float = 2.0, max_distance: int = 4):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (table, hash) -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, table: Hashable, frame_hash: int) -> Optional[Any]:
+        """Return the cached value for a near-identical frame of the table, or None."""
+        now = time.monotonic()
+        with self._lock:
+            expired = []
+            match = None
+            # Most recently used entries are the likeliest match
+            for key in reversed(self._entries):
+                stored_at, value = self._entries[key]
+                if now - stored_at > self.ttl_seconds:
+                    expired.append(key)
+                elif key[0] == table and bin(key[1] ^ frame_hash).count("1") <= self.max_distance:
+                    match = key
+                    break
+            for key in expired:
+                del self._entries[key]
+
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return self._entries[match][1]
+
+    def put(self, table: Hashable, frame_hash: int, value: Any) -> None:
+        """Store the analysis result for a table's frame hash."""
+        if self.max_entries <= 0:
+            return
+        key = (table, frame_hash)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current configuration."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "max_distance": self.max_distance,
+        }
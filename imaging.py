@@ -0,0 +1,174 @@
+"""
+Frame validation and preprocessing before the vision model call.
+
+Incoming frames are validated by reading the JPEG or PNG header in place,
+without decoding pixels or copying the buffer. Camera frames arrive at
+UXGA (1600x1200). The model does not need that resolution to read card
+ranks, so frames are optionally cropped to the table region, downscaled
+to a maximum edge and re-encoded as JPEG.
+"""
+
+import io
+import os
+from typing import Optional, Tuple
+
+from PIL import Image
+
+Roi = Tuple[float, float, float, float]
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Start-of-frame markers carrying the image size (not DHT, JPG or DAC)
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_JPEG_STANDALONE = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+
+class InvalidImage(ValueError):
+    """Raised when frame data is not a usable JPEG or PNG image."""
+
+
+class ImageInfo:
+    """Format and size of an image, read from its header."""
+
+    __slots__ = ("format", "width", "height")
+
+    def __init__(self, format: str, width: int, height: int):
+        self.format = format
+        self.width = width
+        self.height = height
+
+
+def _jpeg_size(data: memoryview) -> Tuple[int, int]:
+    i = 2
+    end = len(data)
+    while i + 4 <= end:
+        if data[i] != 0xFF:
+            raise InvalidImage("corrupt JPEG marker")
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            i += 2
+            continue
+        if marker == 0xDA:  # scan data before any frame header
+            break
+        if marker in _JPEG_SOF:
+            if i + 9 > end:
+                break
+            return (data[i + 7] << 8) | data[i + 8], (data[i + 5] << 8) | data[i + 6]
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    raise InvalidImage("JPEG has no frame header")
+
+
+def sniff_image(data, max_pixels: int = 0) -> ImageInfo:
+    """
+    Validate a JPEG or PNG from its header and trailer alone: the format,
+    a non-empty size within max_pixels (0 for no limit) and an intact end
+    marker. data may be any buffer; nothing is decoded or copied.
+    Raises InvalidImage otherwise.
+    """
+    view = memoryview(data)
+    if view[:2] == b"\xff\xd8":
+        width, height = _jpeg_size(view)
+        # Encoders may pad after the end-of-image marker
+        end = len(view)
+        while end > 2 and view[end - 1] == 0:
+            end -= 1
+        if view[end - 2:end] != b"\xff\xd9":
+            raise InvalidImage("truncated JPEG")
+        format = "JPEG"
+    elif view[:8] == _PNG_SIGNATURE:
+        if len(view) < 45 or view[12:16] != b"IHDR":
+            raise InvalidImage("PNG has no header chunk")
+        if view[-8:-4] != b"IEND":
+            raise InvalidImage("truncated PNG")
+        width = int.from_bytes(view[16:20], "big")
+        height = int.from_bytes(view[20:24], "big")
+        format = "PNG"
+    else:
+        raise InvalidImage("unsupported image format (expected JPEG or PNG)")
+
+    if width == 0 or height == 0:
+        raise InvalidImage("image has no pixels")
+    if max_pixels and width * height > max_pixels:
+        raise InvalidImage(f"image is {width}x{height}, larger than {max_pixels} pixels")
+    return ImageInfo(format, width, height)
+
+
+def parse_roi(value: Optional[str]) -> Optional[Roi]:
+    """
+    Parse a "left,top,right,bottom" region of interest given as fractions
+    of the frame size (e.g. "0.1,0.2,0.9,1.0"). Returns None when unset.
+    """
+    if not value:
+        return None
+    left, top, right, bottom = (float(part) for part in value.split(","))
+    if not (0.0 <= left < right <= 1.0 and 0.0 <= top < bottom <= 1.0):
+        raise ValueError(f"Invalid frame ROI: {value}")
+    return left, top, right, bottom
+
+
+class PreprocessConfig:
+    """Preprocessing settings, read from the environment by from_env()."""
+
+    def __init__(self, max_edge: int = 800, roi: Optional[Roi] = None, jpeg_quality: int = 80):
+        self.max_edge = max_edge
+        self.roi = roi
+        self.jpeg_quality = jpeg_quality
+
+    def passthrough(self, info: ImageInfo) -> bool:
+        """Whether a frame with this header can go to the model unchanged."""
+        return (self.roi is None and info.format == "JPEG"
+                and not (self.max_edge > 0 and max(info.width, info.height) > self.max_edge))
+
+    @classmethod
+    def from_env(cls) -> "PreprocessConfig":
+        return cls(
+            max_edge=int(os.getenv("FRAME_MAX_EDGE", "800")),
+            roi=parse_roi(os.getenv("FRAME_ROI")),
+            jpeg_quality=int(os.getenv("FRAME_JPEG_QUALITY", "80")),
+        )
+
+
+def preprocess_frame(image: Image.Image, image_data: bytes, config: PreprocessConfig) -> bytes:
+    """
+    Crop, downscale and re-encode a frame for the vision model.
+
+    image must be freshly opened from image_data and not yet loaded, so the
+    JPEG decoder can be asked for a reduced-size draft. Returns the original
+    bytes when the frame is already a JPEG that needs no crop or resize.
+    """
+    width, height = image.size
+    box = None
+    if config.roi is not None:
+        left, top, right, bottom = config.roi
+        box = (round(left * width), round(top * height), round(right * width), round(bottom * height))
+
+    crop_w = box[2] - box[0] if box else width
+    crop_h = box[3] - box[1] if box else height
+    scale = 1.0
+    if config.max_edge > 0 and max(crop_w, crop_h) > config.max_edge:
+        scale = config.max_edge / max(crop_w, crop_h)
+
+    if box is None and scale == 1.0 and image.format == 'JPEG':
+        return image_data
+
+    if scale < 1.0:
+        # Let the JPEG decoder skip detail we are about to throw away
+        requested = (max(1, int(width * scale)), max(1, int(height * scale)))
+        draft = image.draft('RGB', requested)
+        if draft is not None and box is not None:
+            ratio_x = image.size[0] / width
+            ratio_y = image.size[1] / height
+            box = (int(box[0] * ratio_x), int(box[1] * ratio_y), int(box[2] * ratio_x), int(box[3] * ratio_y))
+
+    frame = image.convert('RGB')
+    if box is not None:
+        frame = frame.crop(box)
+    if scale < 1.0:
+        frame.thumbnail((config.max_edge, config.max_edge), Image.BILINEAR)
+
+    buf = io.BytesIO()
+    frame.save(buf, format='JPEG', quality=config.jpeg_quality)
+    return buf.getvalue()
@@ -3,50 +3,213 @@ BlackJack Helper API
 A mobile app API to identify blackjack hands from video frames.
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, Header, HTTPException, Request, Response, UploadFile, File, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import base64
+import binascii
+import importlib
 import os
-from openai import OpenAI
 import io
 from PIL import Image
 import json
 import re
-import threading
+
+from admission import AdmissionControl, Rejected
+from archive import ArchiveWriter
+from batching import MicroBatcher
+from broadcast import StateHub
+from counting import COUNT_SYSTEMS, apply_deviation, decks_remaining, get_count_system, take_insurance, true_count
+from frame_cache import FrameCache, dhash
+from metrics import Metrics, MetricsMiddleware
+from imaging import ImageInfo, InvalidImage, PreprocessConfig, preprocess_frame, sniff_image
+from persistence import DEFAULT_SESSION, CountStore, SharedCountStore
+from sessions import SessionStore, is_valid_session_id
+from shoe import ShoeTracker
+from solver import StrategySolver
+from strategy import RANK_VALUES, STRATEGY_TABLE, hand_index, hand_total
+
+# Imported where they are used, so starting the server (and collecting the
+# tests) does not pay for the OpenAI SDK, httpx or NumPy up front
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from change_gate import ChangeGate
+    from recognition import Recognizer
+    from stream import StreamConsumer
+
+# Process-wide OpenAI client sharing one HTTP connection pool. Created in the
+# background once the app has started, or on first use.
+_openai_client: Optional["AsyncOpenAI"] = None
+
+# Limits how many vision requests are in flight at once
+_vision_semaphore = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")))
+
+
+def create_openai_client(api_key: str) -> "AsyncOpenAI":
+    """Create an AsyncOpenAI client with a tunable connection pool."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        timeout=httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", "30.0")), connect=5.0),
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+def get_openai_client() -> "AsyncOpenAI":
+    """Return the shared OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+        _openai_client = create_openai_client(api_key)
+    return _openai_client
+
+
+async def warm_up_openai_client() -> None:
+    """Import the OpenAI SDK off the event loop, then create the shared client."""
+    await asyncio.to_thread(importlib.import_module, "openai")
+    get_openai_client()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background work and shared clients on startup; close them on shutdown."""
+    global _openai_client
+    # The server answers /health while the vision client is still loading
+    warm_up = asyncio.create_task(warm_up_openai_client()) if os.getenv("OPENAI_API_KEY") else None
+    count_store.start()
+    if archive is not None:
+        archive.start()
+    if stream_consumer is not None:
+        stream_consumer.start()
+    yield
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+        await asyncio.gather(warm_up, return_exceptions=True)
+    if stream_consumer is not None:
+        await stream_consumer.close()
+    await count_store.close()
+    if archive is not None:
+        await archive.close()
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
 
 app = FastAPI(
     title="BlackJack Helper API",
     description="API for analyzing blackjack game frames and detecting cards",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Global state to track cumulative running count across API calls
-# Using file-based persistence to survive server restarts
-_count_lock = threading.Lock()
+# Running counts are tracked per session (one session per table) and
+# persisted to file to survive server restarts
 _count_file = "cumulative_count.txt"
 
-def load_cumulative_count():
-    """Load cumulative count from file, or return 0 if file doesn't exist."""
-    try:
-        if os.path.exists(_count_file):
-            with open(_count_file, 'r') as f:
-                return int(f.read().strip())
-    except (ValueError, IOError):
-        pass
-    return 0
-
-def save_cumulative_count(count):
-    """Save cumulative count to file."""
-    try:
-        with open(_count_file, 'w') as f:
-            f.write(str(count))
-    except IOError:
-        pass  # If we can't save, continue with in-memory count
+# COUNT_STORE=file keeps counts in memory and writes them behind the request
+# path, after COUNT_FLUSH_EVERY updates or every COUNT_FLUSH_INTERVAL seconds.
+# It belongs to a single process; with uvicorn --workers N use
+# COUNT_STORE=sqlite, which shares counts and shoe state through COUNT_DB.
+COUNT_STORE = os.getenv("COUNT_STORE", "file").lower()
+if COUNT_STORE == "sqlite":
+    count_store = SharedCountStore(
+        os.getenv("COUNT_DB", "cumulative_count.db"),
+        idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+        import_path=_count_file,
+    )
+elif COUNT_STORE == "file":
+    count_store = CountStore(
+        _count_file,
+        flush_interval=float(os.getenv("COUNT_FLUSH_INTERVAL", "1.0")),
+        flush_every=int(os.getenv("COUNT_FLUSH_EVERY", "50")),
+    )
+else:
+    raise ValueError(f"Unknown COUNT_STORE: {COUNT_STORE} (expected file or sqlite)")
 
-# Initialize cumulative count from file
-cumulative_running_count = load_cumulative_count()
+# With ARCHIVE_DIR set, every analyzed frame is appended to an archive with
+# the model's reply and its GameState, written in the background (replay it
+# with replay.py). Segments roll over at ARCHIVE_SEGMENT_MB.
+_archive_dir = os.getenv("ARCHIVE_DIR")
+archive: Optional[ArchiveWriter] = None
+if _archive_dir:
+    archive = ArchiveWriter(
+        _archive_dir,
+        segment_bytes=int(float(os.getenv("ARCHIVE_SEGMENT_MB", "64")) * 1024 * 1024),
+        flush_interval=float(os.getenv("ARCHIVE_FLUSH_INTERVAL", "1.0")),
+    )
+
+# Near-identical frames from the same table reuse the previous analysis instead
+# of calling the vision model again. FRAME_CACHE_SIZE=0 disables the cache.
+frame_cache = FrameCache(
+    max_entries=int(os.getenv("FRAME_CACHE_SIZE", "64")),
+    ttl_seconds=float(os.getenv("FRAME_CACHE_TTL", "2.0")),
+    max_distance=int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "4")),
+)
+
+# Card counting: COUNT_SYSTEM picks the tags (hi-lo, ko, hi-opt-ii, omega-ii),
+# SHOE_DECKS sizes the shoe for the true count. With COUNT_DEVIATIONS on,
+# recommendations follow the Illustrious 18 index plays, plus the Fab 4
+# surrenders when ALLOW_SURRENDER is set.
+count_system = get_count_system(os.getenv("COUNT_SYSTEM", "hi-lo"))
+SHOE_DECKS = int(os.getenv("SHOE_DECKS", "6"))
+COUNT_DEVIATIONS = os.getenv("COUNT_DEVIATIONS", "true").lower() in ("1", "true", "yes")
+ALLOW_SURRENDER = os.getenv("ALLOW_SURRENDER", "false").lower() in ("1", "true", "yes")
+
+# With STRATEGY_SOLVER on, recommendations come from the exact EV of each
+# action for the cards left in the session's shoe instead of the charts
+STRATEGY_SOLVER = os.getenv("STRATEGY_SOLVER", "false").lower() in ("1", "true", "yes")
+solver = StrategySolver(
+    hit_soft_17=os.getenv("DEALER_HITS_SOFT_17", "false").lower() in ("1", "true", "yes"),
+    cache_size=int(os.getenv("SOLVER_CACHE_SIZE", "256")),
+)
+
+# With CHANGE_GATE on, a session's frames only reach the model once the table
+# region changed and motion settled; other frames reuse the last result
+change_gate: Optional["ChangeGate"] = None
+if os.getenv("CHANGE_GATE", "false").lower() in ("1", "true", "yes"):
+    from change_gate import ChangeGate
+
+    change_gate = ChangeGate(
+        change_threshold=float(os.getenv("CHANGE_THRESHOLD", "0.03")),
+        motion_threshold=float(os.getenv("MOTION_THRESHOLD", "0.01")),
+        settle_seconds=float(os.getenv("CHANGE_SETTLE_MS", "200")) / 1000,
+        max_wait_seconds=float(os.getenv("CHANGE_MAX_WAIT_MS", "1500")) / 1000,
+    )
+
+# Crop/downscale/re-encode settings applied before the vision call
+preprocess_config = PreprocessConfig.from_env()
+
+# Frames larger than this are rejected before they are decoded or buffered;
+# MAX_FRAME_PIXELS bounds the decoded size as read from the image header
+MAX_FRAME_BYTES = int(os.getenv("MAX_FRAME_BYTES", str(8 * 1024 * 1024)))
+MAX_FRAME_PIXELS = int(os.getenv("MAX_FRAME_PIXELS", str(4096 * 4096)))
+
+
+class FrameTooLarge(ValueError):
+    """Raised when a frame exceeds MAX_FRAME_BYTES."""
+
+
+def decode_frame_base64(image_base64: str) -> bytes:
+    """
+    Decode a base64 frame, refusing oversized payloads before decoding.
+    a2b_base64 reads an ASCII str in place, where b64decode would first
+    copy it to bytes.
+    """
+    if len(image_base64) // 4 * 3 > MAX_FRAME_BYTES:
+        raise FrameTooLarge(f"Frame too large: over {MAX_FRAME_BYTES} bytes")
+    return binascii.a2b_base64(image_base64)
 
 # Configure CORS for mobile app access
 # Note: In production, replace "*" with specific allowed origins
@@ -58,6 +221,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency histograms, error counts and in-flight requests for
+# GET /metrics. With SERVER_TIMING on, every response also carries its own
+# stage timings in a Server-Timing header.
+metrics = Metrics()
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+app.add_middleware(MetricsMiddleware, metrics=metrics, server_timing=SERVER_TIMING)
+
 
 class Card(BaseModel):
     """Represents a detected playing card."""
@@ -73,10 +243,16 @@ class GameState(BaseModel):
     player_total: Optional[int] = Field(None, description="Player's hand total")
     dealer_total: Optional[int] = Field(None, description="Dealer's hand total")
     recommendation: Optional[str] = Field(None, description="Suggested action (hit, stand, double, split)")
-    player_running_count: Optional[int] = Field(None, description="Hi-Lo count for player cards in this frame")
-    dealer_running_count: Optional[int] = Field(None, description="Hi-Lo count for dealer cards in this frame")
-    total_running_count: Optional[int] = Field(None, description="Hi-Lo count for all visible cards in this frame")
-    cumulative_running_count: Optional[int] = Field(None, description="Cumulative Hi-Lo count across all frames")
+    player_running_count: Optional[int] = Field(None, description="Count for player cards in this frame")
+    dealer_running_count: Optional[int] = Field(None, description="Count for dealer cards in this frame")
+    total_running_count: Optional[int] = Field(None, description="Count for all visible cards in this frame")
+    cumulative_running_count: Optional[int] = Field(None, description="Running count of every card seen since the last reset")
+    cards_seen: Optional[int] = Field(None, description="Cards counted in the current shoe")
+    decks_remaining: Optional[float] = Field(None, description="Estimated decks left in the shoe")
+    true_count: Optional[float] = Field(None, description="Running count per deck remaining, in Hi-Lo units")
+    insurance: Optional[bool] = Field(None, description="Whether to take insurance, set when the dealer shows an ace")
+    # Recognizer output the state was built from, kept for the frame archive
+    _model_response: Optional[str] = PrivateAttr(default=None)
 
 
 class AnalyzeFrameRequest(BaseModel):
@@ -91,29 +267,31 @@ class AnalyzeFrameResponse(BaseModel):
     error: Optional[str] = Field(None, description="Error message if analysis failed")
 
 
+class BatchFrame(BaseModel):
+    """One frame of a batch analysis request."""
+    image_base64: str = Field(..., description="Base64 encoded image of the game frame")
+    session_id: Optional[str] = Field(None, description="Table session the frame belongs to")
+
+
+class AnalyzeBatchRequest(BaseModel):
+    """Request model for batch frame analysis."""
+    frames: List[BatchFrame] = Field(..., min_length=1, max_length=64, description="Frames to analyze")
+
+
+class AnalyzeBatchResponse(BaseModel):
+    """Response model for batch frame analysis, one result per frame in order."""
+    results: List[AnalyzeFrameResponse] = Field(..., description="Per-frame results")
+
+
 def calculate_hand_value(cards: List[Card]) -> int:
     """
     Calculate the total value of a blackjack hand.
     Aces are counted as 11 or 1 to maximize hand value without busting.
     """
-    total = 0
-    aces = 0
-    
-    for card in cards:
-        if card.rank == 'A':
-            aces += 1
-            total += 11
-        elif card.rank in ['J', 'Q', 'K']:
-            total += 10
-        else:
-            total += int(card.rank)
-    
-    # Adjust for aces if busting
-    while total > 21 and aces > 0:
-        total -= 10
-        aces -= 1
-    
-    return total
+    return hand_total(card.rank for card in cards)[0]
+
+
+_HI_LO_TAGS = COUNT_SYSTEMS["hi-lo"].rank_tags
 
 
 def get_hi_lo_count_value(rank: str) -> int:
@@ -123,346 +301,567 @@ def get_hi_lo_count_value(rank: str) -> int:
     - Cards 7, 8, 9: 0
     - Cards 10, J, Q, K, A: -1
     """
-    if rank in ['2', '3', '4', '5', '6']:
-        return 1
-    elif rank in ['7', '8', '9']:
-        return 0
-    else:  # 10, J, Q, K, A
-        return -1
+    return _HI_LO_TAGS.get(rank, -1)
+
+
+def get_count_value(rank: str) -> int:
+    """Count value of a card rank in the configured count system."""
+    return count_system.rank_tags.get(rank, -1)
 
 
 def calculate_running_count(cards: List[Card]) -> int:
     """
-    Calculate the Hi-Lo running count for a list of cards.
-    """
-    return sum(get_hi_lo_count_value(card.rank) for card in cards)
-
-def get_strategy(d, p1, p2, player_total):
-    hard_totals = {
-        (5, d): 'H' for d in range(2, 12)
-    } | {
-        (6, d): 'H' for d in range(2, 12)
-    } | {
-        (7, d): 'H' for d in range(2, 12)
-    } | {
-        (8, d): 'H' for d in range(2, 12)
-    } | {
-        (9, d): 'D' if d in [3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (10, d): 'D' if d not in [10, 11] else 'H' for d in range(2, 12)
-    } | {
-        (11, d): 'D' for d in range(2, 12)
-    } | {
-        (12, d): 'S' if d in [4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (13, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (14, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (15, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (16, d): 'S' if d in [2, 3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (17, d): 'S' for d in range(2, 12)
-    } | {
-        (18, d): 'S' for d in range(2, 12)
-    } | {
-        (19, d): 'S' for d in range(2, 12)
-    }
+    Calculate the running count for a list of cards in the configured system.
+    """
+    return sum(get_count_value(card.rank) for card in cards)
 
-    soft_totals = {
-        ('A,2', d): 'D' if d in [5, 6] else 'H' for d in range(2, 12)
-    } | {
-        ('A,3', d): 'D' if d in [5, 6] else 'H' for d in range(2, 12)
-    } | {
-        ('A,4', d): 'D' if d in [4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        ('A,5', d): 'D' if d in [4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        ('A,6', d): 'D' if d in [3, 4, 5, 6] else 'H' for d in range(2, 12)
-    } | {
-        ('A,7', d): 'D' if d in [2, 3, 4, 5, 6] else ('S' if d in [7, 8] else 'H') for d in range(2, 12)
-    } | {
-        ('A,8', d): 'D' if d == 6 else 'S' for d in range(2, 12)
-    } | {
-        ('A,9', d): 'S' for d in range(2, 12)
-    }
 
-    pairs = {
-        (2, 2, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
-    } | {
-        (3, 3, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
-    } | {
-        (4, 4, d): 'SP' if d in [5, 6] else 'H' for d in range(2, 12)
-    } | {
-        (5, 5, d): 'D' if d in [2, 3, 4, 5, 6, 7, 8, 9] else 'H' for d in range(2, 12)
-    } | {
-        (6, 6, d): 'SP' if d in [2, 3, 4, 5, 6] else ('H' if d in [7, 8, 9, 10, 11] else 'SP') for d in range(2, 12)
-    } | {
-        (7, 7, d): 'SP' if d in [2, 3, 4, 5, 6, 7] else 'H' for d in range(2, 12)
-    } | {
-        (8, 8, d): 'SP' for d in range(2, 12)
-    } | {
-        (9, 9, d): 'SP' if d in [2, 3, 4, 5, 6, 8, 9] else 'S' for d in range(2, 12)
-    } | {
-        (10, 10, d): 'S' for d in range(2, 12)
-    } | {
-        ('A', 'A', d): 'SP' for d in range(2, 12)
-    }
+def create_shoe_tracker(session_id: str) -> ShoeTracker:
+    """New tracker for a session, resuming from its saved count."""
+    return ShoeTracker(get_count_value, running_count=count_store.get(session_id), decks=SHOE_DECKS)
 
-    if p1 == 'A':
-        p1 = '11'
-    if p2 == 'A':
-        p2 = '11'
-    if d == 'A':
-        d = '11'
 
-    if p1 == 'J' or p1 == 'Q' or p1 == 'K':
-        p1 = '10'
-    if p2 == 'J' or p2 == 'Q' or p2 == 'K':
-        p2 = '10'
-    if d == 'J' or d == 'Q' or d == 'K':
-        d = '10'
+# Clients subscribed over /ws/{session_id} are pushed the fields of each
+# analyzed GameState that changed. A subscriber more than WS_MAX_PENDING
+# messages behind is sent a full snapshot instead.
+state_hub = StateHub(max_pending=int(os.getenv("WS_MAX_PENDING", "32")))
 
 
-    
-    if p1 == '11' or p2 == '11':
-        if p1 != '11':
-            return soft_totals[("A," + p1, int(d))]
-        elif p2 != '11':
-            return soft_totals[("A," + p2, int(d))]
-        else:
-            return pairs[('A', 'A', int(d))]
-    elif p1 == p2:
-        return pairs[(int(p1), int(p2), int(d))]
-    else:
-        return hard_totals[(player_total, int(d))]
+def evict_session(session_id: str) -> None:
+    count_store.remove(session_id)
+    state_hub.forget(session_id)
+    if change_gate is not None:
+        change_gate.forget(session_id)
+
+
+# Sessions idle for SESSION_IDLE_TIMEOUT seconds are dropped with their count
+sessions = SessionStore(
+    create_shoe_tracker,
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+    on_evict=evict_session,
+)
 
 
+def resolve_session_id(session_id: Optional[str]) -> str:
+    """Validate a session ID from a header or path, defaulting when absent."""
+    if not session_id:
+        return DEFAULT_SESSION
+    if not is_valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    return session_id
 
-def get_recommendation(player_cards: int, dealer_visible_card: Optional[Card], player_total: int) -> str:
+
+def get_recommendation(player_cards: int, dealer_visible_card: Optional[Card], player_total: int,
+                       true_count: Optional[float] = None) -> str:
     """
-    Get basic strategy recommendation for the player.
-    This is a simplified version of blackjack basic strategy.
+    Get basic strategy recommendation for the player's hand, whatever its
+    size. Returns None once the hand is bust.
+    With a true count, index plays override basic strategy.
     """
-    if player_cards and len(player_cards) == 2 and dealer_visible_card:
-        d = dealer_visible_card.rank
-        p1 = player_cards[0].rank
-        p2 = player_cards[1].rank
-        strategy = get_strategy(d, p1, p2, player_total)
+    if player_cards and dealer_visible_card:
+        slot = hand_index(dealer_visible_card.rank, [card.rank for card in player_cards])
+        if slot is None:
+            return None
+        strategy = STRATEGY_TABLE[slot]
+        if true_count is not None:
+            strategy = apply_deviation(slot, strategy, true_count, surrender=ALLOW_SURRENDER)
         return strategy
 
 
-async def analyze_frame_with_gpt4(image_base64: str) -> GameState:
+def apply_true_count(game_state: GameState, tracker: ShoeTracker) -> None:
+    """Fill in the shoe estimates and count-adjusted advice for a frame."""
+    tc = true_count(tracker.running_count, tracker.cards_seen, SHOE_DECKS, count_system)
+    game_state.cards_seen = tracker.cards_seen
+    game_state.decks_remaining = round(decks_remaining(tracker.cards_seen, SHOE_DECKS), 2)
+    game_state.true_count = round(tc, 2)
+    if game_state.dealer_cards and game_state.dealer_cards[0].rank == 'A':
+        game_state.insurance = take_insurance(tc)
+    if STRATEGY_SOLVER and game_state.player_cards and game_state.dealer_cards:
+        game_state.recommendation = solver.best_action(
+            tracker.composition.key(),
+            [card.rank for card in game_state.player_cards],
+            game_state.dealer_cards[0].rank,
+        )
+    elif COUNT_DEVIATIONS and game_state.player_total and game_state.dealer_cards:
+        game_state.recommendation = get_recommendation(
+            game_state.player_cards, game_state.dealer_cards[0], game_state.player_total, tc
+        )
+
+
+def count_frame(session_id: str, game_state: GameState) -> None:
     """
-    Use GPT-4 Vision API to analyze the game frame and detect cards.
+    Count only the cards that newly appeared in a frame and fill in its
+    count fields. Holds the session's lock; the count store saves the
+    result and, when shared, syncs the shoe with other workers.
+    """
+    session = sessions.get(session_id)
+    with session.lock:
+        tracker = session.tracker
+        with count_store.shoe(session_id, tracker):
+            tracker.update(game_state.player_cards, game_state.dealer_cards)
+        game_state.cumulative_running_count = tracker.running_count
+        apply_true_count(game_state, tracker)
+
+
+def reset_session_count(session_id: str) -> None:
+    """Reset a session's shoe and saved count."""
+    session = sessions.get(session_id)
+    with session.lock, count_store.shoe(session_id, session.tracker):
+        session.tracker.reset()
+
+
+async def run_count_store(func: Callable, *args):
     """
-    # Initialize OpenAI client
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    Run work that touches the count store. The SQLite store can wait up to
+    its busy timeout on another worker's write, so its work runs in a worker
+    thread instead of stalling the event loop; the in-memory store's runs inline.
+    """
+    if isinstance(count_store, SharedCountStore):
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+# Card detection prompt. Counts, totals and recommendations are computed
+# server-side from the detected cards, so the model only reports the cards.
+FRAME_PROMPT = """Identify every visible playing card in this blackjack game image.
+
+        player_cards: the cards in the player's hand. dealer_cards: the cards in the dealer's hand.
+        For each card give its rank (A, 2-10, J, Q, K), suit (hearts, diamonds, clubs or spades)
+        and your confidence from 0.0 to 1.0.
+
+        Reply with JSON only, for example:
+        {"player_cards": [{"rank": "A", "suit": "hearts", "confidence": 0.95}], "dealer_cards": [{"rank": "7", "suit": "diamonds", "confidence": 0.85}]}
+
+        If you cannot clearly identify any cards, return empty arrays."""
+
+CARD_RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+CARD_SUITS = ["hearts", "diamonds", "clubs", "spades"]
+
+_CARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rank": {"type": "string", "enum": CARD_RANKS},
+        "suit": {"type": "string", "enum": CARD_SUITS},
+        "confidence": {"type": "number"},
+    },
+    "required": ["rank", "suit", "confidence"],
+    "additionalProperties": False,
+}
+
+FRAME_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "player_cards": {"type": "array", "items": _CARD_SCHEMA},
+        "dealer_cards": {"type": "array", "items": _CARD_SCHEMA},
+    },
+    "required": ["player_cards", "dealer_cards"],
+    "additionalProperties": False,
+}
+
+# Structured outputs make the model emit exactly FRAME_SCHEMA. Disable for
+# OpenAI-compatible servers that do not support json_schema response formats.
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+# A frame's cards fit in well under 200 output tokens
+MAX_TOKENS_PER_FRAME = int(os.getenv("MAX_TOKENS_PER_FRAME", "400"))
+
+
+def completion_options(frame_count: int = 1) -> dict:
+    """
+    Output limit and, with STRUCTURED_OUTPUT, the strict JSON schema
+    response format for a request carrying frame_count images.
+    """
+    options = {"max_tokens": MAX_TOKENS_PER_FRAME * frame_count}
+    if not STRUCTURED_OUTPUT:
+        return options
+    if frame_count == 1:
+        name, schema = "blackjack_frame", FRAME_SCHEMA
+    else:
+        name = "blackjack_frames"
+        schema = {
+            "type": "object",
+            "properties": {"frames": {"type": "array", "items": FRAME_SCHEMA}},
+            "required": ["frames"],
+            "additionalProperties": False,
+        }
+    options["response_format"] = {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+    return options
+
+
+def batch_prompt(frame_count: int) -> str:
+    """Prompt for a request carrying several frames, one image part each."""
+    return f"""You will receive {frame_count} blackjack game images, in order.
+        Analyze each image independently, following the instructions below for every image.
+
+        {FRAME_PROMPT}
+
+        Return a single JSON object of the form {{"frames": [...]}} where "frames" holds exactly
+        {frame_count} result objects in the format above, one per image, in the same order as the images."""
+
+
+def image_part(image_base64: str) -> dict:
+    """Chat message content part carrying one JPEG frame."""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/jpeg;base64,{image_base64}"
+        }
+    }
+
+
+# Token usage reported by the vision model, for /api/cache-stats
+model_usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def record_usage(response) -> None:
+    """Add a chat completion's token usage to model_usage."""
+    model_usage["requests"] += 1
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        model_usage["prompt_tokens"] += usage.prompt_tokens or 0
+        model_usage["completion_tokens"] += usage.completion_tokens or 0
+
+
+_json_decoder = json.JSONDecoder()
+_PLUS_NUMBER = re.compile(r':\s*\+(\d)')
+
+
+def parse_model_response(result_text: str) -> dict:
+    """
+    Extract the JSON object from a model response in a single pass.
+    Returns an empty result if the response contains no JSON.
+    """
+    # Structured output: the whole response is the object
+    try:
+        result_json = json.loads(result_text)
+    except json.JSONDecodeError:
+        result_json = None
+    if isinstance(result_json, dict):
+        return result_json
+
+    # Otherwise decode the first object in the text, skipping any
+    # explanation or markdown fence the model wrapped it in
+    start = result_text.find("{")
+    if start < 0:
+        return {"player_cards": [], "dealer_cards": []}
+    try:
+        return _json_decoder.raw_decode(result_text, start)[0]
+    except json.JSONDecodeError as e:
+        # Older prompts had models write counts as +1, which JSON rejects
+        repaired = _PLUS_NUMBER.sub(r': \1', result_text[start:])
+        try:
+            return _json_decoder.raw_decode(repaired)[0]
+        except json.JSONDecodeError:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to parse JSON from GPT-4 response. Error: {str(e)}. Response preview: {result_text[:200]}"
+            )
+
+
+def parse_cards(items) -> List[Card]:
+    """
+    Cards from a parsed card array. Entries that are not a card with a
+    known rank are dropped rather than failing the whole frame.
+    """
+    cards = []
+    if not isinstance(items, list):
+        return cards
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        rank = str(item.get("rank", "")).strip().upper()
+        if rank not in RANK_VALUES:
+            continue
+        confidence = item.get("confidence", 0.0)
+        if not isinstance(confidence, (int, float)):
+            confidence = 0.0
+        cards.append(Card.model_construct(
+            rank=rank,
+            suit=str(item.get("suit", "")).strip().lower(),
+            confidence=min(max(float(confidence), 0.0), 1.0),
+        ))
+    return cards
+
+
+def build_game_state(result_json: dict) -> GameState:
+    """Build a GameState from one frame's parsed model output."""
+    player_cards = parse_cards(result_json.get("player_cards"))
+    dealer_cards = parse_cards(result_json.get("dealer_cards"))
+
+    # Calculate totals
+    player_total = calculate_hand_value(player_cards) if player_cards else None
+    dealer_total = calculate_hand_value(dealer_cards) if dealer_cards else None
     
-    client = OpenAI(api_key=api_key)
+    # Get recommendation
+    recommendation = None
+    if player_total and dealer_cards:
+        recommendation = get_recommendation(player_cards, dealer_cards[0], player_total)
     
-    # Construct the prompt for GPT-4 Vision
-#     prompt = """Analyze this blackjack game image and identify all visible cards.
-
-# Please identify:
-# 1. Player's cards (the cards in the player's hand)
-# 2. Dealer's cards (the cards in the dealer's hand)
-
-# For each card, provide:
-# - Rank: A, 2, 3, 4, 5, 6, 7, 8, 9, 10, J, Q, K
-# - Suit: hearts, diamonds, clubs, or spades
-# - Confidence: your confidence level from 0.0 to 1.0
-
-# Return the results in the following JSON format:
-# {
-#   "player_cards": [
-#     {"rank": "A", "suit": "hearts", "confidence": 0.95},
-#     {"rank": "K", "suit": "spades", "confidence": 0.90}
-#   ],
-#   "dealer_cards": [
-#     {"rank": "7", "suit": "diamonds", "confidence": 0.85}
-#   ]
-# }
-
-# If you cannot clearly identify any cards, return empty arrays for player_cards and dealer_cards."""
-    prompt = """Analyze this blackjack game image and identify all visible cards.
-
-        Please identify:
-        1. Player's cards (the cards in the player's hand)
-        2. Dealer's cards (the cards in the dealer's hand)
-
-        For each card, provide:
-        - Rank: A, 2, 3, 4, 5, 6, 7, 8, 9, 10, J, Q, K
-        - Suit: hearts, diamonds, clubs, or spades
-        - Confidence: your confidence level from 0.0 to 1.0
-
-        Additionally, perform Hi-Lo card counting using the following system:
-        - Cards 2, 3, 4, 5, 6 have a count value of +1
-        - Cards 7, 8, 9 have a count value of 0
-        - Cards 10, J, Q, K, A have a count value of -1
-
-        For each card, include its card counting value in a field called "count_value".
-        Also compute:
-        - player_running_count: the sum of count_value for all player cards
-        - dealer_running_count: the sum of count_value for all dealer cards
-        - total_running_count: the sum of count_value for all visible cards
-
-        Return the results in the following JSON format:
-        {
-        "player_cards": [
-            {"rank": "A", "suit": "hearts", "confidence": 0.95, "count_value": -1},
-            {"rank": "K", "suit": "spades", "confidence": 0.90, "count_value": -1}
-        ],
-        "dealer_cards": [
-            {"rank": "7", "suit": "diamonds", "confidence": 0.85, "count_value": 0}
-        ],
-        "player_running_count": -2,
-        "dealer_running_count": 0,
-        "total_running_count": -2
-        }
+    # Card counting values are computed here, never taken from the model
+    player_running_count = calculate_running_count(player_cards) if player_cards else 0
+    dealer_running_count = calculate_running_count(dealer_cards) if dealer_cards else 0
+    total_running_count = player_running_count + dealer_running_count
+    
+    return GameState(
+        player_cards=player_cards,
+        dealer_cards=dealer_cards,
+        player_total=player_total,
+        dealer_total=dealer_total,
+        recommendation=recommendation,
+        player_running_count=player_running_count,
+        dealer_running_count=dealer_running_count,
+        total_running_count=total_running_count,
+        cumulative_running_count=None  # Will be set in the endpoint
+    )
+
 
-        If you cannot clearly identify any cards, return empty arrays for player_cards and dealer_cards, and set all running counts to 0."""
+def model_error_kind(error: Exception) -> str:
+    """Metrics label for a failed model call: parse for unreadable replies, else the exception type."""
+    if isinstance(error, HTTPException):
+        return "parse"
+    return type(error).__name__
 
 
+async def analyze_frame_with_gpt4(image_base64: str) -> GameState:
+    """
+    Use GPT-4 Vision API to analyze the game frame and detect cards.
+    """
+    client = get_openai_client()
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Updated to current vision model
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
+        with metrics.timer("queue"):
+            await _vision_semaphore.acquire()
+        try:
+            with metrics.timer("model"):
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",  # Updated to current vision model
+                    messages=[
                         {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": FRAME_PROMPT},
+                                image_part(image_base64)
+                            ]
                         }
-                    ]
-                }
-            ],
-            max_tokens=1000
-        )
-        
+                    ],
+                    **completion_options()
+                )
+        finally:
+            _vision_semaphore.release()
+        record_usage(response)
+
         # Parse the response
         result_text = response.choices[0].message.content
+        with metrics.timer("parse"):
+            result_json = parse_model_response(result_text)
+        with metrics.timer("build"):
+            game_state = build_game_state(result_json)
+        game_state._model_response = result_text
+        return game_state
         
-        # Extract JSON from the response (GPT-4 might add explanation text or markdown)
-        result_json = None
-        json_string = None
-        
-        # Try to extract JSON from markdown code blocks first
-        json_code_block = re.search(r'```(?:json)?\s*(\{[\s\S]*?\})\s*```', result_text, re.IGNORECASE)
-        if json_code_block:
-            json_string = json_code_block.group(1)
-        else:
-            # If that didn't work, try to find JSON object in the response
-            json_match = re.search(r'\{[\s\S]*\}', result_text)
-            if json_match:
-                json_string = json_match.group()
-        
-        # If we found JSON, try to parse it
-        if json_string:
-            # Fix common JSON issues: remove + prefix from numbers (JSON doesn't support +1, only -1)
-            # Replace +number with number (but not in strings)
-            json_string = re.sub(r':\s*\+(\d+)', r': \1', json_string)
-            
-            try:
-                result_json = json.loads(json_string)
-            except json.JSONDecodeError as e:
-                # Log the problematic JSON for debugging
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Failed to parse JSON from GPT-4 response. Error: {str(e)}. Response preview: {result_text[:200]}"
+    except Exception as e:
+        metrics.error(model_error_kind(e))
+        raise HTTPException(status_code=500, detail=f"Error analyzing frame: {str(e)}")
+
+
+async def analyze_frames_with_gpt4(images_base64: List[str]) -> List[GameState]:
+    """
+    Analyze several frames with one vision request.
+
+    Each frame becomes its own image part in a single message, and the
+    response's "frames" array is split back into one GameState per frame.
+    """
+    if len(images_base64) == 1:
+        return [await analyze_frame_with_gpt4(images_base64[0])]
+
+    client = get_openai_client()
+
+    try:
+        with metrics.timer("queue"):
+            await _vision_semaphore.acquire()
+        try:
+            with metrics.timer("model"):
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [{"type": "text", "text": batch_prompt(len(images_base64))}]
+                            + [image_part(image_base64) for image_base64 in images_base64]
+                        }
+                    ],
+                    **completion_options(len(images_base64))
                 )
-        
-        # If still no valid JSON, return empty result
-        if result_json is None:
-            result_json = {"player_cards": [], "dealer_cards": [], "player_running_count": 0, "dealer_running_count": 0, "total_running_count": 0}
-        
-        # Parse cards (filter out extra fields like count_value that aren't in Card model)
-        player_cards = [
-            Card(
-                rank=card.get("rank"),
-                suit=card.get("suit"),
-                confidence=card.get("confidence", 0.0)
-            ) for card in result_json.get("player_cards", [])
-        ]
-        dealer_cards = [
-            Card(
-                rank=card.get("rank"),
-                suit=card.get("suit"),
-                confidence=card.get("confidence", 0.0)
-            ) for card in result_json.get("dealer_cards", [])
-        ]
-        
-        # Calculate totals
-        player_total = calculate_hand_value(player_cards) if player_cards else None
-        dealer_total = calculate_hand_value(dealer_cards) if dealer_cards else None
-        
-        # Get recommendation
-        recommendation = None
-        if player_total and dealer_cards:
-            recommendation = get_recommendation(player_cards, dealer_cards[0], player_total)
-        
-        # Calculate card counting values ourselves (don't rely on GPT-4's calculation)
-        player_running_count = calculate_running_count(player_cards) if player_cards else 0
-        dealer_running_count = calculate_running_count(dealer_cards) if dealer_cards else 0
-        total_running_count = player_running_count + dealer_running_count
-        
-        return GameState(
-            player_cards=player_cards,
-            dealer_cards=dealer_cards,
-            player_total=player_total,
-            dealer_total=dealer_total,
-            recommendation=recommendation,
-            player_running_count=player_running_count,
-            dealer_running_count=dealer_running_count,
-            total_running_count=total_running_count,
-            cumulative_running_count=None  # Will be set in the endpoint
-        )
-        
+        finally:
+            _vision_semaphore.release()
+        record_usage(response)
+
+        with metrics.timer("parse"):
+            frames = parse_model_response(response.choices[0].message.content).get("frames")
+        if not isinstance(frames, list) or len(frames) != len(images_base64):
+            raise ValueError(f"expected {len(images_base64)} frames in batch response")
+        with metrics.timer("build"):
+            game_states = [build_game_state(frame) for frame in frames]
+        for game_state, frame in zip(game_states, frames):
+            game_state._model_response = json.dumps(frame)
+        return game_states
+
     except Exception as e:
+        metrics.error(model_error_kind(e))
         raise HTTPException(status_code=500, detail=f"Error analyzing frame: {str(e)}")
 
 
-@app.post("/api/analyze-frame", response_model=AnalyzeFrameResponse)
-async def analyze_frame(request: AnalyzeFrameRequest):
+# Frames waiting for the vision model are grouped into requests of up to
+# BATCH_MAX_FRAMES images. BATCH_WINDOW_MS > 0 also holds single-frame
+# requests that long so concurrent frames from several tables share a call.
+_batch_window_ms = float(os.getenv("BATCH_WINDOW_MS", "0"))
+vision_batcher = MicroBatcher(
+    lambda images: analyze_frames_with_gpt4(images),
+    max_batch=int(os.getenv("BATCH_MAX_FRAMES", "4")),
+    max_wait=_batch_window_ms / 1000,
+)
+
+
+# RECOGNIZER selects card recognition: "openai" (the vision model), "local"
+# (LOCAL_RECOGNIZER on the CPU) or "hybrid" (local first, falling back to the
+# vision model when no card or any card reads below HYBRID_MIN_CONFIDENCE)
+RECOGNIZER = os.getenv("RECOGNIZER", "openai").lower()
+if RECOGNIZER not in ("openai", "local", "hybrid"):
+    raise ValueError(f"Unknown RECOGNIZER: {RECOGNIZER} (expected openai, local or hybrid)")
+HYBRID_MIN_CONFIDENCE = float(os.getenv("HYBRID_MIN_CONFIDENCE", "0.7"))
+local_recognizer: Optional["Recognizer"] = None
+if RECOGNIZER != "openai":
+    from recognition import CardTemplates, create_recognizer
+
+    _templates_dir = os.getenv("CARD_TEMPLATES_DIR")
+    local_recognizer = create_recognizer(
+        os.getenv("LOCAL_RECOGNIZER", "template"),
+        templates=CardTemplates.from_directory(_templates_dir) if _templates_dir else None,
+    )
+recognizer_stats = {"local": 0, "remote": 0, "fallbacks": 0}
+
+
+async def recognize_frame(image_data: bytes, image_base64: str,
+                          submit: Optional[Callable[[str], Awaitable[GameState]]] = None) -> GameState:
     """
-    Process a video frame and return detected cards and game state.
-    
-    This endpoint accepts a base64-encoded image of a blackjack game frame,
-    uses GPT-4 Vision API to identify the cards, and returns the game state
-    with recommendations.
+    Detect the cards in a preprocessed frame with the configured recognizer.
+    A frame for the vision model goes to submit when given.
     """
+    if local_recognizer is not None:
+        with metrics.timer("local_recognizer"):
+            result = await asyncio.to_thread(local_recognizer.recognize, image_data)
+        if RECOGNIZER == "local" or local_recognizer.min_confidence(result) >= HYBRID_MIN_CONFIDENCE:
+            recognizer_stats["local"] += 1
+            game_state = build_game_state(result)
+            game_state._model_response = json.dumps(result)
+            return game_state
+        recognizer_stats["fallbacks"] += 1
+
+    # Analyze the frame using GPT-4 Vision
+    recognizer_stats["remote"] += 1
+    if submit is not None:
+        return await submit(image_base64)
+    if _batch_window_ms > 0:
+        return await vision_batcher.submit(image_base64)
+    return await analyze_frame_with_gpt4(image_base64)
+
+
+async def process_frame(image_data: bytes, image_base64: Optional[str] = None,
+                        session_id: str = DEFAULT_SESSION,
+                        submit: Optional[Callable[[str], Awaitable[GameState]]] = None) -> AnalyzeFrameResponse:
+    """
+    Shared analysis pipeline for every ingestion endpoint.
+
+    image_data is the raw encoded image. image_base64 may be passed when the
+    caller already holds the base64 form, so it is not encoded a second time.
+    Cards are counted against the running count of session_id. A frame for
+    the vision model is passed to submit when given, otherwise (with
+    BATCH_WINDOW_MS set) to the micro-batcher.
+    """
+    with metrics.timer("frame"):
+        return await _process_frame(image_data, image_base64, session_id, submit)
+
+
+def _prepare_frame(image_data: bytes, image_info: ImageInfo, session_id: str):
+    """
+    Decode-bound work for a frame, run in a worker thread: look it up in the
+    frame cache by hash and, on a miss, shrink it for upload (untouched
+    frames keep their bytes). Returns (frame_hash, cached_state, model_data);
+    frame_hash is None with the cache off, model_data None on a hit.
+    """
+    frame_hash = None
+    if frame_cache.max_entries > 0:
+        with metrics.timer("frame_cache"):
+            frame_hash = dhash(Image.open(io.BytesIO(image_data)))
+            cached_state = frame_cache.get(session_id, frame_hash)
+        if cached_state is not None:
+            return frame_hash, cached_state, None
+    with metrics.timer("preprocess"):
+        if preprocess_config.passthrough(image_info):
+            return frame_hash, None, image_data
+        return frame_hash, None, preprocess_frame(Image.open(io.BytesIO(image_data)), image_data, preprocess_config)
+
+
+async def _process_frame(image_data: bytes, image_base64: Optional[str],
+                         session_id: str,
+                         submit: Optional[Callable[[str], Awaitable[GameState]]]) -> AnalyzeFrameResponse:
     try:
-        # Validate base64 image
+        # Validate the image from its header, without decoding it
         try:
-            image_data = base64.b64decode(request.image_base64)
-            image = Image.open(io.BytesIO(image_data))
-            # Verify it's a valid image
-            image.verify()
-        except Exception as e:
+            with metrics.timer("verify"):
+                image_info = sniff_image(image_data, MAX_FRAME_PIXELS)
+        except InvalidImage as e:
+            metrics.error("invalid_image")
             return AnalyzeFrameResponse(
                 success=False,
                 error=f"Invalid image data: {str(e)}"
             )
-        
-        # Analyze the frame using GPT-4 Vision
-        game_state = await analyze_frame_with_gpt4(request.image_base64)
-        
-        # Update cumulative running count (thread-safe, persisted to file)
-        global cumulative_running_count
-        with _count_lock:
-            current_frame_count = game_state.total_running_count or 0
-            cumulative_running_count += current_frame_count
-            save_cumulative_count(cumulative_running_count)
-        
-        # Update game_state with cumulative count
-        game_state.cumulative_running_count = cumulative_running_count
+
+        # Reuse the session's last result while its table has not changed
+        thumbnail = None
+        gated_state = None
+        if change_gate is not None:
+            with metrics.timer("change_gate"):
+                # The thumbnail decodes the frame; keep that off the event loop too
+                thumbnail = await asyncio.to_thread(
+                    change_gate.thumbnail, Image.open(io.BytesIO(image_data)), preprocess_config.roi
+                )
+                gated_state = change_gate.check(session_id, thumbnail)
+
+        if gated_state is not None:
+            game_state = gated_state.model_copy(deep=True)
+        else:
+            if frame_cache.max_entries > 0 or not preprocess_config.passthrough(image_info):
+                # Hashing and resizing decode the frame, tens of ms of CPU; keep them off the event loop
+                frame_hash, cached_state, model_data = await asyncio.to_thread(
+                    _prepare_frame, image_data, image_info, session_id
+                )
+            else:
+                frame_hash, cached_state, model_data = None, None, image_data
+
+            if cached_state is not None:
+                game_state = cached_state.model_copy(deep=True)
+            else:
+                if model_data is not image_data or image_base64 is None:
+                    image_base64 = base64.b64encode(model_data).decode('ascii')
+
+                with metrics.timer("recognize"):
+                    game_state = await recognize_frame(model_data, image_base64, submit)
+                if frame_hash is not None:
+                    frame_cache.put(session_id, frame_hash, game_state.model_copy(deep=True))
+            if thumbnail is not None:
+                change_gate.record(session_id, thumbnail, game_state.model_copy(deep=True))
+
+        with metrics.timer("count"):
+            if STRATEGY_SOLVER:
+                # A cold solve takes milliseconds; run it, and the count it depends on, in a worker thread
+                await asyncio.to_thread(count_frame, session_id, game_state)
+            else:
+                await run_count_store(count_frame, session_id, game_state)
+
+        with metrics.timer("publish"):
+            state_hub.publish(session_id, game_state.model_dump(mode="json"))
+        if archive is not None:
+            archive.append(session_id, image_data, game_state._model_response, game_state)
         
         return AnalyzeFrameResponse(
             success=True,
@@ -476,12 +875,239 @@ async def analyze_frame(request: AnalyzeFrameRequest):
             error=str(e.detail)
         )
     except Exception as e:
+        metrics.error("internal")
         return AnalyzeFrameResponse(
             success=False,
             error=f"Error processing frame: {str(e)}"
         )
 
 
+# With MJPEG_STREAM_URL set (e.g. http://<esp32>:81/stream) the server pulls
+# the camera's stream itself and analyzes the newest frame at most
+# STREAM_FPS times a second, counting it against STREAM_SESSION_ID
+STREAM_SESSION_ID = os.getenv("STREAM_SESSION_ID", DEFAULT_SESSION)
+_stream_url = os.getenv("MJPEG_STREAM_URL")
+stream_consumer: Optional["StreamConsumer"] = None
+if _stream_url:
+    from stream import StreamConsumer
+
+    stream_consumer = StreamConsumer(
+        _stream_url,
+        lambda image_data: process_frame(image_data, session_id=STREAM_SESSION_ID),
+        fps=float(os.getenv("STREAM_FPS", "2.0")),
+    )
+
+
+# Admission control for frames posted to /api/analyze-frame and /frame: one
+# frame per table is analyzed at a time and only its newest frame waits
+# (older ones get 429). At most MAX_ACTIVE_FRAMES (default
+# OPENAI_MAX_CONCURRENCY) frames run and MAX_QUEUED_FRAMES wait across
+# tables; beyond that, or after waiting FRAME_DEADLINE_MS, frames get 503.
+# Both carry Retry-After.
+admission: Optional[AdmissionControl] = None
+if os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes"):
+    admission = AdmissionControl(
+        max_active=int(os.getenv("MAX_ACTIVE_FRAMES", os.getenv("OPENAI_MAX_CONCURRENCY", "16"))),
+        max_queued=int(os.getenv("MAX_QUEUED_FRAMES", "64")),
+        deadline=float(os.getenv("FRAME_DEADLINE_MS", "2000")) / 1000,
+        retry_after=float(os.getenv("RETRY_AFTER_SECONDS", "1")),
+    )
+
+
+async def acquire_admission(session_id: str) -> None:
+    """Wait for the table's admission slot. Raises HTTPException 429 or 503 if the frame is turned away."""
+    try:
+        with metrics.timer("admission"):
+            await admission.acquire(session_id)
+    except Rejected as e:
+        raise HTTPException(status_code=429 if e.reason == "superseded" else 503, detail=str(e),
+                            headers={"Retry-After": admission.retry_after_header()})
+
+
+async def admit_frame(session_id: str, run: Callable[[], Awaitable[AnalyzeFrameResponse]]) -> AnalyzeFrameResponse:
+    """Run a frame's analysis once admission control lets it through."""
+    if admission is None:
+        return await run()
+    await acquire_admission(session_id)
+    try:
+        return await run()
+    finally:
+        admission.release(session_id)
+
+
+async def admit_tables(session_ids: List[str]) -> Dict[str, Optional[HTTPException]]:
+    """
+    Take one admission slot per table, all at once. Maps each table to None
+    once admitted, or to the HTTPException that turned it away. The caller
+    releases the admitted tables.
+    """
+    if admission is None:
+        return dict.fromkeys(session_ids)
+    tasks = [asyncio.ensure_future(acquire_admission(session_id)) for session_id in session_ids]
+    try:
+        await asyncio.wait(tasks)
+    except BaseException:
+        # Cancelled: give back the slots already granted
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for session_id, task in zip(session_ids, tasks):
+            if not task.cancelled() and task.exception() is None:
+                admission.release(session_id)
+        raise
+    return {session_id: task.exception() for session_id, task in zip(session_ids, tasks)}
+
+
+@app.post("/api/analyze-frame", response_model=AnalyzeFrameResponse)
+async def analyze_frame(request: AnalyzeFrameRequest, x_session_id: Optional[str] = Header(None)):
+    """
+    Process a video frame and return detected cards and game state.
+    
+    This endpoint accepts a base64-encoded image of a blackjack game frame,
+    uses GPT-4 Vision API to identify the cards, and returns the game state
+    with recommendations. The X-Session-ID header selects the table whose
+    running count is updated.
+    """
+    session_id = resolve_session_id(x_session_id)
+    try:
+        with metrics.timer("decode"):
+            image_data = decode_frame_base64(request.image_base64)
+    except FrameTooLarge as e:
+        metrics.error("frame_too_large")
+        return AnalyzeFrameResponse(success=False, error=str(e))
+    except Exception as e:
+        metrics.error("invalid_base64")
+        return AnalyzeFrameResponse(
+            success=False,
+            error=f"Invalid image data: {str(e)}"
+        )
+    return await admit_frame(session_id, lambda: process_frame(image_data, request.image_base64, session_id))
+
+
+@app.post("/api/analyze-batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(request: AnalyzeBatchRequest, response: Response):
+    """
+    Process several frames, possibly from different tables, at once.
+
+    Frames that need the vision model are packed into as few requests as
+    possible (BATCH_MAX_FRAMES images each): the batcher is held until every
+    frame has been prepared. Results are returned in the order the frames
+    were sent.
+
+    Admission control takes the request as one unit: each table in it takes
+    one slot, and only its newest frame is analyzed. Its earlier frames
+    repeat that result, since the hand has moved on. A table that is turned
+    away gets failed results, and the response carries Retry-After.
+    """
+    session_ids = [resolve_session_id(frame.session_id) for frame in request.frames]
+    results: List[Optional[AnalyzeFrameResponse]] = [None] * len(request.frames)
+    images = {}
+    newest: Dict[str, int] = {}  # table -> index of its newest decodable frame
+    for index, (frame, session_id) in enumerate(zip(request.frames, session_ids)):
+        try:
+            with metrics.timer("decode"):
+                images[index] = decode_frame_base64(frame.image_base64)
+        except FrameTooLarge as e:
+            metrics.error("frame_too_large")
+            results[index] = AnalyzeFrameResponse(success=False, error=str(e))
+            continue
+        except Exception as e:
+            metrics.error("invalid_base64")
+            results[index] = AnalyzeFrameResponse(
+                success=False,
+                error=f"Invalid image data: {str(e)}"
+            )
+            continue
+        newest[session_id] = index
+
+    refusals = await admit_tables(list(newest))
+    admitted = [session_id for session_id, refusal in refusals.items() if refusal is None]
+    table_results = {}
+    for session_id, refusal in refusals.items():
+        if refusal is not None:
+            response.headers.update(refusal.headers or {})
+            table_results[session_id] = AnalyzeFrameResponse(success=False, error=str(refusal.detail))
+
+    held = set(admitted)  # tables whose frame may still reach the batcher
+
+    def settle(session_id: str) -> None:
+        if session_id in held:
+            held.discard(session_id)
+            vision_batcher.release()
+
+    async def analyze(session_id: str) -> AnalyzeFrameResponse:
+        index = newest[session_id]
+
+        async def submit(image_base64: str) -> GameState:
+            future = vision_batcher.enqueue(image_base64)
+            settle(session_id)
+            return await future
+
+        try:
+            return await process_frame(images[index], request.frames[index].image_base64, session_id, submit)
+        finally:
+            settle(session_id)  # Answered without the model, or failed before it
+            if admission is not None:
+                admission.release(session_id)
+
+    for _ in admitted:
+        vision_batcher.hold()
+    try:
+        table_results.update(zip(admitted, await asyncio.gather(*(analyze(session_id) for session_id in admitted))))
+    finally:
+        # A task cancelled before it started never reaches its finally
+        for session_id in list(held):
+            settle(session_id)
+            if admission is not None:
+                admission.release(session_id)
+    for index, session_id in enumerate(session_ids):
+        if results[index] is None:
+            results[index] = table_results[session_id]
+    return AnalyzeBatchResponse(results=results)
+
+
+@app.post("/frame", response_model=AnalyzeFrameResponse)
+@app.post("/frame/{session_id}", response_model=AnalyzeFrameResponse)
+async def ingest_frame(request: Request, session_id: Optional[str] = None,
+                       x_session_id: Optional[str] = Header(None)):
+    """
+    Process a raw JPEG frame posted by the ESP32 camera.
+
+    The request body is the encoded image itself (Content-Type: image/jpeg),
+    which avoids the base64 JSON envelope used by /api/analyze-frame. The
+    session comes from the path, so each rig can be pointed at its own URL,
+    or from the X-Session-ID header.
+    """
+    session_id = resolve_session_id(session_id or x_session_id)
+    content_type = request.headers.get("content-type", "image/jpeg")
+    if not content_type.startswith(("image/", "application/octet-stream")):
+        metrics.error("unsupported_content_type")
+        return AnalyzeFrameResponse(
+            success=False,
+            error=f"Unsupported content type: {content_type}"
+        )
+
+    too_large = AnalyzeFrameResponse(success=False, error=f"Frame too large: over {MAX_FRAME_BYTES} bytes")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_FRAME_BYTES:
+        metrics.error("frame_too_large")
+        return too_large
+
+    # Keep the received chunks and join them once, into immutable bytes
+    # that every later Image.open can share without copying
+    with metrics.timer("receive"):
+        chunks = []
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_FRAME_BYTES:
+                metrics.error("frame_too_large")
+                return too_large
+            chunks.append(chunk)
+        body = b"".join(chunks)
+    return await admit_frame(session_id, lambda: process_frame(body, session_id=session_id))
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -490,7 +1116,12 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "endpoints": {
-            "analyze_frame": "/api/analyze-frame"
+            "analyze_frame": "/api/analyze-frame",
+            "analyze_batch": "/api/analyze-batch",
+            "frame": "/frame",
+            "stream": "/api/stream",
+            "metrics": "/metrics",
+            "updates": "/ws/{session_id}"
         }
     }
 
@@ -502,20 +1133,106 @@ async def health():
 
 
 @app.post("/api/reset-count")
-async def reset_count():
-    """Reset the cumulative running count to zero."""
-    global cumulative_running_count
-    with _count_lock:
-        cumulative_running_count = 0
-        save_cumulative_count(0)
-    return {"status": "success", "message": "Cumulative running count reset to 0", "count": 0}
+async def reset_count(x_session_id: Optional[str] = Header(None)):
+    """Reset the session's cumulative running count to zero."""
+    session_id = resolve_session_id(x_session_id)
+    await run_count_store(reset_session_count, session_id)
+    state_hub.patch(session_id, {"cumulative_running_count": 0, "cards_seen": 0,
+                                 "decks_remaining": float(SHOE_DECKS), "true_count": 0.0})
+    return {"status": "success", "message": "Cumulative running count reset to 0", "count": 0,
+            "session_id": session_id}
+
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Get frame cache hit/miss counters."""
+    return {"status": "success", "frame_cache": frame_cache.stats(), "vision_batcher": vision_batcher.stats(),
+            "solver": solver.stats(), "change_gate": change_gate.stats() if change_gate is not None else None,
+            "recognizer": dict(recognizer_stats, mode=RECOGNIZER), "model_usage": dict(model_usage),
+            "websocket": state_hub.stats(), "admission": admission.stats() if admission is not None else None,
+            "archive": archive.stats() if archive is not None else None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Prometheus metrics: p50/p95/p99 latency per pipeline stage, error
+    counts by type, in-flight requests, cache hit rates and token usage.
+    """
+    solver_stats = solver.stats()
+    solver_lookups = solver_stats["hits"] + solver_stats["misses"]
+    gauges = [
+        ("cache_hit_ratio", {"cache": "frame"}, frame_cache.stats()["hit_rate"]),
+        ("cache_hit_ratio", {"cache": "solver"}, solver_stats["hits"] / solver_lookups if solver_lookups else 0.0),
+    ]
+    if change_gate is not None:
+        gauges.append(("cache_hit_ratio", {"cache": "change_gate"}, change_gate.stats()["skip_ratio"]))
+    counters = [
+        ("model_requests_total", {}, model_usage["requests"]),
+        ("model_tokens_total", {"kind": "prompt"}, model_usage["prompt_tokens"]),
+        ("model_tokens_total", {"kind": "completion"}, model_usage["completion_tokens"]),
+    ] + [("recognizer_frames_total", {"path": path}, count) for path, count in recognizer_stats.items()]
+    if admission is not None:
+        admission_stats = admission.stats()
+        gauges += [
+            ("admission_frames", {"state": "active"}, admission_stats["active"]),
+            ("admission_frames", {"state": "queued"}, admission_stats["queued"]),
+        ]
+        counters += [("admission_dropped_total", {"reason": reason}, count)
+                     for reason, count in admission_stats["dropped"].items()]
+    return PlainTextResponse(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/stream")
+async def stream_status():
+    """Get the MJPEG stream consumer's state and its latest analysis."""
+    if stream_consumer is None:
+        return {"status": "disabled"}
+    return {"status": "success", "stream": stream_consumer.stats(), "latest": stream_consumer.last_result}
+
+
+@app.websocket("/ws/{session_id}")
+async def game_state_updates(websocket: WebSocket, session_id: str):
+    """
+    Push a table's game state as it changes: a snapshot on connect, then
+    only the changed fields after each analyzed frame. Sending
+    {"type": "resync"} asks for a fresh snapshot.
+    """
+    if not is_valid_session_id(session_id):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    subscription = state_hub.subscribe(session_id)
+
+    async def send_updates():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    async def receive_requests():
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "resync":
+                subscription.request_resync()
+
+    tasks = [asyncio.create_task(send_updates()), asyncio.create_task(receive_requests())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        state_hub.unsubscribe(subscription)
 
 
 @app.get("/api/get-count")
-async def get_count():
-    """Get the current cumulative running count."""
-    global cumulative_running_count
-    return {"status": "success", "cumulative_running_count": cumulative_running_count}
+async def get_count(x_session_id: Optional[str] = Header(None)):
+    """Get the session's current cumulative running count."""
+    session_id = resolve_session_id(x_session_id)
+    count = await run_count_store(count_store.get, session_id)
+    return {"status": "success", "cumulative_running_count": count, "session_id": session_id}
 
 
 if __name__ == "__main__":
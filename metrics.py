@@ -0,0 +1,194 @@
+"""
+Per-stage latency metrics.
+
+Each step of the frame pipeline (decode, verify, model call, parse, ...)
+is timed into a fixed-bucket histogram: recording a sample is one bisect
+and an increment, and p50/p95/p99 are read back from the bucket counts.
+render() writes the Prometheus text format for GET /metrics.
+
+MetricsMiddleware tracks in-flight requests and, when enabled, returns
+each request's own stage timings in a Server-Timing header.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Bucket upper bounds from 50 us to about 2 minutes, 4 per doubling, so a
+# quantile read from the buckets is within 19% of the true value
+BUCKET_BOUNDS = tuple(0.00005 * 2 ** (i / 4) for i in range(86))
+
+# Stage timings of the request being handled, when Server-Timing is on
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+class LatencyHistogram:
+    """Latency samples in seconds, counted into BUCKET_BOUNDS."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # last bucket: above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th sample, capped at the largest sample."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """Stage histograms, error counters and the in-flight request gauge."""
+
+    def __init__(self, prefix: str = "blackjack"):
+        self.prefix = prefix
+        self.in_flight = 0
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one stage duration."""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the enclosed block as stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def error(self, kind: str) -> None:
+        """Count an error of the given kind."""
+        with self._lock:
+            self._errors[kind] = self._errors.get(kind, 0) + 1
+
+    def reset(self) -> None:
+        """Drop every sample and counter."""
+        with self._lock:
+            self._stages.clear()
+            self._errors.clear()
+
+    def snapshot(self) -> dict:
+        """Per-stage count, mean and quantiles in milliseconds, plus error counts."""
+        with self._lock:
+            stages = {
+                stage: dict(
+                    count=h.count,
+                    mean_ms=h.sum / h.count * 1000 if h.count else 0.0,
+                    **{f"p{round(q * 100)}_ms": h.quantile(q) * 1000 for q in QUANTILES},
+                )
+                for stage, h in self._stages.items()
+            }
+            return {"stages": stages, "errors": dict(self._errors), "in_flight": self.in_flight}
+
+    def render(self, gauges: Iterable[Tuple[str, Dict[str, str], float]] = (),
+               counters: Iterable[Tuple[str, Dict[str, str], float]] = ()) -> str:
+        """
+        Prometheus text exposition of the metrics. gauges and counters are
+        extra (name, labels, value) samples supplied by the caller.
+        """
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Latency of each frame processing stage.",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                for q in QUANTILES:
+                    lines.append(f"{p}_stage_seconds{_labels({'stage': stage, 'quantile': q})} {h.quantile(q):.6g}")
+                lines.append(f"{p}_stage_seconds_sum{_labels({'stage': stage})} {h.sum:.6g}")
+                lines.append(f"{p}_stage_seconds_count{_labels({'stage': stage})} {h.count}")
+            lines += [f"# HELP {p}_errors_total Errors by type.", f"# TYPE {p}_errors_total counter"]
+            for kind, count in sorted(self._errors.items()):
+                lines.append(f"{p}_errors_total{_labels({'type': kind})} {count}")
+        lines += [
+            f"# HELP {p}_requests_in_flight HTTP requests being handled.",
+            f"# TYPE {p}_requests_in_flight gauge",
+            f"{p}_requests_in_flight {self.in_flight}",
+        ]
+        for kind, samples in (("gauge", gauges), ("counter", counters)):
+            typed = set()
+            for name, labels, value in samples:
+                if name not in typed:
+                    lines.append(f"# TYPE {p}_{name} {kind}")
+                    typed.add(name)
+                lines.append(f"{p}_{name}{_labels(labels)} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value for a request's stage timings."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting in-flight HTTP requests. With server_timing,
+    responses carry the stage timings recorded while handling the request.
+    """
+
+    def __init__(self, app, metrics: Metrics, server_timing: bool = False):
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = [] if self.server_timing else None
+        token = _request_timings.set(timings)
+
+        async def send_with_timing(message):
+            if timings and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.metrics.in_flight -= 1
+            _request_timings.reset(token)
@@ -0,0 +1,339 @@
+"""
+Batched persistence of the per-session running counts.
+
+Counts live in memory and request handlers only update those values.
+A background task writes them to disk after flush_every updates or every
+flush_interval seconds, whichever comes first, and once more on shutdown.
+Writes go to a temporary file that is renamed over the count file, so a
+crash mid-write never leaves it empty or truncated.
+
+The count file belongs to one process. With several worker processes
+SharedCountStore keeps the counts, and each table's shoe state, in a
+SQLite database in WAL mode that every worker reads and writes.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+DEFAULT_SESSION = "default"
+
+
+def read_counts(path: str) -> Dict[str, int]:
+    """
+    Read saved counts keyed by session ID. A file holding a single integer
+    (the pre-session format) is loaded as the default session's count.
+    Returns an empty dict if the file is missing or invalid.
+    """
+    try:
+        with open(path, 'r') as f:
+            text = f.read().strip()
+        data = json.loads(text)
+        if isinstance(data, int):
+            return {DEFAULT_SESSION: data}
+        if isinstance(data, dict):
+            return {str(key): int(value) for key, value in data.items()}
+    except (ValueError, TypeError, OSError):
+        pass
+    return {}
+
+
+def write_counts_atomic(path: str, counts: Dict[str, int]) -> None:
+    """Write the counts to a temporary file and rename it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".count-", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(counts, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CountStore:
+    """In-memory counts keyed by session ID, written behind to a file."""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_every: int = 50):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.counts = read_counts(path)
+        self.flushes = 0
+        self._pending = 0
+        self._flushed = dict(self.counts)
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, session_id: str = DEFAULT_SESSION) -> int:
+        """Current count for a session, 0 if it has none."""
+        return self.counts.get(session_id, 0)
+
+    def update(self, value: int, session_id: str = DEFAULT_SESSION) -> None:
+        """Record a new count for a session. Never touches the filesystem."""
+        self.counts[session_id] = value
+        self._mark_dirty()
+
+    def add(self, delta: int, session_id: str = DEFAULT_SESSION) -> int:
+        """Add to a session's count and return the new count."""
+        value = self.counts.get(session_id, 0) + delta
+        self.update(value, session_id)
+        return value
+
+    def remove(self, session_id: str) -> None:
+        """Forget a session's count."""
+        if self.counts.pop(session_id, None) is not None:
+            self._mark_dirty()
+
+    @contextmanager
+    def shoe(self, session_id: str, tracker) -> Iterator[None]:
+        """Record the session's count once the caller has updated its tracker."""
+        before = tracker.running_count
+        yield
+        if tracker.running_count != before:
+            self.update(tracker.running_count, session_id)
+
+    def _mark_dirty(self) -> None:
+        self._pending += 1
+        if self._wake is not None and self._pending >= self.flush_every:
+            self._wake.set()
+
+    def flush(self) -> bool:
+        """Write the current counts if they changed since the last flush."""
+        counts = dict(self.counts)
+        self._pending = 0
+        if counts == self._flushed:
+            return False
+        try:
+            write_counts_atomic(self.path, counts)
+        except OSError:
+            return False  # If we can't save, continue with in-memory counts
+        self._flushed = counts
+        self.flushes += 1
+        return True
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background flusher and write any pending counts."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+
+
+# Versions come from one database-wide sequence rather than a per-row
+# counter, so a session that is removed and written again never repeats a
+# version some worker's tracker was loaded at
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS counts (
+        session_id TEXT PRIMARY KEY,
+        running_count INTEGER NOT NULL DEFAULT 0,
+        shoe TEXT,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS version_seq (id INTEGER PRIMARY KEY CHECK (id = 0), last INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO version_seq (id, last) VALUES (0, (SELECT COALESCE(MAX(version), 0) FROM counts))",
+)
+
+
+class SharedCountStore:
+    """
+    Counts and shoe state in a SQLite database shared by worker processes.
+
+    Same interface as CountStore. Every change is its own transaction, and
+    shoe() runs a whole tracker update in one, so a card counted by one
+    worker is not counted again by the next. WAL mode lets readers carry on
+    while one worker writes; synchronous=NORMAL skips the fsync per commit,
+    so a power cut can lose the latest updates but not corrupt the file.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, idle_timeout: float = 1800.0,
+                 import_path: Optional[str] = None):
+        """
+        timeout is how long a write waits for another worker's transaction.
+        remove() keeps sessions another worker wrote within idle_timeout.
+        Counts in import_path (a count file) seed a new database.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.flushes = 0
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._versions = weakref.WeakKeyDictionary()  # tracker -> version its state was loaded at
+        self._import_path = import_path
+        self._created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, opened on first use; transactions are begun explicitly
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._connections_lock:
+                self._connections.append(conn)
+                if not self._created:
+                    self._create(conn)
+                    self._created = True
+            self._local.conn = conn
+        return conn
+
+    def _create(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            if self._import_path and conn.execute("SELECT COUNT(*) FROM counts").fetchone()[0] == 0:
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO counts (session_id, running_count, updated) VALUES (?, ?, ?)",
+                    [(session_id, count, now) for session_id, count in read_counts(self._import_path).items()],
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so the reads inside see
+        # the state the transaction's writes apply to
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _next_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("UPDATE version_seq SET last = last + 1 RETURNING last").fetchone()[0]
+
+    def get(self, session_id: str = DEFAULT_SESSION) -> int:
+        """Current count for a session, 0 if it has none."""
+        row = self._connect().execute(
+            "SELECT running_count FROM counts WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def update(self, value: int, session_id: str = DEFAULT_SESSION) -> None:
+        """Set a session's count."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO counts (session_id, running_count, version, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET running_count = excluded.running_count, "
+                "version = excluded.version, updated = excluded.updated",
+                (session_id, value, self._next_version(conn), time.time()),
+            )
+
+    def add(self, delta: int, session_id: str = DEFAULT_SESSION) -> int:
+        """Atomically add to a session's count and return the new count."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "INSERT INTO counts (session_id, running_count, version, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET running_count = running_count + excluded.running_count, "
+                "version = excluded.version, updated = excluded.updated RETURNING running_count",
+                (session_id, delta, self._next_version(conn), time.time()),
+            ).fetchone()[0]
+
+    def remove(self, session_id: str) -> None:
+        """Forget a session's count unless another worker used it recently."""
+        self._connect().execute(
+            "DELETE FROM counts WHERE session_id = ? AND updated < ?", (session_id, time.time() - self.idle_timeout)
+        )
+
+    @contextmanager
+    def shoe(self, session_id: str, tracker) -> Iterator[None]:
+        """
+        Update a session's tracker in one transaction: it is first brought
+        up to date with other workers' changes, and its state is saved when
+        the caller is done with it. If the caller raises, the transaction is
+        rolled back and the tracker is reloaded by the next one.
+        """
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT running_count, shoe, version FROM counts WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                version = None
+                if row is not None:
+                    count, shoe, version = row
+                    if self._versions.get(tracker) != version:
+                        if shoe is not None:
+                            tracker.load(json.loads(shoe))
+                        tracker.running_count = count
+                before = tracker.to_dict()
+                yield
+                state = tracker.to_dict()
+                if state != before or row is None:
+                    version = self._next_version(conn)
+                    conn.execute(
+                        "INSERT INTO counts (session_id, running_count, shoe, version, updated) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                        "running_count = excluded.running_count, shoe = excluded.shoe, "
+                        "version = excluded.version, updated = excluded.updated",
+                        (session_id, tracker.running_count, json.dumps(state, separators=(",", ":")), version,
+                         time.time()),
+                    )
+        except BaseException:
+            self._versions.pop(tracker, None)  # Its changes were rolled back
+            raise
+        self._versions[tracker] = version
+
+    def flush(self) -> bool:
+        """Nothing to write: every change is committed as it happens."""
+        return False
+
+    def start(self) -> None:
+        """Open the database; no background task is needed."""
+        self._connect()
+
+    async def close(self) -> None:
+        """Fold the write-ahead log into the database and close connections."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            except sqlite3.Error:
+                pass
+            conn.close()
+        self._local = threading.local()
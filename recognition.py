@@ -0,0 +1,321 @@
+"""
+Local card recognition backends.
+
+A recognizer turns an encoded frame into the same dict the vision model
+returns ({"player_cards": [...], "dealer_cards": [...]}, each card with
+rank, suit and confidence), so main.build_game_state handles either.
+
+The template backend runs on the CPU with NumPy: cards are found as bright
+regions on the felt, and the rank and suit printed in each card's top-left
+corner are matched against glyph templates by normalized correlation.
+Cards should not overlap: overlapping cards merge into one region, which
+is read as one card with confidence reduced by how far the region's shape
+is from a card's, so hybrid mode hands fanned hands to the remote model.
+"""
+
+import io
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUITS = ['hearts', 'diamonds', 'clubs', 'spades']
+RED_SUITS = ('hearts', 'diamonds')
+
+GLYPH_SIZE = (16, 24)  # width, height of a normalized glyph
+CARD_ASPECT = 1.4  # height / width of a playing card
+
+# Corner index region as fractions of the card's width and height
+CORNER_BOX = (0.03, 0.02, 0.30, 0.42)
+
+# Aspect deviation allowed for perspective before confidence is reduced
+ASPECT_TOLERANCE = 0.1
+
+
+class Recognizer(ABC):
+    """Interface for card recognition backends."""
+
+    name = "base"
+
+    @abstractmethod
+    def recognize(self, image_data: bytes) -> dict:
+        """Detect cards in an encoded frame; returns the vision model's JSON shape."""
+
+    @staticmethod
+    def min_confidence(result: dict) -> float:
+        """min_confidence() of a result from recognize()."""
+        return min_confidence(result)
+
+
+def min_confidence(result: dict) -> float:
+    """Lowest card confidence in a result, 0.0 when no cards were found."""
+    cards = result.get("player_cards", []) + result.get("dealer_cards", [])
+    if not cards:
+        return 0.0
+    return min(card.get("confidence", 0.0) for card in cards)
+
+
+def _draw_suit(draw: ImageDraw.ImageDraw, box: Tuple[int, int, int, int], suit: str, fill) -> None:
+    """Draw a suit symbol filling box."""
+    left, top, right, bottom = box
+    w = right - left
+    h = bottom - top
+    cx = left + w / 2
+    if suit == 'diamonds':
+        draw.polygon([(cx, top), (right, top + h / 2), (cx, bottom), (left, top + h / 2)], fill=fill)
+        return
+    r = w / 4
+    if suit == 'clubs':
+        draw.ellipse((cx - r, top, cx + r, top + 2 * r), fill=fill)
+        draw.ellipse((left, top + h * 0.35, left + 2 * r, top + h * 0.35 + 2 * r), fill=fill)
+        draw.ellipse((right - 2 * r, top + h * 0.35, right, top + h * 0.35 + 2 * r), fill=fill)
+        draw.polygon([(cx, top + h * 0.4), (cx + r * 0.8, bottom), (cx - r * 0.8, bottom)], fill=fill)
+        return
+    # Hearts, and spades as an upside-down heart with a stem
+    lobes = top + h * 0.3
+    if suit == 'hearts':
+        draw.ellipse((left, top, cx, top + 2 * r + h * 0.1), fill=fill)
+        draw.ellipse((cx, top, right, top + 2 * r + h * 0.1), fill=fill)
+        draw.polygon([(left, lobes), (right, lobes), (cx, bottom)], fill=fill)
+        return
+    body = top + h * 0.75
+    draw.polygon([(cx, top), (right, top + h * 0.5), (left, top + h * 0.5)], fill=fill)
+    draw.ellipse((left, top + h * 0.3, cx, body), fill=fill)
+    draw.ellipse((cx, top + h * 0.3, right, body), fill=fill)
+    draw.polygon([(cx, top + h * 0.55), (cx + r * 0.8, bottom), (cx - r * 0.8, bottom)], fill=fill)
+
+
+def render_card(rank: str, suit: str, width: int = 120) -> Image.Image:
+    """
+    Draw a plain card face with its corner index. Used to build the default
+    templates and synthetic test frames.
+    """
+    height = round(width * CARD_ASPECT)
+    card = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(card)
+    ink = (200, 20, 30) if suit in RED_SUITS else (15, 15, 15)
+    font = ImageFont.load_default(size=max(8, round(width * 0.2)))
+    x = round(width * 0.07)
+    y = round(height * 0.03)
+    draw.text((x, y), rank, fill=ink, font=font)
+    rank_bottom = draw.textbbox((x, y), rank, font=font)[3]
+    size = round(width * 0.14)
+    top = rank_bottom + round(height * 0.03)
+    _draw_suit(draw, (x, top, x + size, top + round(size * 1.1)), suit, ink)
+    pip = round(width * 0.3)
+    cx = width // 2
+    cy = round(height * 0.62)
+    _draw_suit(draw, (cx - pip // 2, cy - pip // 2, cx + pip // 2, cy + pip // 2), suit, ink)
+    return card
+
+
+def normalize_glyph(ink: np.ndarray) -> Optional[np.ndarray]:
+    """Crop an ink mask to its bounding box and resample it to a unit, zero-mean vector."""
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    crop = ink[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    glyph = Image.fromarray((crop * 255).astype(np.uint8)).resize(GLYPH_SIZE, Image.BILINEAR)
+    vector = np.asarray(glyph, dtype=np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
+
+
+def read_corner(card: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray, bool]]:
+    """
+    Extract the rank and suit glyphs from an RGB card crop.
+    Returns (rank vector, suit vector, is_red), or None when the corner
+    does not hold two separate rows of ink.
+    """
+    h, w = card.shape[:2]
+    left, top, right, bottom = CORNER_BOX
+    corner = card[round(top * h):round(bottom * h), round(left * w):round(right * w)].astype(np.int16)
+    if corner.size == 0:
+        return None
+    r, g, b = corner[..., 0], corner[..., 1], corner[..., 2]
+    red = (r - g > 80) & (r - b > 80)
+    ink = red | ((r + g + b) < 3 * 110)
+
+    # Rank and suit are stacked: split at the first blank row band
+    inked_rows = ink.any(axis=1)
+    runs = []
+    start = None
+    for y, inked in enumerate(inked_rows):
+        if inked and start is None:
+            start = y
+        elif not inked and start is not None:
+            runs.append((start, y))
+            start = None
+    if start is not None:
+        runs.append((start, len(inked_rows)))
+    if len(runs) < 2:
+        return None
+
+    rank = normalize_glyph(ink[runs[0][0]:runs[0][1]])
+    suit = normalize_glyph(ink[runs[1][0]:runs[1][1]])
+    if rank is None or suit is None:
+        return None
+    return rank, suit, bool(red.sum() > ink.sum() / 2)
+
+
+class CardTemplates:
+    """Glyph vectors for each rank and suit."""
+
+    def __init__(self, ranks: Dict[str, np.ndarray], suits: Dict[str, np.ndarray]):
+        self.ranks = ranks
+        self.suits = suits
+        self._rank_names = list(ranks)
+        self._rank_matrix = np.stack([ranks[name] for name in self._rank_names])
+
+    @classmethod
+    def rendered(cls, width: int = 160) -> "CardTemplates":
+        """Templates read from render_card() faces, through the same corner path as frames."""
+        ranks = {rank: read_corner(np.asarray(render_card(rank, 'spades', width)))[0] for rank in RANKS}
+        suits = {suit: read_corner(np.asarray(render_card('A', suit, width)))[1] for suit in SUITS}
+        return cls(ranks, suits)
+
+    @classmethod
+    def from_directory(cls, path: str) -> "CardTemplates":
+        """
+        Load glyph images named rank_<rank>.png and suit_<suit>.png (dark
+        ink on a light background), e.g. cropped from the deployment's own deck.
+        """
+        ranks = {}
+        suits = {}
+        for filename in os.listdir(path):
+            stem, ext = os.path.splitext(filename)
+            kind, _, name = stem.partition('_')
+            if ext.lower() != '.png' or kind not in ('rank', 'suit'):
+                continue
+            gray = np.asarray(Image.open(os.path.join(path, filename)).convert('L'))
+            vector = normalize_glyph(gray < 128)
+            if vector is not None:
+                (ranks if kind == 'rank' else suits)[name] = vector
+        if set(ranks) != set(RANKS) or set(suits) != set(SUITS):
+            raise ValueError(f"Incomplete card templates in {path}")
+        return cls(ranks, suits)
+
+    def match_rank(self, vector: np.ndarray) -> Tuple[str, float]:
+        """Best matching rank and its correlation score."""
+        scores = self._rank_matrix @ vector
+        best = int(np.argmax(scores))
+        return self._rank_names[best], float(scores[best])
+
+    def match_suit(self, vector: np.ndarray, red: bool) -> Tuple[str, float]:
+        """Best matching suit of the ink colour and its correlation score."""
+        candidates = RED_SUITS if red else ('clubs', 'spades')
+        scores = {suit: float(self.suits[suit] @ vector) for suit in candidates}
+        best = max(scores, key=scores.get)
+        return best, scores[best]
+
+
+def find_card_regions(gray: np.ndarray, threshold: int = 200, min_area: int = 40) -> List[Tuple[int, int, int, int]]:
+    """
+    Bounding boxes (left, top, right, bottom) of bright, card-shaped
+    connected regions in a small grayscale image.
+    """
+    mask = gray >= threshold
+    height, width = mask.shape
+    seen = np.zeros_like(mask)
+    boxes = []
+    for y0, x0 in zip(*np.nonzero(mask)):
+        if seen[y0, x0]:
+            continue
+        seen[y0, x0] = True
+        queue = deque([(y0, x0)])
+        top, left, bottom, right = y0, x0, y0, x0
+        area = 0
+        while queue:
+            y, x = queue.popleft()
+            area += 1
+            top, bottom = min(top, y), max(bottom, y)
+            left, right = min(left, x), max(right, x)
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < height and 0 <= nx < width and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    queue.append((ny, nx))
+        w = right - left + 1
+        h = bottom - top + 1
+        if area >= min_area and 0.9 <= h / w <= 2.0 and area >= 0.6 * w * h:
+            boxes.append((int(left), int(top), int(right) + 1, int(bottom) + 1))
+    return boxes
+
+
+class TemplateRecognizer(Recognizer):
+    """
+    CPU recognizer using template matching on card corners.
+
+    Cards whose centre is in the top dealer_split fraction of the frame are
+    the dealer's; the rest are the player's.
+    """
+
+    name = "template"
+
+    def __init__(self, templates: Optional[CardTemplates] = None, detect_width: int = 160,
+                 read_width: int = 800, dealer_split: float = 0.5, white_threshold: int = 200):
+        self.templates = templates or CardTemplates.rendered()
+        self.detect_width = detect_width
+        self.read_width = read_width
+        self.dealer_split = dealer_split
+        self.white_threshold = white_threshold
+
+    def recognize(self, image_data: bytes) -> dict:
+        image = Image.open(io.BytesIO(image_data))
+        image.draft('RGB', (self.read_width, self.read_width))
+        frame = image.convert('RGB')
+        if frame.width > self.read_width:
+            frame = frame.resize(
+                (self.read_width, round(frame.height * self.read_width / frame.width)), Image.BILINEAR
+            )
+        scale = frame.width / self.detect_width
+        small = frame.convert('L').resize(
+            (self.detect_width, max(1, round(frame.height / scale))), Image.BILINEAR
+        )
+        pixels = np.asarray(frame)
+
+        player, dealer = [], []
+        for left, top, right, bottom in find_card_regions(np.asarray(small), self.white_threshold):
+            box = (round(left * scale), round(top * scale), round(right * scale), round(bottom * scale))
+            card = self.read_card(pixels[box[1]:box[3], box[0]:box[2]])
+            if card is None:
+                continue
+            # Regions that are not card-shaped are usually overlapping cards
+            deviation = abs((bottom - top) / (right - left) / CARD_ASPECT - 1.0)
+            shape_score = min(1.0, max(0.0, 1.0 - 4 * (deviation - ASPECT_TOLERANCE)))
+            card["confidence"] = round(card["confidence"] * shape_score, 3)
+            centre_y = (box[1] + box[3]) / 2
+            (dealer if centre_y < self.dealer_split * frame.height else player).append((box[0], card))
+
+        return {
+            "player_cards": [card for _, card in sorted(player, key=lambda item: item[0])],
+            "dealer_cards": [card for _, card in sorted(dealer, key=lambda item: item[0])],
+        }
+
+    def read_card(self, card: np.ndarray) -> Optional[dict]:
+        """Rank, suit and confidence of one card crop, or None if unreadable."""
+        glyphs = read_corner(card)
+        if glyphs is None:
+            return None
+        rank_vector, suit_vector, red = glyphs
+        rank, rank_score = self.templates.match_rank(rank_vector)
+        suit, suit_score = self.templates.match_suit(suit_vector, red)
+        confidence = max(0.0, min(rank_score, suit_score))
+        return {"rank": rank, "suit": suit, "confidence": round(confidence, 3)}
+
+
+RECOGNIZERS = {
+    TemplateRecognizer.name: TemplateRecognizer,
+}
+
+
+def create_recognizer(name: str, **kwargs) -> Recognizer:
+    """Instantiate a local backend by name, raising ValueError for unknown names."""
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unknown recognizer: {name} (expected one of {', '.join(RECOGNIZERS)})")
+    return RECOGNIZERS[name](**kwargs)
@@ -0,0 +1,156 @@
+"""
+Replay a frame archive through the analysis pipeline.
+
+Streams the frames of an archive written with ARCHIVE_DIR through
+main.process_frame, either as fast as possible or at the pace they were
+recorded (--realtime, scaled by --speed). By default each frame's
+recognition is answered from its archived model response, so no API
+calls are made and the replay deterministically exercises parsing,
+counting and strategy. With --live the configured recognizer runs
+instead, to check a recognition change against what production saw.
+
+Reports frames/s and latency percentiles, and counts the frames whose
+cards, recommendation or running count differ from the archive.
+
+Usage:
+    python replay.py archive/
+    python replay.py archive/ --realtime --speed 4 --session table-1
+    RECOGNIZER=local python replay.py archive/ --live --fail-on-diff
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import main
+from archive import ArchiveReader
+from broadcast import diff_states
+from persistence import CountStore
+from sessions import SessionStore
+
+COMPARED_FIELDS = ("player_cards", "dealer_cards", "recommendation", "cumulative_running_count")
+
+
+def differences(archived: dict, replayed: dict) -> list:
+    """Compared fields whose replayed value differs from the archived one; cards by rank and suit."""
+    changes = diff_states({f: archived.get(f) for f in COMPARED_FIELDS}, {f: replayed.get(f) for f in COMPARED_FIELDS})
+    return sorted(changes)
+
+
+def isolate_pipeline(live: bool) -> dict:
+    """
+    Point main at fresh sessions and an in-memory count store, and unless
+    live, answer recognition from the record being replayed. Returns the
+    dict whose "record" entry the recorded recognizer reads.
+    """
+    main.count_store = CountStore(os.devnull)  # never started, so never written
+    main.sessions = SessionStore(main.create_shoe_tracker)
+    main.archive = None
+    main.frame_cache.clear()
+    current = {"record": None}
+    if not live:
+        async def recorded_analysis(image_base64):
+            record = current["record"]
+            if record.model_response is not None:
+                result = main.parse_model_response(record.model_response)
+            else:
+                result = {key: record.game_state.get(key) for key in ("player_cards", "dealer_cards")}
+            game_state = main.build_game_state(result)
+            game_state._model_response = record.model_response
+            return game_state
+
+        main.analyze_frame_with_gpt4 = recorded_analysis
+        main.local_recognizer = None
+        main._batch_window_ms = 0
+    return current
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def replay(reader: ArchiveReader, positions, current: dict, realtime: bool = False, speed: float = 1.0):
+    """Replay the records at positions in order. Returns the summary dict."""
+    latencies = []
+    mismatches = {}
+    mismatched = failed = 0
+    first_timestamp = None
+    started = time.perf_counter()
+    for position in positions:
+        record = reader[position]
+        scheduled = time.perf_counter()
+        if realtime:
+            if first_timestamp is None:
+                first_timestamp = record.timestamp
+            scheduled = started + (record.timestamp - first_timestamp) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        current["record"] = record
+        response = await main.process_frame(record.image, session_id=record.session_id)
+        latencies.append(time.perf_counter() - scheduled)
+        if not response.success:
+            failed += 1
+            continue
+        fields = differences(record.game_state, response.game_state.model_dump(mode="json"))
+        if fields:
+            mismatched += 1
+            for field in fields:
+                mismatches[field] = mismatches.get(field, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "frames": len(latencies),
+        "failed": failed,
+        "mismatched": mismatched,
+        "mismatched_fields": mismatches,
+        "duration_s": elapsed,
+        "frames_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Replay a frame archive through the analysis pipeline")
+    parser.add_argument("archive", help="archive directory (ARCHIVE_DIR of the recording server)")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded gaps between frames")
+    parser.add_argument("--speed", type=float, default=1.0, help="with --realtime, play this many times faster")
+    parser.add_argument("--live", action="store_true", help="run the configured recognizer instead of the archived replies")
+    parser.add_argument("--session", help="only replay this table")
+    parser.add_argument("--start", type=int, default=0, help="first record to replay")
+    parser.add_argument("--limit", type=int, help="replay at most this many records")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--fail-on-diff", action="store_true", help="exit 1 if any frame differs from the archive")
+    args = parser.parse_args()
+
+    from benchmarks.results import build_results, write_results
+
+    with ArchiveReader(args.archive) as reader:
+        positions = range(args.start, len(reader))
+        if args.session:
+            positions = [p for p in positions if reader[p].session_id == args.session]
+        positions = list(positions)[:args.limit]
+        current = isolate_pipeline(args.live)
+        summary = asyncio.run(replay(reader, positions, current, args.realtime, args.speed))
+
+    out = sys.stderr if args.output == "-" else sys.stdout
+    print(f"{summary['frames']} frames in {summary['duration_s']:.2f} s: {summary['frames_per_s']:.1f} frames/s, "
+          f"latency p50 {summary['latency_p50_ms']:.1f} ms  p99 {summary['latency_p99_ms']:.1f} ms", file=out)
+    fields = f" ({summary['mismatched_fields']})" if summary["mismatched_fields"] else ""
+    print(f"{summary['mismatched']} differ from the archive{fields}, {summary['failed']} failed", file=out)
+    mismatched_fields = summary.pop("mismatched_fields")
+    config = {"archive": args.archive, "realtime": args.realtime, "speed": args.speed, "live": args.live,
+              "session": args.session, "mismatched_fields": mismatched_fields}
+    write_results(build_results("replay", config, summary), args.output)
+    if args.fail_on_diff and (summary["mismatched"] or summary["failed"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,94 @@
+"""
+Session-scoped table state.
+
+Each camera rig sends its own session ID, so several tables can share one
+server without mixing their counts. Sessions are created on first use,
+looked up in O(1) and dropped after a period of inactivity.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+
+
+def is_valid_session_id(session_id: str) -> bool:
+    """Session IDs are 1-64 characters of letters, digits, and _ . : -"""
+    return bool(SESSION_ID_PATTERN.match(session_id))
+
+
+class Session:
+    """State for one table: its shoe tracker and the lock guarding it."""
+
+    def __init__(self, session_id: str, tracker):
+        self.id = session_id
+        self.tracker = tracker
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """
+    In-memory sessions kept in least-recently-used order.
+
+    Because every access moves a session to the end, idle sessions collect
+    at the front and eviction only looks at the oldest entries.
+    """
+
+    def __init__(self, tracker_factory: Callable[[str], object], idle_timeout: float = 1800.0,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self.tracker_factory = tracker_factory
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        """Return the session, creating it on first use."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self.tracker_factory(session_id))
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            evicted = self._evict_idle(now)
+        self._notify(evicted)
+        return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """Return the session if it exists, without touching it."""
+        return self._sessions.get(session_id)
+
+    def evict_idle(self) -> List[str]:
+        """Drop sessions idle for longer than idle_timeout."""
+        with self._lock:
+            evicted = self._evict_idle(time.monotonic())
+        self._notify(evicted)
+        return evicted
+
+    def _evict_idle(self, now: float) -> List[str]:
+        evicted = []
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen <= self.idle_timeout:
+                break
+            del self._sessions[oldest.id]
+            evicted.append(oldest.id)
+        return evicted
+
+    def _notify(self, evicted: List[str]) -> None:
+        if self.on_evict is not None:
+            for session_id in evicted:
+                self.on_evict(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
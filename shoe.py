@@ -0,0 +1,99 @@
+"""
+Incremental shoe tracking across frames.
+
+The camera sees the same cards for many consecutive frames. The tracker
+diffs the cards on the table against what it has already counted in the
+current round, so each physical card adds to the running count once. A
+round ends when the table has been clear for a number of frames.
+"""
+
+from collections import Counter
+from typing import Callable, Iterable, List
+
+from solver import Composition
+
+
+def card_key(card) -> tuple:
+    """Identity of a card on the table: (rank, suit)."""
+    return (card.rank, card.suit)
+
+
+class ShoeTracker:
+    """Running count and round state for one shoe."""
+
+    def __init__(self, count_value: Callable[[str], int], running_count: int = 0, clear_frames: int = 2,
+                 decks: int = 6):
+        """
+        count_value maps a rank to its count value. clear_frames is how many
+        consecutive frames without cards end the round, which keeps a single
+        dropped detection from recounting the whole table. decks sizes the
+        composition of cards left in the shoe.
+        """
+        self.count_value = count_value
+        self.clear_frames = clear_frames
+        self.running_count = running_count
+        self.cards_seen = 0
+        self.composition = Composition(decks)
+        self.round_number = 0
+        self._round_cards = Counter()
+        self._empty_frames = 0
+
+    def update(self, player_cards: Iterable, dealer_cards: Iterable) -> List[tuple]:
+        """
+        Feed the cards detected in one frame.
+
+        Returns the (rank, suit) keys of cards not yet counted this round;
+        only those change the running count.
+        """
+        visible = Counter(card_key(card) for card in player_cards)
+        visible.update(card_key(card) for card in dealer_cards)
+
+        if not visible:
+            self._empty_frames += 1
+            if self._round_cards and self._empty_frames >= self.clear_frames:
+                self._round_cards.clear()
+                self.round_number += 1
+            return []
+        self._empty_frames = 0
+
+        new_cards = visible - self._round_cards
+        if not new_cards:
+            return []
+
+        self._round_cards |= visible
+        added = list(new_cards.elements())
+        for rank, _suit in added:
+            self.running_count += self.count_value(rank)
+            self.composition.remove(rank)
+        self.cards_seen += len(added)
+        return added
+
+    def to_dict(self) -> dict:
+        """Round and shoe state as plain JSON-serializable values."""
+        return {
+            "running_count": self.running_count,
+            "cards_seen": self.cards_seen,
+            "round_number": self.round_number,
+            "round_cards": [[rank, suit, n] for (rank, suit), n in self._round_cards.items()],
+            "empty_frames": self._empty_frames,
+            "composition": list(self.composition.counts),
+        }
+
+    def load(self, state: dict) -> None:
+        """Replace this tracker's state with one saved by to_dict()."""
+        self.running_count = state["running_count"]
+        self.cards_seen = state["cards_seen"]
+        self.round_number = state["round_number"]
+        self._round_cards = Counter({(rank, suit): n for rank, suit, n in state["round_cards"]})
+        self._empty_frames = state["empty_frames"]
+        self.composition.counts = list(state["composition"])
+        self.composition.remaining = sum(self.composition.counts)
+
+    def reset(self) -> None:
+        """Start a new shoe."""
+        self.running_count = 0
+        self.cards_seen = 0
+        self.round_number = 0
+        self.composition.reset()
+        self._round_cards.clear()
+        self._empty_frames = 0
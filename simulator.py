@@ -0,0 +1,323 @@
+"""
+Monte Carlo blackjack simulator.
+
+Plays the basic strategy from strategy.py against configurable table
+rules to estimate its expected value. Rounds are simulated in NumPy
+across many independent shoes ("lanes") at once, and a process pool
+spreads chunks of rounds across CPU cores. Everything runs offline.
+
+Usage:
+    python simulator.py --rounds 2000000 --decks 6 --penetration 0.75 --h17 --workers 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from strategy import HARD, PAIR, SOFT, STRATEGY_TABLE, table_index
+
+# Action codes used by the vectorized strategy table
+HIT, STAND, DOUBLE, SPLIT = 0, 1, 2, 3
+ACTION_CODES = {'H': HIT, 'S': STAND, 'D': DOUBLE, 'SP': SPLIT, '': HIT}
+STRATEGY_CODES = np.array([ACTION_CODES[action] for action in STRATEGY_TABLE], dtype=np.int8)
+
+# Card values in one deck: 2-9 four times, ten-value cards 16 times, aces as 11
+DECK = np.array([v for v in range(2, 10) for _ in range(4)] + [10] * 16 + [11] * 4, dtype=np.int8)
+
+# Hi-Lo tags indexed by card value
+HI_LO = np.zeros(12, dtype=np.int8)
+HI_LO[2:7] = 1
+HI_LO[10:12] = -1
+
+TRUE_COUNT_RANGE = 10  # per-true-count results are clipped to [-10, 10]
+
+
+class TableRules:
+    """Table rules for a simulation."""
+
+    def __init__(self, decks: int = 6, penetration: float = 0.75, hit_soft_17: bool = False,
+                 double_after_split: bool = True, blackjack_payout: float = 1.5):
+        if not 0.0 < penetration < 1.0:
+            raise ValueError("penetration must be between 0 and 1")
+        self.decks = decks
+        self.penetration = penetration
+        self.hit_soft_17 = hit_soft_17
+        self.double_after_split = double_after_split
+        self.blackjack_payout = blackjack_payout
+
+    def describe(self) -> str:
+        return (f"{self.decks} decks, {self.penetration:.0%} penetration, "
+                f"{'H17' if self.hit_soft_17 else 'S17'}, {'DAS' if self.double_after_split else 'no DAS'}, "
+                f"blackjack pays {self.blackjack_payout:g}:1")
+
+
+class SimulationResult:
+    """Aggregated outcome of simulated rounds, in units of the initial bet."""
+
+    def __init__(self):
+        self.rounds = 0
+        self.hands = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        size = 2 * TRUE_COUNT_RANGE + 1
+        self.tc_rounds = np.zeros(size, dtype=np.int64)
+        self.tc_total = np.zeros(size, dtype=np.float64)
+
+    def merge(self, other: "SimulationResult") -> None:
+        self.rounds += other.rounds
+        self.hands += other.hands
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.tc_rounds += other.tc_rounds
+        self.tc_total += other.tc_total
+
+    @property
+    def ev(self) -> float:
+        """Mean result per round."""
+        return self.total / self.rounds if self.rounds else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Variance of the result per round."""
+        if self.rounds < 2:
+            return 0.0
+        return (self.total_sq - self.rounds * self.ev ** 2) / (self.rounds - 1)
+
+    def ev_by_true_count(self) -> dict:
+        """Mean result per round, keyed by true count at the start of the round."""
+        return {
+            tc - TRUE_COUNT_RANGE: (self.tc_total[tc] / self.tc_rounds[tc], int(self.tc_rounds[tc]))
+            for tc in range(len(self.tc_rounds)) if self.tc_rounds[tc]
+        }
+
+
+def add_card(total, soft, value):
+    """
+    Vectorized hand_total: add card values to (total, soft ace count),
+    demoting aces from 11 to 1 while the hand would bust.
+    """
+    total = total + value
+    soft = soft + (value == 11)
+    for _ in range(2):
+        demote = (total > 21) & (soft > 0)
+        total = total - 10 * demote
+        soft = soft - demote
+    return total, soft
+
+
+class ShoeSimulator:
+    """Plays rounds across `lanes` independent shoes in lockstep."""
+
+    def __init__(self, rules: TableRules, lanes: int = 4096, seed: Optional[int] = None):
+        self.rules = rules
+        self.lanes = lanes
+        self.rng = np.random.default_rng(seed)
+        self.shoe_cards = len(DECK) * rules.decks
+        self.cut = int(self.shoe_cards * rules.penetration)
+        # A spare shuffled deck after the shoe covers rounds that run past the end
+        self.base = np.tile(DECK, rules.decks + 1)
+        self.shoe = np.empty((lanes, len(self.base)), dtype=np.int8)
+        self.counts = np.empty((lanes, len(self.base) + 1), dtype=np.int32)
+        self.pos = np.zeros(lanes, dtype=np.int64)
+        self.lane_ids = np.arange(lanes)
+        self._shuffle(np.ones(lanes, dtype=bool))
+
+    def _shuffle(self, mask) -> None:
+        rows = np.flatnonzero(mask)
+        shoes = self.rng.permuted(np.broadcast_to(self.base, (len(rows), len(self.base))), axis=1)
+        self.shoe[rows] = shoes
+        # counts[:, i] is the Hi-Lo running count after dealing i cards
+        self.counts[rows, 0] = 0
+        self.counts[rows, 1:] = np.cumsum(HI_LO[shoes], axis=1)
+        self.pos[rows] = 0
+
+    def _draw(self, mask):
+        """Draw one card for each lane in mask; other lanes get 0."""
+        cards = np.where(mask, self.shoe[self.lane_ids, self.pos], 0).astype(np.int64)
+        self.pos += mask
+        return cards
+
+    def play_round(self, result: SimulationResult) -> None:
+        rules = self.rules
+        lanes = self.lanes
+        everyone = np.ones(lanes, dtype=bool)
+        self._shuffle(self.pos >= self.cut)
+
+        # True count at the start of the round
+        running = self.counts[self.lane_ids, self.pos]
+        decks_left = (self.shoe_cards - self.pos) / 52.0
+        true_count = np.clip(np.trunc(running / np.maximum(decks_left, 0.5)),
+                             -TRUE_COUNT_RANGE, TRUE_COUNT_RANGE).astype(np.int64)
+
+        p1 = self._draw(everyone)
+        up = self._draw(everyone)
+        p2 = self._draw(everyone)
+        hole = self._draw(everyone)
+
+        zero = np.zeros(lanes, dtype=np.int64)
+        dealer_total, dealer_soft = add_card(*add_card(zero, zero, up), hole)
+        dealer_bj = dealer_total == 21
+
+        # Hands: up to two per lane (one split, no resplitting)
+        total = np.zeros((lanes, 2), dtype=np.int64)
+        soft = np.zeros((lanes, 2), dtype=np.int64)
+        ncards = np.zeros((lanes, 2), dtype=np.int64)
+        bet = np.ones((lanes, 2), dtype=np.int64)
+        total[:, 0], soft[:, 0] = add_card(*add_card(zero, zero, p1), p2)
+        ncards[:, 0] = 2
+        player_bj = total[:, 0] == 21
+        split = np.zeros(lanes, dtype=bool)
+        has_hand = np.zeros((lanes, 2), dtype=bool)
+        has_hand[:, 0] = True
+
+        # Dealer peeks: blackjacks settle before the player acts
+        in_play = ~(dealer_bj | player_bj)
+        done = np.zeros((lanes, 2), dtype=bool)
+        done[~in_play] = True
+
+        for h in range(2):
+            active = has_hand[:, h] & ~done[:, h]
+            while active.any():
+                t = total[:, h]
+                s = soft[:, h] > 0
+                two_cards = ncards[:, h] == 2
+                can_split = active & two_cards & ~split & (p1 == p2) & (h == 0)
+                hand_class = np.where(can_split, PAIR, np.where(s, SOFT, HARD))
+                value = np.where(can_split, p1, np.where(s, np.clip(t - 11, 2, 10), np.clip(t, 0, 21)))
+                action = STRATEGY_CODES[table_index(hand_class, value, up)].astype(np.int64)
+
+                can_double = two_cards & (~split | rules.double_after_split)
+                blocked = (action == DOUBLE) & ~can_double
+                action = np.where(blocked, np.where(s & (t >= 18), STAND, HIT), action)
+
+                stand = active & (action == STAND)
+                hit = active & (action == HIT)
+                double = active & (action == DOUBLE)
+                do_split = active & (action == SPLIT)
+
+                done[stand, h] = True
+
+                if do_split.any():
+                    split |= do_split
+                    has_hand[do_split, 1] = True
+                    for k, card in ((0, p1), (1, p2)):
+                        t0, s0 = add_card(zero, zero, np.where(do_split, card, 0))
+                        t1, s1 = add_card(t0, s0, self._draw(do_split))
+                        total[do_split, k] = t1[do_split]
+                        soft[do_split, k] = s1[do_split]
+                        ncards[do_split, k] = 2
+                    # Split aces get one card each
+                    aces = do_split & (p1 == 11)
+                    done[aces, :] = True
+
+                drawing = hit | double
+                if drawing.any():
+                    t1, s1 = add_card(total[:, h], soft[:, h], self._draw(drawing))
+                    total[drawing, h] = t1[drawing]
+                    soft[drawing, h] = s1[drawing]
+                    ncards[drawing, h] += 1
+                    bet[double, h] = 2
+                    done[double, h] = True
+                    done[drawing & (total[:, h] >= 21), h] = True
+
+                active = has_hand[:, h] & ~done[:, h]
+
+        # Dealer draws only if some player hand is still standing
+        live = in_play & ((has_hand & (total <= 21)).any(axis=1))
+        while True:
+            needs = live & ((dealer_total < 17) |
+                            (rules.hit_soft_17 & (dealer_total == 17) & (dealer_soft > 0)))
+            if not needs.any():
+                break
+            t1, s1 = add_card(dealer_total, dealer_soft, self._draw(needs))
+            dealer_total = np.where(needs, t1, dealer_total)
+            dealer_soft = np.where(needs, s1, dealer_soft)
+
+        # Settle each hand
+        bust = total > 21
+        dealer_bust = (dealer_total > 21)[:, None]
+        dealer_cmp = dealer_total[:, None]
+        outcome = np.where(bust, -1, np.where(dealer_bust | (total > dealer_cmp), 1,
+                                              np.where(total < dealer_cmp, -1, 0)))
+        profit = (outcome * bet * has_hand).sum(axis=1).astype(np.float64)
+        profit = np.where(player_bj & ~dealer_bj, rules.blackjack_payout, profit)
+        profit = np.where(dealer_bj & ~player_bj, -1.0, profit)
+        profit = np.where(dealer_bj & player_bj, 0.0, profit)
+
+        result.rounds += lanes
+        result.hands += int(has_hand.sum())
+        result.total += float(profit.sum())
+        result.total_sq += float((profit * profit).sum())
+        buckets = true_count + TRUE_COUNT_RANGE
+        result.tc_rounds += np.bincount(buckets, minlength=len(result.tc_rounds))
+        result.tc_total += np.bincount(buckets, weights=profit, minlength=len(result.tc_total))
+
+
+def _simulate_chunk(args) -> SimulationResult:
+    rounds, rules, lanes, seed = args
+    simulator = ShoeSimulator(rules, lanes=lanes, seed=seed)
+    result = SimulationResult()
+    while result.rounds < rounds:
+        simulator.play_round(result)
+    return result
+
+
+def simulate(rounds: int, rules: Optional[TableRules] = None, workers: int = 1,
+             lanes: int = 4096, seed: Optional[int] = None) -> SimulationResult:
+    """
+    Simulate at least `rounds` rounds of one player against the dealer.
+    With workers > 1 the rounds are split across a process pool, each
+    worker seeded independently from `seed`.
+    """
+    rules = rules or TableRules()
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    per_worker = -(-rounds // max(workers, 1))
+    lanes = min(lanes, per_worker)
+    chunks = [(per_worker, rules, lanes, s) for s in seeds]
+
+    result = SimulationResult()
+    if workers <= 1:
+        result.merge(_simulate_chunk(chunks[0]))
+        return result
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_result in pool.map(_simulate_chunk, chunks):
+            result.merge(chunk_result)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo blackjack simulator for the basic strategy")
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--penetration", type=float, default=0.75)
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17 (default: stands)")
+    parser.add_argument("--no-das", action="store_true", help="no doubling after splitting")
+    parser.add_argument("--blackjack-payout", type=float, default=1.5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lanes", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rules = TableRules(decks=args.decks, penetration=args.penetration, hit_soft_17=args.h17,
+                       double_after_split=not args.no_das, blackjack_payout=args.blackjack_payout)
+    start = time.perf_counter()
+    result = simulate(args.rounds, rules, workers=args.workers, lanes=args.lanes, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    stderr = (result.variance / result.rounds) ** 0.5
+    print(f"rules: {rules.describe()}")
+    print(f"rounds: {result.rounds}  hands: {result.hands}  "
+          f"({result.rounds / elapsed * 60:,.0f} rounds/min on {args.workers} worker(s))")
+    print(f"EV per round: {result.ev:+.4%} ± {1.96 * stderr:.4%} (95%)")
+    print(f"variance per round: {result.variance:.4f}  std dev: {result.variance ** 0.5:.4f}")
+    print("true count   rounds       EV")
+    for tc, (ev, count) in result.ev_by_true_count().items():
+        print(f"{tc:+10d} {count:9d} {ev:+8.2%}")
+
+
+if __name__ == "__main__":
+    main()
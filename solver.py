@@ -0,0 +1,285 @@
+"""
+Composition-dependent blackjack strategy solver.
+
+Computes the expected value of hitting, standing, doubling and splitting
+from the cards actually left in the shoe rather than a fixed chart.
+Dealer outcome probabilities are found by recursion over the remaining
+deck, memoized by deck composition and kept in a bounded LRU cache, so
+consecutive frames of the same round reuse them.
+
+Results are not carried over when a card leaves the shoe. Every state
+the recursion memoizes is keyed by the sub-deck left at that point, and
+removing one card shifts all of them: none of the dealer states for a
+composition reappear once a card is removed. A new composition is solved
+cold, in a few milliseconds, off the event loop.
+
+The dealer's draws deplete the deck exactly. The player's hit tree draws
+with the card probabilities of the composition at decision time, and the
+dealer distribution is the one for that composition too; a few cards out
+of a shoe move those probabilities far less than the cards already seen,
+and it keeps a decision within a few milliseconds.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from strategy import RANK_VALUES, hand_total
+
+# Dealer outcomes: final totals 17-21, then bust
+OUTCOMES = 6
+BUST = 5
+
+
+def full_shoe(decks: int) -> List[int]:
+    """
+    Card counts of a fresh shoe. Composition vectors are indexed by card
+    value - 2: 2-9, then ten-value cards, then aces.
+    """
+    return [4 * decks] * 8 + [16 * decks, 4 * decks]
+
+
+def add_card(total: int, soft: bool, value: int) -> Tuple[int, bool]:
+    """Add a card value (11 for an ace) to a hand total."""
+    if value == 11:
+        if total + 11 <= 21:
+            return total + 11, True
+        value = 1
+    total += value
+    if total > 21 and soft:
+        return total - 10, False
+    return total, soft
+
+
+def _remove(deck: tuple, slot: int) -> tuple:
+    return deck[:slot] + (deck[slot] - 1,) + deck[slot + 1:]
+
+
+class Composition:
+    """
+    Cards left in a shoe. Removing a seen card is O(1); key() is the
+    hashable composition vector the solver caches on.
+    """
+
+    def __init__(self, decks: int = 6):
+        self.decks = decks
+        self.counts = full_shoe(decks)
+        self.remaining = sum(self.counts)
+
+    def remove(self, rank: str) -> None:
+        """Take a seen card out of the shoe. Ignores unknown ranks and exhausted cards."""
+        value = RANK_VALUES.get(rank)
+        if value is None:
+            return
+        slot = value - 2
+        if self.counts[slot] > 0:
+            self.counts[slot] -= 1
+            self.remaining -= 1
+
+    def reset(self) -> None:
+        """Start a fresh shoe."""
+        self.counts = full_shoe(self.decks)
+        self.remaining = sum(self.counts)
+
+    def key(self) -> tuple:
+        """Hashable snapshot of the counts."""
+        return tuple(self.counts)
+
+
+class StrategySolver:
+    """
+    Exact-EV decisions for a hand against a dealer upcard and a shoe
+    composition. Results are cached in LRUs bounded by cache_size entries.
+    """
+
+    def __init__(self, hit_soft_17: bool = False, double_after_split: bool = True, cache_size: int = 256):
+        self.hit_soft_17 = hit_soft_17
+        self.double_after_split = double_after_split
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._dealer_cache = OrderedDict()  # (deck, upcard) -> outcome distribution
+        self._decision_cache = OrderedDict()  # (deck, hand key, upcard) -> EVs
+        self._lock = threading.Lock()
+
+    def _cache_get(self, cache: OrderedDict, key) -> Optional[object]:
+        with self._lock:
+            value = cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _cache_put(self, cache: OrderedDict, key, value) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._dealer_cache.clear()
+            self._decision_cache.clear()
+
+    def stats(self) -> dict:
+        """Cache hit/miss counters and current sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "dealer_entries": len(self._dealer_cache),
+                "decision_entries": len(self._decision_cache),
+                "max_entries": self.cache_size,
+            }
+
+    def dealer_distribution(self, deck: tuple, upcard: int) -> tuple:
+        """
+        Probabilities of the dealer finishing on 17-21 or busting, given
+        the upcard value and no dealer blackjack (the dealer has peeked).
+        """
+        key = (deck, upcard)
+        cached = self._cache_get(self._dealer_cache, key)
+        if cached is not None:
+            return cached
+
+        memo = {}
+        total, soft = add_card(0, False, upcard)
+        result = [0.0] * OUTCOMES
+        weight = 0
+        for slot, count in enumerate(deck):
+            value = slot + 2
+            if not count or upcard + value == 21:
+                continue  # a hole card making blackjack was ruled out by the peek
+            weight += count
+            sub = self._dealer(_remove(deck, slot), *add_card(total, soft, value), memo)
+            for i in range(OUTCOMES):
+                result[i] += count * sub[i]
+        distribution = tuple(p / weight for p in result) if weight else tuple(result)
+        self._cache_put(self._dealer_cache, key, distribution)
+        return distribution
+
+    def _dealer(self, deck: tuple, total: int, soft: bool, memo: dict) -> tuple:
+        if total > 21:
+            return (0.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+        if total >= 17 and not (self.hit_soft_17 and total == 17 and soft):
+            result = [0.0] * OUTCOMES
+            result[total - 17] = 1.0
+            return tuple(result)
+        key = (deck, total, soft)
+        cached = memo.get(key)
+        if cached is not None:
+            return cached
+
+        remaining = sum(deck)
+        result = [0.0] * OUTCOMES
+        for slot, count in enumerate(deck):
+            if not count:
+                continue
+            sub = self._dealer(_remove(deck, slot), *add_card(total, soft, slot + 2), memo)
+            p = count / remaining
+            for i in range(OUTCOMES):
+                result[i] += p * sub[i]
+        result = tuple(result)
+        memo[key] = result
+        return result
+
+    @staticmethod
+    def _stand(total: int, dealer: tuple) -> float:
+        if total > 21:
+            return -1.0
+        ev = dealer[BUST]
+        for i in range(BUST):
+            if total > 17 + i:
+                ev += dealer[i]
+            elif total < 17 + i:
+                ev -= dealer[i]
+        return ev
+
+    def _play(self, probs: tuple, total: int, soft: bool, dealer: tuple, memo: dict) -> float:
+        """EV of the best of hitting and standing from here on."""
+        if total > 21:
+            return -1.0
+        key = (total, soft)
+        cached = memo.get(key)
+        if cached is not None:
+            return cached
+        ev = max(self._stand(total, dealer), self._hit(probs, total, soft, dealer, memo))
+        memo[key] = ev
+        return ev
+
+    def _hit(self, probs: tuple, total: int, soft: bool, dealer: tuple, memo: dict) -> float:
+        ev = 0.0
+        for slot, p in enumerate(probs):
+            if p:
+                ev += p * self._play(probs, *add_card(total, soft, slot + 2), dealer, memo)
+        return ev
+
+    def _double(self, probs: tuple, total: int, soft: bool, dealer: tuple) -> float:
+        ev = 0.0
+        for slot, p in enumerate(probs):
+            if p:
+                ev += p * self._stand(add_card(total, soft, slot + 2)[0], dealer)
+        return 2 * ev
+
+    def _split(self, probs: tuple, value: int, dealer: tuple, memo: dict) -> float:
+        """Two hands each starting with one card of the pair; no resplitting."""
+        start = add_card(0, False, value)
+        ev = 0.0
+        for slot, p in enumerate(probs):
+            if not p:
+                continue
+            total, soft = add_card(*start, slot + 2)
+            if value == 11:
+                hand = self._stand(total, dealer)  # split aces get one card
+            else:
+                hand = self._play(probs, total, soft, dealer, memo)
+                if self.double_after_split:
+                    hand = max(hand, self._double(probs, total, soft, dealer))
+            ev += p * hand
+        return 2 * ev
+
+    def evaluate(self, deck: tuple, player_ranks: List[str], dealer_rank: str) -> Dict[str, float]:
+        """
+        Expected value per unit bet of each legal action: 'H', 'S', and for
+        two-card hands 'D' and, for pairs, 'SP'. Empty once the hand is bust.
+        deck is the composition left after every seen card, including these.
+        """
+        total, soft = hand_total(player_ranks)
+        if total > 21 or not any(deck):
+            return {}
+        two_cards = len(player_ranks) == 2
+        pair = two_cards and RANK_VALUES[player_ranks[0]] == RANK_VALUES[player_ranks[1]]
+        upcard = RANK_VALUES[dealer_rank]
+        hand_key = (total, soft, RANK_VALUES[player_ranks[0]] if pair else 0, two_cards)
+        key = (deck, hand_key, upcard)
+        cached = self._cache_get(self._decision_cache, key)
+        if cached is not None:
+            return cached
+
+        dealer = self.dealer_distribution(deck, upcard)
+        remaining = sum(deck)
+        probs = tuple(count / remaining for count in deck)
+        memo = {}
+        evs = {
+            'S': self._stand(total, dealer),
+            'H': self._hit(probs, total, soft, dealer, memo),
+        }
+        if two_cards:
+            evs['D'] = self._double(probs, total, soft, dealer)
+        if pair:
+            evs['SP'] = self._split(probs, RANK_VALUES[player_ranks[0]], dealer, memo)
+        self._cache_put(self._decision_cache, key, evs)
+        return evs
+
+    def best_action(self, deck: tuple, player_ranks: List[str], dealer_rank: str) -> Optional[str]:
+        """Highest-EV action, or None once the hand is bust."""
+        evs = self.evaluate(deck, player_ranks, dealer_rank)
+        if not evs:
+            return None
+        return max(evs, key=evs.get)
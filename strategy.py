@@ -0,0 +1,209 @@
+"""
+Blackjack basic strategy tables.
+
+The charts are expanded once at import time into a flat lookup table so a
+recommendation is a couple of dict lookups and one list index instead of
+rebuilding the charts on every frame. Hands that can no longer double or
+split (after a hit, or a split hand waiting for its second card) have their
+own rows with those actions already resolved, as do pairs that may split
+but not double, so any hand is one index.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+# Normalized rank codes: face cards collapse to 10 and aces are 11
+RANK_VALUES = {
+    'A': 11, 'K': 10, 'Q': 10, 'J': 10, '10': 10,
+    '9': 9, '8': 8, '7': 7, '6': 6, '5': 5, '4': 4, '3': 3, '2': 2,
+}
+
+# Hand classes used as the first table dimension
+HARD = 0
+SOFT = 1
+PAIR = 2
+HARD_HIT = 3  # hard hand that can no longer double or split
+SOFT_HIT = 4  # soft hand that can no longer double or split
+PAIR_HIT = 5  # pair that can still split but can no longer double
+HAND_CLASSES = 6
+
+DEALER_VALUES = range(2, 12)  # 2-10, 11 = ace
+PLAYER_SLOTS = 22  # player value 0-21
+DEALER_SLOTS = 10
+
+
+def table_index(hand_class: int, player_value: int, dealer_value: int) -> int:
+    """
+    Flat index for (hand class, player value, dealer upcard value).
+    Also works elementwise on NumPy arrays.
+    """
+    return (hand_class * PLAYER_SLOTS + player_value) * DEALER_SLOTS + dealer_value - 2
+
+
+def hand_total(ranks: Iterable[str]) -> Tuple[int, bool]:
+    """
+    Blackjack total of a hand and whether it is soft.
+    Aces count as 11, dropping to 1 one at a time while the hand would bust;
+    the hand is soft while an ace is still counted as 11.
+    """
+    total = 0
+    aces = 0
+    for rank in ranks:
+        value = RANK_VALUES[rank]
+        total += value
+        if value == 11:
+            aces += 1
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    return total, aces > 0
+
+
+def _hard_action(total: int, d: int) -> str:
+    if total <= 8:
+        return 'H'
+    if total == 9:
+        return 'D' if d in (3, 4, 5, 6) else 'H'
+    if total == 10:
+        return 'D' if d not in (10, 11) else 'H'
+    if total == 11:
+        return 'D'
+    if total == 12:
+        return 'S' if d in (4, 5, 6) else 'H'
+    if total <= 16:
+        return 'S' if d in (2, 3, 4, 5, 6) else 'H'
+    return 'S'
+
+
+def _soft_action(other: int, d: int) -> str:
+    """Soft hand A + other, where other is the value of the non-ace card."""
+    if other <= 1:
+        return 'H'  # a lone ace, or A,A when not splitting
+    if other in (2, 3):
+        return 'D' if d in (5, 6) else 'H'
+    if other in (4, 5):
+        return 'D' if d in (4, 5, 6) else 'H'
+    if other == 6:
+        return 'D' if d in (3, 4, 5, 6) else 'H'
+    if other == 7:
+        return 'D' if d in (2, 3, 4, 5, 6) else ('S' if d in (7, 8) else 'H')
+    if other == 8:
+        return 'D' if d == 6 else 'S'
+    return 'S'  # A,9 and A,10 (blackjack)
+
+
+def _pair_action(card: int, d: int) -> str:
+    if card in (2, 3, 7):
+        return 'SP' if d in (2, 3, 4, 5, 6, 7) else 'H'
+    if card == 4:
+        return 'SP' if d in (5, 6) else 'H'
+    if card == 5:
+        return 'D' if d in (2, 3, 4, 5, 6, 7, 8, 9) else 'H'
+    if card == 6:
+        return 'SP' if d in (2, 3, 4, 5, 6) else 'H'
+    if card == 8:
+        return 'SP'
+    if card == 9:
+        return 'SP' if d in (2, 3, 4, 5, 6, 8, 9) else 'S'
+    if card == 10:
+        return 'S'
+    return 'SP'  # A,A
+
+
+def build_strategy_table() -> List[str]:
+    """
+    Expand the basic strategy charts into a flat list indexed by
+    table_index(hand_class, player_value, dealer_value).
+
+    Hard rows are keyed by total, soft rows by the value of the non-ace
+    card and pair rows by the value of one card of the pair. The HARD_HIT
+    and SOFT_HIT rows are keyed by total; a double there becomes a hit, or
+    a stand on soft 18 and up. PAIR_HIT rows play a pair that would double
+    as the hard total without doubling.
+    """
+    table = [''] * (HAND_CLASSES * PLAYER_SLOTS * DEALER_SLOTS)
+    for d in DEALER_VALUES:
+        for total in range(PLAYER_SLOTS):
+            table[table_index(HARD, total, d)] = _hard_action(total, d)
+            action = _hard_action(total, d)
+            table[table_index(HARD_HIT, total, d)] = 'H' if action == 'D' else action
+        for other in range(11):
+            table[table_index(SOFT, other, d)] = _soft_action(other, d)
+            action = _soft_action(other, d)
+            if action == 'D':
+                action = 'S' if other >= 7 else 'H'
+            table[table_index(SOFT_HIT, other + 11, d)] = action
+        for card in range(2, 12):
+            action = _pair_action(card, d)
+            table[table_index(PAIR, card, d)] = action
+            if action == 'D':
+                action = table[table_index(HARD_HIT, 2 * card, d)]
+            table[table_index(PAIR_HIT, card, d)] = action
+    return table
+
+
+STRATEGY_TABLE = build_strategy_table()
+
+
+def strategy_index(d, p1, p2, player_total) -> int:
+    """
+    Table slot for a two-card hand against a dealer upcard.
+    Raises KeyError for an unknown rank.
+    """
+    dealer = RANK_VALUES[d]
+    v1 = RANK_VALUES[p1]
+    v2 = RANK_VALUES[p2]
+
+    if v1 == v2:
+        return table_index(PAIR, v1, dealer)
+    if v1 == 11:
+        return table_index(SOFT, v2, dealer)
+    if v2 == 11:
+        return table_index(SOFT, v1, dealer)
+    return table_index(HARD, player_total, dealer)
+
+
+def get_strategy(d, p1, p2, player_total):
+    """
+    Look up the basic strategy action for a two-card hand.
+
+    d, p1 and p2 are card ranks (A, 2-10, J, Q, K). Returns 'H', 'S', 'D'
+    or 'SP'. Raises KeyError for an unknown rank.
+    """
+    return STRATEGY_TABLE[strategy_index(d, p1, p2, player_total)]
+
+
+def hand_signature(ranks: List[str], can_double: bool = True, can_split: bool = True) -> Optional[Tuple[int, int]]:
+    """
+    Compact (hand class, value) key for a hand of any size, or None once
+    the hand is bust.
+
+    Only a two-card hand may double or split. can_double and can_split
+    carry independent table rules such as no double after split or a
+    resplit limit. Raises KeyError for an unknown rank.
+    """
+    total, soft = hand_total(ranks)
+    if total > 21:
+        return None
+    if len(ranks) == 2:
+        if can_split and RANK_VALUES[ranks[0]] == RANK_VALUES[ranks[1]]:
+            return (PAIR if can_double else PAIR_HIT), RANK_VALUES[ranks[0]]
+        if can_double:
+            return (SOFT, total - 11) if soft else (HARD, total)
+    return (SOFT_HIT, total) if soft else (HARD_HIT, total)
+
+
+def hand_index(d: str, ranks: List[str], can_double: bool = True, can_split: bool = True) -> Optional[int]:
+    """Table slot for a hand against a dealer upcard, None if the hand is bust."""
+    signature = hand_signature(ranks, can_double, can_split)
+    if signature is None:
+        return None
+    return table_index(signature[0], signature[1], RANK_VALUES[d])
+
+
+def recommend(d: str, ranks: List[str], can_double: bool = True, can_split: bool = True) -> Optional[str]:
+    """
+    Basic strategy action for any hand: 'H', 'S', 'D' or 'SP', or None
+    once the hand is bust. Raises KeyError for an unknown rank.
+    """
+    slot = hand_index(d, ranks, can_double, can_split)
+    return None if slot is None else STRATEGY_TABLE[slot]
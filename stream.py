@@ -0,0 +1,228 @@
+"""
+Server-side consumer of the ESP32 camera's MJPEG stream.
+
+The firmware's stream handler sends a multipart/x-mixed-replace response:
+each part is a boundary line, a few headers including Content-Length and
+the JPEG bytes. The parser copies each body straight into its own frame
+buffer as chunks arrive. Only the newest frame is kept, so the analysis
+loop always works on what the camera sees now and never falls behind the
+stream; older frames are dropped unanalyzed.
+"""
+
+import asyncio
+import re
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+import httpx
+
+# Boundary used by the CameraWebServer firmware
+DEFAULT_BOUNDARY = "123456789000000000000987654321"
+
+_BOUNDARY_PATTERN = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_MAX_HEADER_BYTES = 4096
+
+
+def parse_boundary(content_type: Optional[str]) -> Optional[str]:
+    """Boundary parameter of a multipart Content-Type header, if any."""
+    if not content_type:
+        return None
+    match = _BOUNDARY_PATTERN.search(content_type)
+    if match is None:
+        return None
+    boundary = match.group(1).strip()
+    # Some servers include the leading dashes in the parameter
+    return boundary[2:] if boundary.startswith("--") else boundary
+
+
+class MJPEGParser:
+    """
+    Incremental multipart parser. feed() takes chunks as they arrive and
+    returns the frames they complete. Parts with a Content-Length are
+    copied once, into a buffer of exactly that size; parts without one
+    end at the next boundary.
+    """
+
+    def __init__(self, boundary: str = DEFAULT_BOUNDARY):
+        self.delimiter = b"--" + boundary.encode("ascii")
+        self._buffer = bytearray()  # boundary and header bytes, or an unsized body
+        self._frame: Optional[bytearray] = None  # sized body being filled
+        self._filled = 0
+        self._unsized = False
+
+    def feed(self, chunk: bytes) -> List[bytearray]:
+        """Parse a chunk of the stream, returning any frames it completes."""
+        frames = []
+        data = memoryview(chunk)
+        while data:
+            if self._frame is not None:
+                take = min(len(data), len(self._frame) - self._filled)
+                self._frame[self._filled:self._filled + take] = data[:take]
+                self._filled += take
+                data = data[take:]
+                if self._filled == len(self._frame):
+                    frames.append(self._frame)
+                    self._frame = None
+                continue
+
+            self._buffer += data
+            data = memoryview(b"")
+            while True:
+                buffer = self._buffer
+                if self._unsized:
+                    end = buffer.find(b"\r\n" + self.delimiter)
+                    if end < 0:
+                        break
+                    frames.append(buffer[:end])
+                    del buffer[:end + 2]
+                    self._unsized = False
+                    continue
+
+                start = buffer.find(self.delimiter)
+                if start < 0:
+                    # Keep only a tail that could be the start of a boundary
+                    del buffer[:max(len(buffer) - len(self.delimiter), 0)]
+                    break
+                headers_end = buffer.find(b"\r\n\r\n", start)
+                if headers_end < 0:
+                    if len(buffer) - start > _MAX_HEADER_BYTES:
+                        del buffer[:start + len(self.delimiter)]  # not a real part, resync
+                        continue
+                    break
+
+                length = self._content_length(bytes(buffer[start:headers_end]))
+                rest = buffer[headers_end + 4:]
+                if length:
+                    self._frame = bytearray(length)
+                    self._filled = 0
+                    self._buffer = bytearray()
+                    data = memoryview(rest)
+                    break
+                self._buffer = rest
+                self._unsized = True
+        return frames
+
+    @staticmethod
+    def _content_length(headers: bytes) -> Optional[int]:
+        for line in headers.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                try:
+                    return int(value.strip())
+                except ValueError:
+                    return None
+        return None
+
+
+class LatestFrame:
+    """Single-slot mailbox: put() replaces any frame not yet taken."""
+
+    def __init__(self):
+        self.dropped = 0
+        self._frame = None
+        self._ready = asyncio.Event()
+
+    def put(self, frame: Any) -> None:
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._ready.set()
+
+    async def take(self) -> Any:
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class StreamConsumer:
+    """
+    Pulls an MJPEG stream and hands the newest frame to handler at most fps
+    times a second. Reconnects with backoff when the stream drops.
+    """
+
+    def __init__(self, url: str, handler: Callable[[bytearray], Awaitable[Any]], fps: float = 2.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0,
+                 client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self.handler = handler
+        self.fps = fps
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.frames_received = 0
+        self.frames_analyzed = 0
+        self.errors = 0
+        self.connected = False
+        self.last_result = None
+        self._client = client
+        self._latest = LatestFrame()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the reader and analysis tasks on the running event loop."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._analyze_loop())]
+
+    async def close(self) -> None:
+        """Stop both tasks."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self.connected = False
+
+    def stats(self) -> dict:
+        """Stream connection state and frame counters."""
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "frames_received": self.frames_received,
+            "frames_dropped": self._latest.dropped,
+            "frames_analyzed": self.frames_analyzed,
+            "errors": self.errors,
+        }
+
+    async def _read_loop(self) -> None:
+        delay = self.reconnect_delay
+        client = self._client or httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))
+        try:
+            while True:
+                try:
+                    await self._read_stream(client)
+                    delay = self.reconnect_delay
+                except (httpx.HTTPError, OSError):
+                    self.errors += 1
+                self.connected = False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            if self._client is None:
+                await client.aclose()
+
+    async def _read_stream(self, client: httpx.AsyncClient) -> None:
+        async with client.stream("GET", self.url) as response:
+            response.raise_for_status()
+            boundary = parse_boundary(response.headers.get("content-type")) or DEFAULT_BOUNDARY
+            parser = MJPEGParser(boundary)
+            self.connected = True
+            async for chunk in response.aiter_raw():
+                for frame in parser.feed(chunk):
+                    self.frames_received += 1
+                    self._latest.put(frame)
+
+    async def _analyze_loop(self) -> None:
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        while True:
+            frame = await self._latest.take()
+            started = time.monotonic()
+            try:
+                self.last_result = await self.handler(frame)
+                self.frames_analyzed += 1
+            except Exception:
+                self.errors += 1
+            # Frames arriving meanwhile replace each other in the slot
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0.0))
@@ -0,0 +1,107 @@
+"""
+Tests for frame admission control
+"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionControl, Rejected
+
+
+async def frame(admission, table_id, work, log, name):
+    """Admit a frame, hold its slot for work seconds, and log the outcome."""
+    try:
+        await admission.acquire(table_id)
+    except Rejected as e:
+        log.append((name, e.reason))
+        return
+    try:
+        await asyncio.sleep(work)
+        log.append((name, "done"))
+    finally:
+        admission.release(table_id)
+
+
+class TestAdmissionControl:
+    """Test single-flight tables, latest-frame-wins and overload rejection."""
+
+    def test_latest_frame_wins(self):
+        """Test only the newest waiting frame of a table is analyzed."""
+        admission = AdmissionControl()
+        log = []
+
+        async def scenario():
+            tasks = []
+            for i in range(4):
+                tasks.append(asyncio.create_task(frame(admission, "t1", 0.02, log, i)))
+                await asyncio.sleep(0.001)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(scenario())
+        assert sorted(log) == [(0, "done"), (1, "superseded"), (2, "superseded"), (3, "done")]
+        assert log.index((3, "done")) > log.index((0, "done"))
+        assert admission.stats() == {"active": 0, "queued": 0, "admitted": 2,
+                                     "dropped": {"superseded": 2, "queue_full": 0, "deadline": 0}}
+
+    def test_tables_run_in_parallel(self):
+        """Test frames of different tables do not wait for each other."""
+        admission = AdmissionControl(max_active=4)
+        log = []
+
+        async def scenario():
+            await asyncio.gather(*(frame(admission, f"t{i}", 0.05, log, i) for i in range(4)))
+
+        asyncio.run(scenario())
+        assert len(log) == 4 and all(outcome == "done" for _, outcome in log)
+        assert admission.dropped["superseded"] == 0
+
+    def test_queue_full_rejected_fast(self):
+        """Test frames past the queue depth are rejected without waiting."""
+        admission = AdmissionControl(max_active=1, max_queued=1, retry_after=2.5)
+        log = []
+
+        async def scenario():
+            running = asyncio.create_task(frame(admission, "t1", 0.05, log, "running"))
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(frame(admission, "t2", 0, log, "waiting"))
+            await asyncio.sleep(0)
+            with pytest.raises(Rejected) as rejected:
+                await admission.acquire("t3")
+            assert rejected.value.reason == "queue_full"
+            assert admission.queued == 1
+            await asyncio.gather(running, waiting)
+
+        asyncio.run(scenario())
+        assert log == [("running", "done"), ("waiting", "done")]
+        assert admission.retry_after_header() == "3"
+
+    def test_deadline(self):
+        """Test a frame that cannot start in time is dropped."""
+        admission = AdmissionControl(max_active=1, deadline=0.01)
+        log = []
+
+        async def scenario():
+            await asyncio.gather(frame(admission, "t1", 0.05, log, "slow"), frame(admission, "t2", 0, log, "late"))
+
+        asyncio.run(scenario())
+        assert log == [("late", "deadline"), ("slow", "done")]
+        assert admission.stats()["queued"] == 0
+
+    def test_cancelled_waiter_gives_up_its_place(self):
+        """Test a client that disconnects while waiting does not hold a slot."""
+        admission = AdmissionControl(max_active=1)
+        log = []
+
+        async def scenario():
+            running = asyncio.create_task(frame(admission, "t1", 0.02, log, "running"))
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(admission.acquire("t2"))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+            await frame(admission, "t3", 0, log, "next")
+
+        asyncio.run(scenario())
+        assert log == [("running", "done"), ("next", "done")]
+        assert admission.stats()["active"] == 0
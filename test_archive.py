@@ -0,0 +1,113 @@
+"""
+Tests for the frame archive
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from archive import ArchiveReader, ArchiveWriter, CorruptRecord
+
+
+def state(*ranks):
+    return {"player_cards": [{"rank": r, "suit": "hearts", "confidence": 0.9} for r in ranks], "dealer_cards": []}
+
+
+def write(directory, count, **kwargs):
+    writer = ArchiveWriter(str(directory), **kwargs)
+    for i in range(count):
+        writer.append(f"table-{i % 2}", bytes([i % 256]) * (100 + i), f'{{"frame": {i}}}', state(str(i % 9 + 2)))
+    writer.flush()
+    writer._close_files()
+    return writer
+
+
+class TestArchive:
+    """Test appending, indexing and random access."""
+
+    def test_round_trip(self, tmp_path):
+        write(tmp_path, 3)
+        with ArchiveReader(str(tmp_path)) as reader:
+            assert len(reader) == 3
+            record = reader[1]
+            assert record.session_id == "table-1"
+            assert record.image == b"\x01" * 101
+            assert record.model_response == '{"frame": 1}'
+            assert record.game_state == state("3")
+            assert [r.image[0] for r in reader] == [0, 1, 2]
+            assert reader[-1].timestamp == reader.timestamp(2)
+            with pytest.raises(IndexError):
+                reader[3]
+
+    def test_pydantic_state_and_missing_response(self, tmp_path):
+        from main import Card, GameState
+        writer = ArchiveWriter(str(tmp_path))
+        writer.append("t1", b"jpeg", None, GameState(player_cards=[Card(rank="A", suit="spades", confidence=1.0)]))
+        writer.flush()
+        record = ArchiveReader(str(tmp_path))[0]
+        assert record.model_response is None
+        assert record.game_state["player_cards"][0]["rank"] == "A"
+
+    def test_segments_roll_over(self, tmp_path):
+        """Test records spread over segments stay addressable by position."""
+        write(tmp_path, 40, segment_bytes=1000)
+        segments = sorted(name for name in os.listdir(tmp_path) if name.endswith(".log"))
+        assert len(segments) > 3
+        with ArchiveReader(str(tmp_path)) as reader:
+            assert len(reader) == 40
+            assert [reader[i].image[0] for i in (0, 17, 39)] == [0, 17, 39]
+
+    def test_reopened_writer_starts_new_segment(self, tmp_path):
+        write(tmp_path, 2)
+        write(tmp_path, 2)
+        assert sorted(os.listdir(tmp_path)) == [
+            "segment-000001.idx", "segment-000001.log", "segment-000002.idx", "segment-000002.log"]
+        assert len(ArchiveReader(str(tmp_path))) == 4
+
+    def test_unindexed_tail_ignored(self, tmp_path):
+        """Test a crash after the data write but before the index write loses only that record."""
+        write(tmp_path, 2)
+        with open(tmp_path / "segment-000001.log", "ab") as f:
+            f.write(b"torn record")
+        with open(tmp_path / "segment-000001.idx", "ab") as f:
+            f.write(b"\x00" * 7)  # partial index entry
+        with ArchiveReader(str(tmp_path)) as reader:
+            assert len(reader) == 2
+            assert reader[1].image[0] == 1
+
+    def test_corruption_detected(self, tmp_path):
+        write(tmp_path, 1)
+        path = tmp_path / "segment-000001.log"
+        data = bytearray(path.read_bytes())
+        data[40] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with pytest.raises(CorruptRecord):
+            ArchiveReader(str(tmp_path))[0]
+        assert ArchiveReader(str(tmp_path), verify=False)[0].session_id == "table-0"
+
+    def test_pending_is_bounded(self, tmp_path):
+        """Test frames beyond max_pending are dropped instead of queued."""
+        writer = ArchiveWriter(str(tmp_path), max_pending=2)
+        assert [writer.append("t", b"x", None, {}) for _ in range(3)] == [True, True, False]
+        assert writer.stats()["dropped"] == 1
+        assert writer.flush() == 2
+
+    def test_background_writer(self, tmp_path):
+        """Test queued records are written in batches and on close."""
+        async def scenario():
+            writer = ArchiveWriter(str(tmp_path), flush_interval=60, flush_every=3)
+            writer.start()
+            for i in range(3):
+                writer.append("t", b"x", None, state("2"))
+            for _ in range(100):
+                if writer.records:
+                    break
+                await asyncio.sleep(0.01)
+            assert writer.records == 3
+            writer.append("t", b"y", None, state("3"))
+            await writer.close()
+
+        asyncio.run(scenario())
+        with ArchiveReader(str(tmp_path)) as reader:
+            assert [r.image for r in reader] == [b"x", b"x", b"x", b"y"]
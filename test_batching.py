@@ -0,0 +1,145 @@
+"""
+Tests for the micro-batching scheduler
+"""
+
+import asyncio
+import gc
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def make_batcher(max_batch=4, max_wait=0.01):
+    calls = []
+
+    async def handler(items):
+        calls.append(list(items))
+        return [item * 10 for item in items]
+
+    return MicroBatcher(handler, max_batch=max_batch, max_wait=max_wait), calls
+
+
+class TestMicroBatcher:
+    """Test grouping, dispatch and error propagation."""
+
+    def test_concurrent_items_share_a_batch(self):
+        """Test items submitted together are dispatched as one call."""
+        batcher, calls = make_batcher()
+
+        async def scenario():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+
+        assert asyncio.run(scenario()) == [0, 10, 20]
+        assert calls == [[0, 1, 2]]
+
+    def test_full_batches_split(self):
+        """Test more than max_batch items are split into several calls."""
+        batcher, calls = make_batcher(max_batch=2)
+
+        async def scenario():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+        assert asyncio.run(scenario()) == [0, 10, 20, 30, 40]
+        assert sorted(len(call) for call in calls) == [1, 2, 2]
+        assert batcher.stats()["items"] == 5
+
+    def test_window_collects_late_arrivals(self):
+        """Test an item arriving inside the window joins the open batch."""
+        batcher, calls = make_batcher(max_wait=0.05)
+
+        async def late(item):
+            await asyncio.sleep(0.01)
+            return await batcher.submit(item)
+
+        async def scenario():
+            return await asyncio.gather(batcher.submit(1), late(2))
+
+        assert asyncio.run(scenario()) == [10, 20]
+        assert calls == [[1, 2]]
+
+    def test_hold_keeps_items_until_released(self):
+        """Test a hold outlasts the window and only full batches go early."""
+        batcher, calls = make_batcher(max_batch=2, max_wait=0)
+
+        async def scenario():
+            batcher.hold()
+            first = [batcher.enqueue(i) for i in range(3)]
+            await asyncio.sleep(0.02)
+            assert calls == [[0, 1]]
+            later = batcher.enqueue(3)
+            await asyncio.sleep(0.02)
+            batcher.release()
+            return await asyncio.gather(*first, later)
+
+        assert asyncio.run(scenario()) == [0, 10, 20, 30]
+        assert calls == [[0, 1], [2, 3]]
+        assert batcher.stats()["holds"] == 0
+
+    def test_handler_error_fails_every_item(self):
+        """Test a failing batch call is raised to every waiting caller."""
+        async def handler(items):
+            raise RuntimeError("model unavailable")
+
+        batcher = MicroBatcher(handler, max_wait=0)
+
+        async def scenario():
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_short_result_list(self):
+        """Test a handler returning too few results does not hang callers."""
+        async def handler(items):
+            return items[:1]
+
+        batcher = MicroBatcher(handler, max_wait=0)
+
+        async def scenario():
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2))
+
+        with pytest.raises(ValueError):
+            asyncio.run(scenario())
+
+    def test_in_flight_batches_are_kept_alive(self):
+        """Test a running batch is referenced until it finishes, even across a garbage collection."""
+        release = None
+
+        async def handler(items):
+            await release.wait()
+            return items
+
+        batcher = MicroBatcher(handler, max_wait=0)
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            waiter = asyncio.ensure_future(batcher.submit(1))
+            await asyncio.sleep(0.01)
+            assert batcher.stats()["in_flight"] == 1
+            gc.collect()
+            release.set()
+            result = await waiter
+            await asyncio.sleep(0)
+            return result
+
+        assert asyncio.run(scenario()) == 1
+        assert batcher.stats()["in_flight"] == 0
+
+    def test_cancelled_batch_releases_waiters(self):
+        """Test waiters are cancelled rather than left hanging when their batch is cancelled."""
+        async def handler(items):
+            await asyncio.sleep(10)
+
+        batcher = MicroBatcher(handler, max_wait=0)
+
+        async def scenario():
+            waiter = asyncio.ensure_future(batcher.submit(1))
+            await asyncio.sleep(0.01)
+            for task in list(batcher._tasks):
+                task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(scenario())
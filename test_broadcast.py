@@ -0,0 +1,143 @@
+"""
+Tests for game state change push
+"""
+
+import asyncio
+import json
+
+from broadcast import StateHub, diff_states
+
+
+def card(rank, suit="hearts", confidence=0.9):
+    return {"rank": rank, "suit": suit, "confidence": confidence}
+
+
+def state(player=(), dealer=(), **fields):
+    return dict({"player_cards": [card(r) for r in player], "dealer_cards": [card(r) for r in dealer],
+                 "recommendation": None, "cumulative_running_count": 0}, **fields)
+
+
+def drain(subscription):
+    """Messages queued for a subscription, decoded."""
+    async def collect():
+        messages = []
+        while subscription.pending or subscription.resync:
+            messages.append(json.loads(await subscription.get()))
+        return messages
+    return asyncio.run(collect())
+
+
+class TestDiffStates:
+    def test_first_state_is_complete(self):
+        new = state(["K"])
+        assert diff_states(None, new) == new
+
+    def test_only_changed_fields(self):
+        old = state(["K", "6"], ["9"], recommendation="H", cumulative_running_count=0)
+        new = state(["K", "6", "3"], ["9"], recommendation="S", cumulative_running_count=1)
+        changes = diff_states(old, new)
+        assert set(changes) == {"player_cards", "recommendation", "cumulative_running_count"}
+        assert [c["rank"] for c in changes["player_cards"]] == ["K", "6", "3"]
+
+    def test_confidence_jitter_ignored(self):
+        old = state(["K"])
+        new = state(["K"])
+        new["player_cards"][0]["confidence"] = 0.7
+        assert diff_states(old, new) == {}
+
+    def test_removed_field_reported(self):
+        assert diff_states({"a": 1, "b": 2}, {"a": 1}) == {"b": None}
+
+
+class TestStateHub:
+    def test_snapshot_then_diffs(self):
+        hub = StateHub()
+        hub.publish("t1", state(["K"], ["9"]))
+        subscription = hub.subscribe("t1")
+        snapshot, = drain(subscription)
+        assert snapshot["type"] == "snapshot"
+        assert snapshot["seq"] == 1
+        assert snapshot["state"]["player_cards"][0]["rank"] == "K"
+
+        hub.publish("t1", state(["K", "5"], ["9"], recommendation="H"))
+        hub.publish("t1", state(["K", "5"], ["9"], recommendation="H"))  # unchanged, not sent
+        diff, = drain(subscription)
+        assert diff == {"type": "diff", "session_id": "t1", "seq": 2,
+                        "changes": {"player_cards": [card("K"), card("5")], "recommendation": "H"}}
+
+    def test_snapshot_covers_queued_diffs(self):
+        """Test diffs published before the snapshot is sent are not sent again."""
+        hub = StateHub()
+        subscription = hub.subscribe("t1")
+        hub.publish("t1", state(["K"]))
+        messages = drain(subscription)
+        assert [m["type"] for m in messages] == ["snapshot"]
+        assert messages[0]["seq"] == 1
+
+    def test_tables_are_separate(self):
+        hub = StateHub()
+        first, second = hub.subscribe("t1"), hub.subscribe("t2")
+        drain(first), drain(second)
+        hub.publish("t1", state(["A"]))
+        assert len(drain(first)) == 1
+        assert drain(second) == []
+
+    def test_fan_out_to_hundreds_of_subscribers(self):
+        """Test one analysis reaches every subscriber, serialized once."""
+        hub = StateHub()
+        subscriptions = [hub.subscribe("table") for _ in range(500)]
+        for subscription in subscriptions:
+            drain(subscription)
+        assert hub.publish("table", state(["10", "6"], ["9"], recommendation="H")) == 500
+
+        texts = [subscription.pending[0] for subscription in subscriptions]
+        assert all(text is texts[0] for text in texts)
+        received = [drain(subscription) for subscription in subscriptions]
+        assert all(len(messages) == 1 and messages[0]["changes"]["recommendation"] == "H" for messages in received)
+        assert hub.stats()["messages"] == 500
+
+    def test_waiting_subscribers_woken(self):
+        """Test subscribers blocked in get() all receive a publish."""
+        async def scenario():
+            hub = StateHub()
+            subscriptions = [hub.subscribe("table") for _ in range(200)]
+            for subscription in subscriptions:
+                await subscription.get()  # snapshot
+            waiting = [asyncio.create_task(subscription.get()) for subscription in subscriptions]
+            await asyncio.sleep(0)
+            hub.publish("table", state(["A"]))
+            return await asyncio.wait_for(asyncio.gather(*waiting), 1.0)
+
+        messages = asyncio.run(scenario())
+        assert len(messages) == 200
+        assert {json.loads(text)["type"] for text in messages} == {"diff"}
+
+    def test_slow_subscriber_resynced(self):
+        """Test a subscriber too far behind gets one snapshot instead of the backlog."""
+        hub = StateHub(max_pending=3)
+        subscription = hub.subscribe("t1")
+        drain(subscription)
+        for count in range(10):
+            hub.publish("t1", state(cumulative_running_count=count))
+        messages = drain(subscription)
+        assert messages[0]["type"] == "snapshot"
+        assert messages[0]["state"]["cumulative_running_count"] in range(6, 10)
+        assert messages[-1]["seq"] == 10
+
+    def test_patch(self):
+        hub = StateHub()
+        assert hub.patch("t1", {"cumulative_running_count": 0}) == 0  # nothing published yet
+        hub.publish("t1", state(cumulative_running_count=5))
+        subscription = hub.subscribe("t1")
+        drain(subscription)
+        hub.patch("t1", {"cumulative_running_count": 0})
+        assert drain(subscription)[0]["changes"] == {"cumulative_running_count": 0}
+
+    def test_unsubscribe_and_forget(self):
+        hub = StateHub()
+        subscription = hub.subscribe("t1")
+        hub.publish("t1", state(["K"]))
+        hub.forget("t1")
+        assert json.loads(hub.snapshot("t1"))["state"] == {}
+        hub.unsubscribe(subscription)
+        assert hub.stats()["tables"] == 0
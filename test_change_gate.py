@@ -0,0 +1,103 @@
+"""
+Tests for the change-detection gate
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from change_gate import ChangeGate, frame_difference, table_thumbnail
+
+TABLE = np.full((48, 64), 0.3, dtype=np.float32)
+
+
+def with_card(x, brightness=1.0):
+    """The table with a card-sized bright patch at column x."""
+    frame = TABLE.copy()
+    frame[10:30, x:x + 12] = brightness
+    return frame
+
+
+def analyze(gate, frame, now, result):
+    """Feed a frame; record result when the gate asks for analysis."""
+    reused = gate.check("table", frame, now=now)
+    if reused is None:
+        gate.record("table", frame, result)
+        return result
+    return reused
+
+
+class TestThumbnail:
+    def test_downsampled_grayscale(self):
+        image = Image.new("RGB", (1600, 1200), (0, 128, 0))
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG")
+        thumb = table_thumbnail(Image.open(io.BytesIO(buf.getvalue())), width=64)
+        assert thumb.shape == (48, 64)
+        assert 0.0 <= thumb.min() <= thumb.max() <= 1.0
+
+    def test_roi_crop(self):
+        image = Image.new("L", (400, 300), 0)
+        ImageDraw.Draw(image).rectangle((0, 150, 400, 300), fill=255)
+        thumb = table_thumbnail(image, width=32, roi=(0.0, 0.5, 1.0, 1.0))
+        assert thumb.shape == (12, 32)
+        assert thumb.mean() > 0.95
+
+    def test_gate_thumbnail_width(self):
+        image = Image.new("L", (400, 300), 0)
+        assert ChangeGate(thumbnail_width=32).thumbnail(image).shape == (24, 32)
+
+    def test_difference(self):
+        assert frame_difference(TABLE, TABLE) == 0.0
+        assert frame_difference(TABLE, None) == 1.0
+        assert frame_difference(TABLE, TABLE[:10]) == 1.0
+        assert frame_difference(TABLE, with_card(0)) > 0.03
+
+
+class TestChangeGate:
+    def test_first_frame_analyzed(self):
+        gate = ChangeGate()
+        assert gate.check("table", TABLE, now=0.0) is None
+
+    def test_unchanged_frames_reuse_result(self):
+        gate = ChangeGate()
+        assert analyze(gate, TABLE, 0.0, "empty") == "empty"
+        noisy = TABLE + np.random.default_rng(0).normal(0, 0.005, TABLE.shape).astype(np.float32)
+        assert analyze(gate, noisy, 0.5, "new") == "empty"
+        assert gate.stats()["skipped_unchanged"] == 1
+
+    def test_change_waits_for_motion_to_settle(self):
+        gate = ChangeGate(settle_seconds=0.2)
+        analyze(gate, TABLE, 0.0, "empty")
+        # A card slides in over three frames, then rests
+        assert analyze(gate, with_card(0), 1.0, "card") == "empty"
+        assert analyze(gate, with_card(20), 1.1, "card") == "empty"
+        assert analyze(gate, with_card(40), 1.2, "card") == "empty"
+        assert analyze(gate, with_card(40), 1.3, "card") == "empty"
+        assert analyze(gate, with_card(40), 1.45, "card") == "card"
+        assert analyze(gate, with_card(40), 1.5, "other") == "card"
+        stats = gate.stats()
+        assert stats["analyzed"] == 2
+        assert stats["skipped_moving"] == 4
+        assert stats["skip_ratio"] == 5 / 7
+
+    def test_continuous_motion_analyzed_after_max_wait(self):
+        gate = ChangeGate(settle_seconds=0.2, max_wait_seconds=1.0)
+        analyze(gate, TABLE, 0.0, "empty")
+        results = [analyze(gate, with_card(4 * i), 1.0 + i / 10, "moving") for i in range(12)]
+        assert results[:10] == ["empty"] * 10
+        assert results[10] == "moving"
+
+    def test_streams_independent(self):
+        gate = ChangeGate()
+        gate.check("a", TABLE, now=0.0)
+        gate.record("a", TABLE, "a-result")
+        assert gate.check("b", TABLE, now=0.0) is None
+        assert gate.check("a", TABLE, now=0.1) == "a-result"
+
+    def test_stream_count_bounded(self):
+        gate = ChangeGate(max_streams=2)
+        for key in ("a", "b", "c"):
+            gate.check(key, TABLE, now=0.0)
+        assert gate.stats()["streams"] == 2
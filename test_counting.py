@@ -0,0 +1,109 @@
+"""
+Tests for count systems, true count and index plays
+"""
+
+import pytest
+
+from counting import (
+    COUNT_SYSTEMS, DEVIATION_TABLE, apply_deviation, decks_remaining,
+    get_count_system, take_insurance, true_count,
+)
+from strategy import PAIR, PAIR_HIT, STRATEGY_TABLE, strategy_index, table_index
+
+FULL_DECK = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K'] * 4
+
+
+class TestCountSystems:
+    def test_balanced_systems_sum_to_zero(self):
+        for name in ("hi-lo", "hi-opt-ii", "omega-ii"):
+            system = COUNT_SYSTEMS[name]
+            assert sum(system.value(rank) for rank in FULL_DECK) == 0
+            assert system.imbalance == 0
+
+    def test_ko_is_unbalanced(self):
+        ko = COUNT_SYSTEMS["ko"]
+        assert sum(ko.value(rank) for rank in FULL_DECK) == 4
+        assert ko.imbalance == 4
+
+    def test_tags(self):
+        assert COUNT_SYSTEMS["hi-lo"].value('K') == -1
+        assert COUNT_SYSTEMS["ko"].value('7') == 1
+        assert COUNT_SYSTEMS["hi-opt-ii"].value('4') == 2
+        assert COUNT_SYSTEMS["omega-ii"].value('9') == -1
+        assert COUNT_SYSTEMS["omega-ii"].value('A') == 0
+
+    def test_unknown_system(self):
+        assert get_count_system("KO") is COUNT_SYSTEMS["ko"]
+        with pytest.raises(ValueError):
+            get_count_system("zen")
+
+
+class TestTrueCount:
+    def test_decks_remaining(self):
+        assert decks_remaining(0, 6) == 6
+        assert decks_remaining(104, 6) == 4
+        assert decks_remaining(400, 6) == 0
+
+    def test_divides_by_decks_remaining(self):
+        hi_lo = COUNT_SYSTEMS["hi-lo"]
+        assert true_count(8, 104, 6, hi_lo) == 2
+        assert true_count(-6, 52, 4, hi_lo) == -2
+
+    def test_end_of_shoe_floor(self):
+        assert true_count(3, 312, 6, COUNT_SYSTEMS["hi-lo"]) == 6
+
+    def test_unbalanced_drift_removed(self):
+        # Two decks dealt from a KO shoe with no real edge: running count +8
+        assert true_count(8, 104, 6, COUNT_SYSTEMS["ko"]) == 0
+
+    def test_level_two_scaled(self):
+        assert true_count(8, 104, 6, COUNT_SYSTEMS["omega-ii"]) == 1
+
+    def test_insurance(self):
+        assert take_insurance(3)
+        assert not take_insurance(2.9)
+
+
+class TestDeviations:
+    def test_table_matches_strategy_layout(self):
+        assert len(DEVIATION_TABLE) == len(STRATEGY_TABLE)
+        # 17 two-card plays, the 10 hit/stand plays repeated for hands after a hit
+        # and the 2 split plays repeated for pairs that cannot double
+        assert sum(entry is not None for entry in DEVIATION_TABLE) == 29
+
+    def test_basic_strategy_is_one_side_of_each_index(self):
+        for slot, entry in enumerate(DEVIATION_TABLE):
+            if entry is not None:
+                assert STRATEGY_TABLE[slot] in entry[1:]
+
+    def test_stand_16_vs_10(self):
+        slot = strategy_index('K', '10', '6', 16)
+        assert apply_deviation(slot, 'H', -0.5) == 'H'
+        assert apply_deviation(slot, 'H', 0) == 'S'
+
+    def test_split_tens_vs_6(self):
+        for hand_class in (PAIR, PAIR_HIT):
+            slot = table_index(hand_class, 10, 6)
+            assert apply_deviation(slot, 'S', 3.9) == 'S'
+            assert apply_deviation(slot, 'S', 4) == 'SP'
+
+    def test_hit_12_vs_4_at_negative_count(self):
+        slot = strategy_index('4', '10', '2', 12)
+        assert apply_deviation(slot, 'S', -1) == 'H'
+        assert apply_deviation(slot, 'S', 0) == 'S'
+
+    def test_no_deviation_keeps_basic(self):
+        slot = strategy_index('6', '10', '8', 18)
+        assert apply_deviation(slot, 'S', 10) == 'S'
+
+    def test_surrender_only_when_allowed(self):
+        slot = strategy_index('10', '10', '5', 15)
+        assert apply_deviation(slot, 'H', 1) == 'H'
+        assert apply_deviation(slot, 'H', 1, surrender=True) == 'R'
+        assert apply_deviation(slot, 'H', -1, surrender=True) == 'H'
+
+    def test_surrender_falls_back_to_index_play(self):
+        # 15 vs 10 surrenders from 0; below it Illustrious 18 says hit
+        slot = strategy_index('10', '9', '6', 15)
+        assert apply_deviation(slot, 'H', 5, surrender=True) == 'R'
+        assert apply_deviation(slot, 'H', -2, surrender=True) == 'H'
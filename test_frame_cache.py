@@ -0,0 +1,85 @@
+"""
+Tests for the perceptual-hash frame cache
+"""
+
+import io
+import time
+
+from PIL import Image, ImageDraw
+
+from frame_cache import FrameCache, dhash
+
+
+def make_frame(card_x=20, noise=0):
+    """Draw a white card on a green table, optionally nudging one pixel."""
+    img = Image.new('RGB', (320, 240), color=(0, 100, 0))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([card_x, 40, card_x + 60, 130], fill='white')
+    if noise:
+        img.putpixel((300, 200), (noise, noise, noise))
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+class TestDhash:
+    """Test the difference hash."""
+
+    def test_near_identical_frames_hash_close(self):
+        """Test small pixel noise barely changes the hash."""
+        a = dhash(make_frame())
+        b = dhash(make_frame(noise=255))
+        assert bin(a ^ b).count("1") <= 4
+
+    def test_moved_card_changes_hash(self):
+        """Test a card in a different position produces a distant hash."""
+        a = dhash(make_frame(card_x=20))
+        b = dhash(make_frame(card_x=220))
+        assert bin(a ^ b).count("1") > 4
+
+
+class TestFrameCache:
+    """Test lookups, eviction and counters."""
+
+    def test_hit_within_distance(self):
+        """Test a hash within the threshold returns the cached value."""
+        cache = FrameCache(max_distance=2)
+        cache.put("t1", 0b1010, "state")
+        assert cache.get("t1", 0b1011) == "state"
+        assert cache.get("t1", 0b0101) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first."""
+        cache = FrameCache(max_entries=2, max_distance=0)
+        cache.put("t1", 1, "a")
+        cache.put("t1", 2, "b")
+        cache.get("t1", 1)
+        cache.put("t1", 4, "c")
+        assert cache.get("t1", 2) is None
+        assert cache.get("t1", 1) == "a"
+        assert cache.get("t1", 4) == "c"
+
+    def test_tables_do_not_share_results(self):
+        """Test an identical frame from another table misses."""
+        cache = FrameCache(max_distance=4)
+        cache.put("t1", 0b1010, "a")
+        assert cache.get("t2", 0b1010) is None
+        cache.put("t2", 0b1010, "b")
+        assert cache.get("t1", 0b1010) == "a"
+        assert cache.get("t2", 0b1011) == "b"
+
+    def test_ttl_expiry(self):
+        """Test entries older than the TTL are not returned."""
+        cache = FrameCache(ttl_seconds=0.01, max_distance=0)
+        cache.put("t1", 1, "a")
+        time.sleep(0.02)
+        assert cache.get("t1", 1) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_disabled_cache(self):
+        """Test a zero-size cache stores nothing."""
+        cache = FrameCache(max_entries=0)
+        cache.put("t1", 1, "a")
+        assert cache.get("t1", 1) is None
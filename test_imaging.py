@@ -0,0 +1,119 @@
+"""
+Tests for frame preprocessing
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from imaging import ImageInfo, InvalidImage, PreprocessConfig, parse_roi, preprocess_frame, sniff_image
+
+
+def encode(img, fmt='JPEG'):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def run(data, config):
+    out = preprocess_frame(Image.open(io.BytesIO(data)), data, config)
+    return out, Image.open(io.BytesIO(out))
+
+
+class TestParseRoi:
+    """Test ROI parsing."""
+
+    def test_unset(self):
+        assert parse_roi(None) is None
+        assert parse_roi("") is None
+
+    def test_valid(self):
+        assert parse_roi("0.1,0.2,0.9,1") == (0.1, 0.2, 0.9, 1.0)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_roi("0.9,0.2,0.1,1")
+
+
+class TestPreprocessFrame:
+    """Test crop, resize and re-encode."""
+
+    def test_downscale_uxga(self):
+        """Test a UXGA frame is shrunk to the max edge and gets smaller."""
+        data = encode(Image.effect_noise((1600, 1200), 30).convert('RGB'))
+        out, img = run(data, PreprocessConfig(max_edge=800, jpeg_quality=70))
+        assert img.size == (800, 600)
+        assert img.format == 'JPEG'
+        assert len(out) < len(data)
+
+    def test_small_jpeg_passthrough(self):
+        """Test a JPEG within limits is returned unchanged."""
+        data = encode(Image.new('RGB', (320, 240), 'green'))
+        out, _ = run(data, PreprocessConfig(max_edge=1024))
+        assert out is data
+
+    def test_png_reencoded_as_jpeg(self):
+        """Test non-JPEG frames are converted to JPEG."""
+        data = encode(Image.new('RGB', (320, 240), 'green'), fmt='PNG')
+        _, img = run(data, PreprocessConfig(max_edge=1024))
+        assert img.format == 'JPEG'
+        assert img.size == (320, 240)
+
+    def test_roi_crop(self):
+        """Test the ROI keeps only the configured part of the frame."""
+        frame = Image.new('RGB', (1600, 1200), 'black')
+        frame.paste((255, 255, 255), (800, 600, 1600, 1200))
+        data = encode(frame)
+        _, img = run(data, PreprocessConfig(max_edge=400, roi=(0.5, 0.5, 1.0, 1.0)))
+        assert img.size == (400, 300)
+        assert img.convert('L').getextrema()[0] > 200
+
+
+class TestSniffImage:
+    """Test header-only validation."""
+
+    def test_jpeg(self):
+        info = sniff_image(encode(Image.new('RGB', (1600, 1200))))
+        assert (info.format, info.width, info.height) == ('JPEG', 1600, 1200)
+
+    def test_jpeg_with_exif_and_progressive(self):
+        """Test the size is found past APPn segments and in progressive frames."""
+        buf = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = "ESP32"
+        Image.new('RGB', (640, 480)).save(buf, format='JPEG', exif=exif, progressive=True)
+        info = sniff_image(buf.getvalue())
+        assert (info.width, info.height) == (640, 480)
+
+    def test_png(self):
+        info = sniff_image(bytearray(encode(Image.new('L', (33, 17)), fmt='PNG')))
+        assert (info.format, info.width, info.height) == ('PNG', 33, 17)
+
+    def test_trailing_padding_allowed(self):
+        assert sniff_image(encode(Image.new('RGB', (8, 8))) + b"\x00" * 16).format == 'JPEG'
+
+    @pytest.mark.parametrize("data", [
+        b"not-an-image",
+        b"",
+        b"\xff\xd8\xff",
+        encode(Image.new('RGB', (64, 64)))[:-200],
+        encode(Image.new('RGB', (64, 64)), fmt='PNG')[:-12],
+        encode(Image.new('RGB', (64, 64)), fmt='GIF'),
+    ])
+    def test_rejected(self, data):
+        with pytest.raises(InvalidImage):
+            sniff_image(data)
+
+    def test_pixel_limit(self):
+        data = encode(Image.new('RGB', (200, 100)))
+        assert sniff_image(data, max_pixels=20000).width == 200
+        with pytest.raises(InvalidImage):
+            sniff_image(data, max_pixels=19999)
+
+    def test_passthrough(self):
+        config = PreprocessConfig(max_edge=800)
+        assert config.passthrough(ImageInfo('JPEG', 800, 600))
+        assert not config.passthrough(ImageInfo('JPEG', 1600, 1200))
+        assert not config.passthrough(ImageInfo('PNG', 320, 240))
+        assert not PreprocessConfig(max_edge=0, roi=(0, 0.5, 1, 1)).passthrough(ImageInfo('JPEG', 320, 240))
@@ -3,10 +3,22 @@ Tests for the BlackJack Helper API
 """
 
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+import main
 from main import app, Card, calculate_hand_value, get_recommendation, GameState
+from admission import AdmissionControl
+from imaging import PreprocessConfig
+from persistence import CountStore, SharedCountStore
+from sessions import SessionStore
+import asyncio
 import base64
+import httpx
 import io
+import json
+import sqlite3
+import threading
+import time
 from PIL import Image
 
 
@@ -21,6 +33,20 @@ def create_dummy_image_base64():
     return base64.b64encode(buf.getvalue()).decode('utf-8')
 
 
+def make_jpeg(color, size=(100, 100)):
+    """Create a JPEG of a different scene than the dummy image."""
+    img = Image.new('RGB', size, color=color)
+    img.paste((255, 255, 255), (10, 10, 50, 90))
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def hand(*ranks):
+    """Player cards of the given ranks."""
+    return [Card(rank=rank, suit="hearts", confidence=0.9) for rank in ranks]
+
+
 class TestRootEndpoints:
     """Test root and health endpoints."""
     
@@ -120,28 +146,30 @@ class TestRecommendationLogic:
     def test_recommend_stand_on_17_or_higher(self):
         """Test recommendation to stand on 17 or higher."""
         dealer_card = Card(rank="7", suit="hearts", confidence=0.9)
-        assert get_recommendation(17, dealer_card) == "stand"
-        assert get_recommendation(20, dealer_card) == "stand"
+        assert get_recommendation(hand("10", "7"), dealer_card, 17) == "S"
+        assert get_recommendation(hand("10", "4", "6"), dealer_card, 20) == "S"
     
     def test_recommend_hit_on_11_or_lower(self):
-        """Test recommendation to hit on 11 or lower."""
+        """Test recommendation to hit on 11 or lower once the hand cannot double."""
         dealer_card = Card(rank="7", suit="hearts", confidence=0.9)
-        assert get_recommendation(11, dealer_card) == "hit"
-        assert get_recommendation(8, dealer_card) == "hit"
+        assert get_recommendation(hand("5", "4", "2"), dealer_card, 11) == "H"
+        assert get_recommendation(hand("5", "3"), dealer_card, 8) == "H"
     
     def test_recommend_stand_against_weak_dealer(self):
         """Test recommendation to stand against weak dealer cards (2-6)."""
         weak_cards = ["2", "3", "4", "5", "6"]
         for rank in weak_cards:
             dealer_card = Card(rank=rank, suit="hearts", confidence=0.9)
-            assert get_recommendation(13, dealer_card) == "stand"
+            assert get_recommendation(hand("10", "3"), dealer_card, 13) == "S"
+            assert get_recommendation(hand("10", "3"), dealer_card, 13, true_count=0.0) == "S"
     
     def test_recommend_hit_against_strong_dealer(self):
         """Test recommendation to hit against strong dealer cards (7-A)."""
         strong_cards = ["7", "8", "9", "10", "J", "Q", "K", "A"]
         for rank in strong_cards:
             dealer_card = Card(rank=rank, suit="hearts", confidence=0.9)
-            assert get_recommendation(13, dealer_card) == "hit"
+            assert get_recommendation(hand("10", "3"), dealer_card, 13) == "H"
+            assert get_recommendation(hand("10", "3"), dealer_card, 13, true_count=0.0) == "H"
 
 
 class TestAnalyzeFrameEndpoint:
@@ -182,6 +210,883 @@ class TestAnalyzeFrameEndpoint:
         assert response.status_code == 422  # Validation error
 
 
+class TestFrameEndpoint:
+    """Test the raw JPEG /frame endpoint."""
+
+    def test_frame_invalid_body(self):
+        """Test endpoint with a body that is not an image."""
+        response = client.post(
+            "/frame",
+            content=b"not-an-image",
+            headers={"Content-Type": "image/jpeg"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is False
+        assert data["error"].startswith("Invalid image data")
+
+    def test_frame_truncated_jpeg(self):
+        """Test a JPEG cut off mid-upload is rejected before it is decoded."""
+        data = make_jpeg((0, 128, 0))
+        response = client.post("/frame", content=data[:len(data) // 2], headers={"Content-Type": "image/jpeg"})
+        assert response.json()["error"].startswith("Invalid image data")
+
+    def test_oversized_frames_rejected(self, monkeypatch):
+        """Test frames over MAX_FRAME_BYTES are refused on every ingestion path."""
+        monkeypatch.setattr(main, "MAX_FRAME_BYTES", 1000)
+        data = bytes(2000)
+        response = client.post("/frame", content=data, headers={"Content-Type": "image/jpeg"})
+        assert response.json()["error"].startswith("Frame too large")
+
+        def chunks():
+            yield data[:800]
+            yield data[800:]
+
+        response = client.post("/frame", content=chunks(), headers={"Content-Type": "image/jpeg"})
+        assert response.json()["error"].startswith("Frame too large")
+        response = client.post("/api/analyze-frame", json={"image_base64": base64.b64encode(data).decode()})
+        assert response.json()["error"].startswith("Frame too large")
+
+    def test_oversized_dimensions_rejected(self, monkeypatch):
+        """Test a frame whose header declares too many pixels is not decoded."""
+        monkeypatch.setattr(main, "MAX_FRAME_PIXELS", 50 * 50)
+        response = client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()})
+        assert "larger than 2500 pixels" in response.json()["error"]
+
+    def test_frame_unsupported_content_type(self):
+        """Test endpoint rejects non-image content types."""
+        response = client.post(
+            "/frame",
+            content=b"{}",
+            headers={"Content-Type": "application/json"}
+        )
+        data = response.json()
+        assert data["success"] is False
+        assert "Unsupported content type" in data["error"]
+
+    def test_frame_shares_analysis_pipeline(self, monkeypatch):
+        """Test raw frames reach the same analysis step as base64 frames."""
+        seen = []
+
+        async def fake_analyze(image_base64):
+            seen.append(image_base64)
+            return GameState(total_running_count=0)
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.frame_cache.clear()
+        image_base64 = create_dummy_image_base64()
+        response = client.post(
+            "/frame",
+            content=base64.b64decode(image_base64),
+            headers={"Content-Type": "image/jpeg"}
+        )
+        assert response.json()["success"] is True
+        assert seen == [image_base64]
+
+    def test_repeated_frame_served_from_cache(self, monkeypatch):
+        """Test an identical frame skips the vision call."""
+        calls = []
+
+        async def fake_analyze(image_base64):
+            calls.append(image_base64)
+            return GameState(total_running_count=1)
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.frame_cache.clear()
+        image_base64 = create_dummy_image_base64()
+        for _ in range(3):
+            response = client.post("/api/analyze-frame", json={"image_base64": image_base64})
+            assert response.json()["game_state"]["total_running_count"] == 1
+        assert len(calls) == 1
+
+        stats = client.get("/api/cache-stats").json()["frame_cache"]
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+
+    def test_cache_not_shared_between_tables(self, monkeypatch):
+        """Test the same frame from another table is analyzed, not answered from the first table's result."""
+        calls = []
+
+        async def fake_analyze(image_base64):
+            calls.append(image_base64)
+            return GameState(total_running_count=len(calls))
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.frame_cache.clear()
+        image_base64 = create_dummy_image_base64()
+        for session_id, expected in (("table-a", 1), ("table-b", 2), ("table-a", 1)):
+            response = client.post("/api/analyze-frame", headers={"X-Session-ID": session_id},
+                                   json={"image_base64": image_base64})
+            assert response.json()["game_state"]["total_running_count"] == expected
+        assert len(calls) == 2
+
+    def test_decoding_runs_off_event_loop(self, monkeypatch):
+        """Test frames are decoded and resized in a worker thread, not on the event loop."""
+        threads = {}
+
+        def recorded(name, func):
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.current_thread()
+                return func(*args, **kwargs)
+            return wrapper
+
+        async def fake_analyze(image_base64):
+            threads["loop"] = threading.current_thread()
+            return GameState()
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        monkeypatch.setattr(main, "preprocess_config", PreprocessConfig(max_edge=50))
+        monkeypatch.setattr(main, "preprocess_frame", recorded("preprocess", main.preprocess_frame))
+        monkeypatch.setattr(main, "dhash", recorded("dhash", main.dhash))
+        main.frame_cache.clear()
+        response = client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()})
+        assert response.json()["success"] is True
+        loop_thread = threads.pop("loop")
+        assert set(threads) == {"preprocess", "dhash"}
+        assert loop_thread not in threads.values()
+
+
+class TestCountPersistence:
+    """Test the count is not written on the request path."""
+
+    def test_hot_path_does_not_touch_filesystem(self, monkeypatch, tmp_path):
+        """Test counted frames only update the in-memory store."""
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+
+        async def fake_analyze(image_base64):
+            return GameState(player_cards=[Card(rank="5", suit="hearts", confidence=0.9)])
+
+        def no_filesystem(*args, **kwargs):
+            raise AssertionError("filesystem touched on the request path")
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        monkeypatch.setattr(main.count_store, "flush", no_filesystem)
+        monkeypatch.setattr("builtins.open", no_filesystem)
+        monkeypatch.setattr("os.replace", no_filesystem)
+        main.frame_cache.clear()
+
+        response = client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()})
+        assert response.json()["game_state"]["cumulative_running_count"] == 1
+        assert main.count_store.get() == 1
+
+
+class TestAdmission:
+    """Test overload responses from the frame endpoints."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_sessions(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        main.frame_cache.clear()
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+
+    def test_queue_full_returns_503(self, monkeypatch):
+        """Test a full queue answers at once with Retry-After."""
+        monkeypatch.setattr(main, "admission", AdmissionControl(max_active=0, max_queued=0, retry_after=2))
+        for response in (
+            client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()}),
+            client.post("/frame/t1", content=base64.b64decode(create_dummy_image_base64()),
+                        headers={"Content-Type": "image/jpeg"}),
+        ):
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "2"
+        text = client.get("/metrics").text
+        assert 'blackjack_admission_dropped_total{reason="queue_full"} 2' in text
+        assert client.get("/api/cache-stats").json()["admission"]["dropped"]["queue_full"] == 2
+
+    def test_newer_frame_supersedes_waiting_one(self, monkeypatch):
+        """Test frames queued behind a slow analysis give way to the newest."""
+        monkeypatch.setattr(main, "admission", AdmissionControl())
+
+        async def slow_analyze(image_base64):
+            await asyncio.sleep(0.05)
+            return GameState(player_cards=[Card(rank="5", suit="hearts", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", slow_analyze)
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                async def post():
+                    return await ac.post("/api/analyze-frame", headers={"X-Session-ID": "t1"},
+                                         json={"image_base64": create_dummy_image_base64()})
+                tasks = []
+                for _ in range(3):
+                    tasks.append(asyncio.create_task(post()))
+                    await asyncio.sleep(0.01)
+                return await asyncio.gather(*tasks)
+
+        responses = asyncio.run(scenario())
+        assert [r.status_code for r in responses] == [200, 429, 200]
+        assert responses[1].headers["Retry-After"] == "1"
+        assert responses[2].json()["game_state"]["cumulative_running_count"] == 1
+
+    def test_batch_frames_are_admitted(self, monkeypatch):
+        """Test a batch cannot push frames past the admission limits."""
+        monkeypatch.setattr(main, "admission", AdmissionControl(max_active=2, max_queued=0, retry_after=3))
+        calls = []
+
+        async def fake_analyze_frames(images):
+            calls.append(len(images))
+            return [GameState() for _ in images]
+
+        monkeypatch.setattr(main, "analyze_frames_with_gpt4", fake_analyze_frames)
+        frames = [{"image_base64": create_dummy_image_base64(), "session_id": f"table-{i}"} for i in range(4)]
+        response = client.post("/api/analyze-batch", json={"frames": frames})
+        results = response.json()["results"]
+        assert [r["success"] for r in results] == [True, True, False, False]
+        assert results[2]["error"] == "Server busy: too many frames waiting"
+        assert response.headers["Retry-After"] == "3"
+        assert calls == [2]
+        assert main.admission.stats()["active"] == 0
+
+    def test_batch_admitted_as_one_unit_per_table(self, monkeypatch):
+        """Test frames of one table in a request do not supersede each other; only the newest is analyzed."""
+        monkeypatch.setattr(main, "admission", AdmissionControl())
+        analyzed = []
+
+        async def fake_analyze_frames(images):
+            analyzed.extend(images)
+            return [GameState(player_cards=[Card(rank="5", suit="clubs", confidence=0.9)]) for _ in images]
+
+        monkeypatch.setattr(main, "analyze_frames_with_gpt4", fake_analyze_frames)
+        colors = [(0, 0, 255), (0, 255, 0), (255, 0, 0), (255, 255, 0)]
+        frames = [{"image_base64": base64.b64encode(make_jpeg(color)).decode(), "session_id": "table-1"}
+                  for color in colors]
+        frames.append({"image_base64": create_dummy_image_base64(), "session_id": "table-2"})
+        response = client.post("/api/analyze-batch", json={"frames": frames})
+        results = response.json()["results"]
+        assert [r["success"] for r in results] == [True] * 5
+        assert len({json.dumps(r["game_state"]) for r in results[:4]}) == 1
+        assert "Retry-After" not in response.headers
+        assert sorted(analyzed) == sorted([frames[3]["image_base64"], frames[4]["image_base64"]])
+        assert main.admission.stats()["dropped"]["superseded"] == 0
+        assert main.admission.stats()["active"] == 0
+        assert main.count_store.get("table-1") == 1  # counted once, not once per frame
+
+
+class TestSharedCounts:
+    """Test worker processes sharing counts through the SQLite store."""
+
+    def test_workers_do_not_double_count(self, monkeypatch, tmp_path):
+        """Test a card counted by one worker is not counted again by another."""
+        path = str(tmp_path / "counts.db")
+        workers = [(SharedCountStore(path), SessionStore(main.create_shoe_tracker)) for _ in range(2)]
+        cards = [[("10", "hearts")], [("10", "hearts"), ("5", "clubs")], [("10", "hearts"), ("5", "clubs")]]
+
+        async def fake_analyze(image_base64):
+            return GameState(player_cards=[Card(rank=r, suit=s, confidence=0.9) for r, s in cards.pop(0)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.frame_cache.clear()
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+        counts = []
+        for store, sessions in (workers[0], workers[1], workers[0]):
+            monkeypatch.setattr(main, "count_store", store)
+            monkeypatch.setattr(main, "sessions", sessions)
+            response = client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()})
+            counts.append(response.json()["game_state"]["cumulative_running_count"])
+        assert counts == [-1, 0, 0]
+        assert client.get("/api/get-count").json()["cumulative_running_count"] == 0
+
+        monkeypatch.setattr(main, "count_store", workers[1][0])
+        client.post("/api/reset-count")
+        assert workers[0][0].get() == 0
+
+    def test_locked_database_does_not_stall_event_loop(self, monkeypatch, tmp_path):
+        """Test a frame waiting on another worker's write lock does not hold up other requests."""
+        path = str(tmp_path / "counts.db")
+        monkeypatch.setattr(main, "count_store", SharedCountStore(path))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+        main.count_store.start()
+
+        async def fake_analyze(image_base64):
+            return GameState(player_cards=[Card(rank="5", suit="hearts", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        other_worker = sqlite3.connect(path, isolation_level=None)
+        other_worker.execute("BEGIN IMMEDIATE")
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                frame = asyncio.create_task(ac.post("/api/analyze-frame",
+                                                    json={"image_base64": create_dummy_image_base64()}))
+                await asyncio.sleep(0.2)
+                started = time.perf_counter()
+                assert (await ac.get("/health")).status_code == 200
+                health_seconds = time.perf_counter() - started
+                assert not frame.done()
+                other_worker.execute("COMMIT")
+                return health_seconds, (await frame).json()
+
+        health_seconds, data = asyncio.run(scenario())
+        other_worker.close()
+        assert health_seconds < 0.5
+        assert data["game_state"]["cumulative_running_count"] == 1
+
+
+class TestSessions:
+    """Test per-session count isolation."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_sessions(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+
+        async def fake_analyze(image_base64):
+            return GameState(player_cards=[Card(rank="5", suit="hearts", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.frame_cache.clear()
+
+    def post_frame(self, session_id):
+        return client.post(
+            "/api/analyze-frame",
+            json={"image_base64": create_dummy_image_base64()},
+            headers={"X-Session-ID": session_id}
+        ).json()
+
+    def test_counts_are_per_session(self):
+        """Test two tables keep independent counts."""
+        assert self.post_frame("table-1")["game_state"]["cumulative_running_count"] == 1
+        assert self.post_frame("table-2")["game_state"]["cumulative_running_count"] == 1
+        count = client.get("/api/get-count", headers={"X-Session-ID": "table-1"}).json()
+        assert count["cumulative_running_count"] == 1
+        assert count["session_id"] == "table-1"
+
+    def test_reset_is_per_session(self):
+        """Test resetting one table leaves the other alone."""
+        self.post_frame("table-1")
+        self.post_frame("table-2")
+        client.post("/api/reset-count", headers={"X-Session-ID": "table-1"})
+        get = lambda sid: client.get("/api/get-count", headers={"X-Session-ID": sid}).json()  # noqa: E731
+        assert get("table-1")["cumulative_running_count"] == 0
+        assert get("table-2")["cumulative_running_count"] == 1
+
+    def test_session_from_frame_path(self):
+        """Test the raw frame endpoint takes the session from the path."""
+        response = client.post(
+            "/frame/rig-7",
+            content=base64.b64decode(create_dummy_image_base64()),
+            headers={"Content-Type": "image/jpeg"}
+        )
+        assert response.json()["game_state"]["cumulative_running_count"] == 1
+        assert "rig-7" in main.sessions
+        assert main.count_store.get("rig-7") == 1
+
+    def test_invalid_session_id(self):
+        """Test malformed session IDs are rejected."""
+        response = client.get("/api/get-count", headers={"X-Session-ID": "bad id!"})
+        assert response.status_code == 400
+
+
+class TestFullHandRecommendation:
+    """Test recommendations after the first two cards."""
+
+    def test_three_card_hand(self):
+        """Test a hand keeps getting advice after a hit."""
+        cards = [Card(rank=r, suit="hearts", confidence=0.9) for r in ("2", "3", "7")]
+        assert get_recommendation(cards, Card(rank="6", suit="clubs", confidence=0.9), 12) == "S"
+        assert get_recommendation(cards, Card(rank="7", suit="clubs", confidence=0.9), 12) == "H"
+
+    def test_bust_hand(self):
+        """Test a bust hand gets no advice."""
+        cards = [Card(rank=r, suit="hearts", confidence=0.9) for r in ("K", "8", "5")]
+        assert get_recommendation(cards, Card(rank="6", suit="clubs", confidence=0.9), 23) is None
+
+
+class TestTrueCount:
+    """Test true count and index plays in frame analysis."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_sessions(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        main.frame_cache.clear()
+
+    def test_index_play_overrides_basic_strategy(self, monkeypatch):
+        """Test a high count turns hitting 16 vs 10 into standing."""
+        async def fake_analyze(image_base64):
+            return GameState(
+                player_cards=[Card(rank="10", suit="hearts", confidence=0.9),
+                              Card(rank="6", suit="clubs", confidence=0.9)],
+                dealer_cards=[Card(rank="K", suit="spades", confidence=0.9)],
+                player_total=16,
+                recommendation="H",
+            )
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        main.count_store.update(12)
+        state = client.post(
+            "/api/analyze-frame", json={"image_base64": create_dummy_image_base64()}
+        ).json()["game_state"]
+        assert state["cumulative_running_count"] == 11
+        assert state["cards_seen"] == 3
+        assert state["true_count"] > 0
+        assert state["recommendation"] == "S"
+        assert state["insurance"] is None
+
+    def test_solver_recommendation(self, monkeypatch):
+        """Test the composition solver replaces the charts when enabled, solving off the event loop."""
+        threads = {}
+        best_action = main.solver.best_action
+
+        def recorded_best_action(*args):
+            threads["solver"] = threading.current_thread()
+            return best_action(*args)
+
+        async def fake_analyze(image_base64):
+            threads["loop"] = threading.current_thread()
+            return GameState(
+                player_cards=[Card(rank="5", suit="hearts", confidence=0.9),
+                              Card(rank="6", suit="clubs", confidence=0.9)],
+                dealer_cards=[Card(rank="6", suit="spades", confidence=0.9)],
+                player_total=11,
+            )
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        monkeypatch.setattr(main, "STRATEGY_SOLVER", True)
+        monkeypatch.setattr(main.solver, "best_action", recorded_best_action)
+        state = client.post(
+            "/api/analyze-frame", json={"image_base64": create_dummy_image_base64()}
+        ).json()["game_state"]
+        assert state["recommendation"] == "D"
+        assert main.sessions.get("default").tracker.composition.remaining == 6 * 52 - 3
+        assert threads["solver"] is not threads["loop"]
+
+    def test_insurance_when_dealer_shows_ace(self, monkeypatch):
+        """Test insurance advice follows the true count."""
+        async def fake_analyze(image_base64):
+            return GameState(dealer_cards=[Card(rank="A", suit="spades", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        state = client.post(
+            "/api/analyze-frame", json={"image_base64": create_dummy_image_base64()}
+        ).json()["game_state"]
+        assert state["insurance"] is False
+
+
+class TestChangeGate:
+    """Test the change-detection gate in the frame pipeline."""
+
+    def test_unchanged_table_skips_model(self, monkeypatch, tmp_path):
+        """Test a repeated frame reuses the gated result without calling the model."""
+        from change_gate import ChangeGate
+
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        monkeypatch.setattr(main, "change_gate", ChangeGate())
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+        calls = []
+
+        async def fake_analyze(image_base64):
+            calls.append(image_base64)
+            return GameState(player_cards=[Card(rank="5", suit="hearts", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        image = base64.b64encode(make_jpeg((0, 128, 0))).decode()
+        for _ in range(3):
+            data = client.post("/api/analyze-frame", json={"image_base64": image}).json()
+            assert data["game_state"]["player_cards"][0]["rank"] == "5"
+            assert data["game_state"]["cumulative_running_count"] == 1
+        assert len(calls) == 1
+        stats = client.get("/api/cache-stats").json()["change_gate"]
+        assert stats["skipped_unchanged"] == 2
+
+    def test_evicted_session_forgotten(self, monkeypatch, tmp_path):
+        """Test an evicted table's gate state is dropped with its session."""
+        from change_gate import ChangeGate
+
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "change_gate", ChangeGate())
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+        store = SessionStore(main.create_shoe_tracker, idle_timeout=0, on_evict=main.evict_session)
+        monkeypatch.setattr(main, "sessions", store)
+
+        async def fake_analyze(image_base64):
+            return GameState()
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        image = base64.b64encode(make_jpeg((0, 128, 0))).decode()
+        client.post("/api/analyze-frame", headers={"X-Session-ID": "table-1"}, json={"image_base64": image})
+        assert main.change_gate.stats()["streams"] == 1
+        store.evict_idle()
+        assert main.change_gate.stats()["streams"] == 0
+
+
+class TestRecognizerModes:
+    """Test local and hybrid card recognition."""
+
+    @pytest.fixture(autouse=True)
+    def isolated(self, monkeypatch, tmp_path):
+        from recognition import TemplateRecognizer
+
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        monkeypatch.setattr(main, "local_recognizer", TemplateRecognizer())
+        monkeypatch.setattr(main, "recognizer_stats", {"local": 0, "remote": 0, "fallbacks": 0})
+        main.frame_cache.clear()
+        self.remote_calls = []
+
+        async def fake_analyze(image_base64):
+            self.remote_calls.append(image_base64)
+            return GameState(player_cards=[Card(rank="Q", suit="hearts", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+
+    def table_jpeg(self, cards):
+        from recognition import render_card
+
+        frame = Image.new("RGB", (1600, 1200), (30, 110, 50))
+        for i, (rank, suit) in enumerate(cards):
+            frame.paste(render_card(rank, suit, 200), (100 + i * 260, 100 if i == 0 else 700))
+        buf = io.BytesIO()
+        frame.save(buf, format="JPEG")
+        return buf.getvalue()
+
+    def post(self, body):
+        return client.post("/frame", content=body, headers={"Content-Type": "image/jpeg"}).json()
+
+    def test_local_mode(self, monkeypatch):
+        """Test local mode reads cards without calling the vision model."""
+        monkeypatch.setattr(main, "RECOGNIZER", "local")
+        state = self.post(self.table_jpeg([("9", "clubs"), ("10", "spades"), ("6", "hearts")]))["game_state"]
+        assert [c["rank"] for c in state["dealer_cards"]] == ["9"]
+        assert [c["rank"] for c in state["player_cards"]] == ["10", "6"]
+        assert state["player_total"] == 16
+        assert self.remote_calls == []
+
+    def test_hybrid_confident_stays_local(self, monkeypatch):
+        """Test hybrid mode keeps a confident local read."""
+        monkeypatch.setattr(main, "RECOGNIZER", "hybrid")
+        self.post(self.table_jpeg([("9", "clubs"), ("10", "spades")]))
+        assert self.remote_calls == []
+        assert main.recognizer_stats == {"local": 1, "remote": 0, "fallbacks": 0}
+
+    def test_hybrid_falls_back_when_unsure(self, monkeypatch):
+        """Test hybrid mode asks the vision model when nothing is read confidently."""
+        monkeypatch.setattr(main, "RECOGNIZER", "hybrid")
+        state = self.post(self.table_jpeg([]))["game_state"]
+        assert state["player_cards"][0]["rank"] == "Q"
+        assert len(self.remote_calls) == 1
+        assert main.recognizer_stats == {"local": 0, "remote": 1, "fallbacks": 1}
+
+
+class TestModelResponseParsing:
+    """Test parsing of vision model responses."""
+
+    def test_structured_response(self):
+        """Test a bare JSON object, as structured output returns it, parses directly."""
+        text = json.dumps({"player_cards": [{"rank": "K", "suit": "spades", "confidence": 0.9}], "dealer_cards": []})
+        assert main.parse_model_response(text)["player_cards"][0]["rank"] == "K"
+
+    def test_wrapped_response(self):
+        """Test JSON inside explanation text and a markdown fence is still found."""
+        text = 'Here you go:\n```json\n{"player_cards": [], "dealer_cards": [], "total_running_count": +1}\n```'
+        result = main.parse_model_response(text)
+        assert result["dealer_cards"] == []
+        assert result["total_running_count"] == 1
+
+    def test_no_json(self):
+        """Test a response without JSON yields no cards."""
+        result = main.parse_model_response("I cannot see any cards.")
+        assert result == {"player_cards": [], "dealer_cards": []}
+
+    def test_malformed_json(self):
+        """Test truncated JSON is reported as an error."""
+        with pytest.raises(HTTPException):
+            main.parse_model_response('{"player_cards": [{"rank": "K"')
+
+    def test_malformed_cards_dropped(self):
+        """Test bad card entries are skipped instead of failing the frame."""
+        state = main.build_game_state({
+            "player_cards": [
+                {"rank": "k", "suit": "Spades", "confidence": 1.4},
+                {"rank": "X", "suit": "hearts", "confidence": 0.9},
+                "7",
+                {"suit": "clubs"},
+                {"rank": "6", "suit": "clubs", "confidence": "high"},
+            ],
+            "dealer_cards": None,
+        })
+        assert [(c.rank, c.suit, c.confidence) for c in state.player_cards] == [("K", "spades", 1.0), ("6", "clubs", 0.0)]
+        assert state.player_total == 16
+        assert state.dealer_cards == []
+
+    def test_prompt_leaves_counting_to_server(self):
+        """Test the model is no longer asked for count values."""
+        assert "count" not in main.FRAME_PROMPT.lower()
+
+    def test_strict_schema_requested(self, monkeypatch):
+        """Test requests ask for the strict frame schema, and not when disabled."""
+        fmt = main.completion_options()["response_format"]
+        assert fmt["json_schema"]["strict"] is True
+        assert fmt["json_schema"]["schema"] is main.FRAME_SCHEMA
+        batch = main.completion_options(3)
+        assert batch["max_tokens"] == 3 * main.MAX_TOKENS_PER_FRAME
+        assert batch["response_format"]["json_schema"]["schema"]["properties"]["frames"]["items"] is main.FRAME_SCHEMA
+        monkeypatch.setattr(main, "STRUCTURED_OUTPUT", False)
+        assert "response_format" not in main.completion_options()
+
+    def test_token_usage_recorded(self, monkeypatch):
+        """Test each model call's token usage is added to the counters."""
+        monkeypatch.setattr(main, "model_usage", {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        usage = type("Usage", (), {"prompt_tokens": 300, "completion_tokens": 60})
+        main.record_usage(type("Response", (), {"usage": usage}))
+        main.record_usage(type("Response", (), {}))
+        assert main.model_usage == {"requests": 2, "prompt_tokens": 300, "completion_tokens": 60}
+
+
+class TestMetricsEndpoint:
+    """Test per-stage metrics and the /metrics endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_state(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        main.frame_cache.clear()
+        main.metrics.reset()
+
+    def test_stages_and_errors_exposed(self, monkeypatch):
+        """Test a frame's pipeline stages and a bad frame show up in /metrics."""
+        async def fake_analyze(image_base64):
+            return GameState(player_cards=[Card(rank="9", suit="clubs", confidence=0.9)])
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        client.post("/api/analyze-frame", json={"image_base64": create_dummy_image_base64()})
+        client.post("/api/analyze-frame", json={"image_base64": "not-valid-base64!!!"})
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        for stage in ("decode", "verify", "frame_cache", "preprocess", "recognize", "count", "frame"):
+            assert f'blackjack_stage_seconds{{stage="{stage}",quantile="0.95"}}' in text
+        assert 'blackjack_errors_total{type="invalid_base64"} 1' in text
+        assert 'blackjack_cache_hit_ratio{cache="frame"}' in text
+        assert "blackjack_requests_in_flight" in text
+
+    def test_model_errors_counted_by_type(self, monkeypatch):
+        """Test failed model calls are counted by what went wrong."""
+        class FakeCompletions:
+            async def create(self, **kwargs):
+                message = type("Message", (), {"content": '{"player_cards": ['})
+                return type("Response", (), {"choices": [type("Choice", (), {"message": message})]})
+
+        fake_client = type("Client", (), {"chat": type("Chat", (), {"completions": FakeCompletions()})})
+        monkeypatch.setattr(main, "get_openai_client", lambda: fake_client)
+        with pytest.raises(HTTPException):
+            asyncio.run(main.analyze_frame_with_gpt4("aaa"))
+        snapshot = main.metrics.snapshot()
+        assert snapshot["errors"] == {"parse": 1}
+        assert {"queue", "model", "parse"} <= set(snapshot["stages"])
+
+    def test_server_timing_header(self, monkeypatch):
+        """Test responses carry their own stage timings when enabled."""
+        async def fake_analyze(image_base64):
+            return GameState()
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        monkeypatch.setattr(main.metrics, "in_flight", 0)
+        timed_app = main.MetricsMiddleware(main.app.router, main.metrics, server_timing=True)
+        response = TestClient(timed_app).post(
+            "/api/analyze-frame", json={"image_base64": create_dummy_image_base64()}
+        )
+        stages = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+        assert {"decode", "verify", "recognize", "frame"} <= set(stages)
+        assert "server-timing" not in client.get("/health").headers
+
+
+class TestGameStateUpdates:
+    """Test game state pushes over the WebSocket channel."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_state(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        monkeypatch.setattr(main, "state_hub", main.StateHub())
+        main.frame_cache.clear()
+
+    def test_changed_fields_pushed(self, monkeypatch):
+        """Test subscribers get a snapshot, then only what each frame changed."""
+        hands = iter([["K", "6"], ["K", "6", "5"]])
+
+        async def fake_analyze(image_base64):
+            return main.build_game_state({
+                "player_cards": [{"rank": rank, "suit": "spades", "confidence": 0.9} for rank in next(hands)],
+                "dealer_cards": [{"rank": "9", "suit": "clubs", "confidence": 0.9}],
+            })
+
+        monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+        monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+        with TestClient(app) as tc, tc.websocket_connect("/ws/table-9") as ws, \
+                tc.websocket_connect("/ws/table-9") as other:
+            assert ws.receive_json() == {"type": "snapshot", "session_id": "table-9", "seq": 0, "state": {}}
+            other.receive_json()
+
+            for color in [(0, 0, 200), (0, 200, 0)]:
+                tc.post("/frame/table-9", content=make_jpeg(color), headers={"Content-Type": "image/jpeg"})
+            first, second = ws.receive_json(), ws.receive_json()
+            assert first["changes"]["recommendation"] == "H"
+            assert second["seq"] == first["seq"] + 1
+            assert second["changes"]["recommendation"] == "S"
+            assert [c["rank"] for c in second["changes"]["player_cards"]] == ["K", "6", "5"]
+            assert second["changes"]["cumulative_running_count"] == 1
+            assert "dealer_cards" not in second["changes"]
+            assert other.receive_json() == first
+
+            tc.post("/api/reset-count", headers={"X-Session-ID": "table-9"})
+            reset = ws.receive_json()["changes"]
+            assert reset["cumulative_running_count"] == 0
+            assert reset["cards_seen"] == 0
+            ws.send_json({"type": "resync"})
+            snapshot = ws.receive_json()
+            assert snapshot["type"] == "snapshot"
+            assert snapshot["state"]["player_total"] == 21
+
+    def test_invalid_session_rejected(self):
+        """Test subscribing with a malformed session ID is refused."""
+        from starlette.websockets import WebSocketDisconnect
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws/not valid!") as ws:
+                ws.receive_json()
+
+
+class TestBatchEndpoint:
+    """Test multi-frame analysis."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_state(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+        main.frame_cache.clear()
+
+    def test_frames_packed_into_one_request(self, monkeypatch):
+        """Test frames from several tables share one model call."""
+        calls = []
+
+        async def fake_analyze_frames(images):
+            calls.append(len(images))
+            return [
+                GameState(player_cards=[Card(rank=rank, suit="hearts", confidence=0.9)])
+                for rank in ["2", "K", "9"][:len(images)]
+            ]
+
+        monkeypatch.setattr(main, "analyze_frames_with_gpt4", fake_analyze_frames)
+        frames = [
+            {"image_base64": create_dummy_image_base64(), "session_id": "table-1"},
+            {"image_base64": "not-valid-base64!!!", "session_id": "table-1"},
+            {"image_base64": base64.b64encode(make_jpeg((0, 0, 255))).decode(), "session_id": "table-2"},
+        ]
+        response = client.post("/api/analyze-batch", json={"frames": frames})
+        results = response.json()["results"]
+        assert calls == [2]
+        assert [r["success"] for r in results] == [True, False, True]
+        assert results[0]["game_state"]["player_cards"][0]["rank"] == "2"
+        assert results[2]["game_state"]["cumulative_running_count"] == -1
+        assert main.count_store.get("table-1") == 1
+
+    def test_frames_wait_for_the_whole_request(self, monkeypatch):
+        """Test frames that take different times to prepare still share one model call."""
+        calls = []
+
+        async def fake_analyze_frames(images):
+            calls.append(len(images))
+            return [GameState() for _ in images]
+
+        monkeypatch.setattr(main, "analyze_frames_with_gpt4", fake_analyze_frames)
+        sizes = [(100, 100), (1600, 1200), (640, 480), (1600, 1200)]
+        frames = [{"image_base64": base64.b64encode(make_jpeg((40 * i, 0, 255), size)).decode(),
+                   "session_id": f"table-{i}"} for i, size in enumerate(sizes)]
+        response = client.post("/api/analyze-batch", json={"frames": frames})
+        assert [r["success"] for r in response.json()["results"]] == [True] * 4
+        assert calls == [4]
+        assert main.vision_batcher.stats()["holds"] == 0
+
+    def test_frames_split_by_batch_max_frames(self, monkeypatch):
+        """Test a request larger than BATCH_MAX_FRAMES is split into full calls first."""
+        monkeypatch.setattr(main.vision_batcher, "max_batch", 2)
+        calls = []
+
+        async def fake_analyze_frames(images):
+            calls.append(len(images))
+            return [GameState() for _ in images]
+
+        monkeypatch.setattr(main, "analyze_frames_with_gpt4", fake_analyze_frames)
+        frames = [{"image_base64": base64.b64encode(make_jpeg((40 * i, 0, 255), (1600, 1200))).decode(),
+                   "session_id": f"table-{i}"} for i in range(5)]
+        # A frame already in the cache does not hold the others back
+        cached = Image.open(io.BytesIO(base64.b64decode(frames[0]["image_base64"])))
+        main.frame_cache.put("table-0", main.dhash(cached), GameState())
+        response = client.post("/api/analyze-batch", json={"frames": frames})
+        assert [r["success"] for r in response.json()["results"]] == [True] * 5
+        assert calls == [2, 2]
+        assert main.vision_batcher.stats()["holds"] == 0
+
+    def test_batch_response_split_per_frame(self, monkeypatch):
+        """Test one model response with a frames array yields one GameState per image."""
+        content = json.dumps({"frames": [
+            {"player_cards": [{"rank": "A", "suit": "spades", "confidence": 0.9}], "dealer_cards": []},
+            {"player_cards": [], "dealer_cards": [{"rank": "6", "suit": "clubs", "confidence": 0.8}]},
+        ]})
+        requests = []
+
+        class FakeCompletions:
+            async def create(self, **kwargs):
+                requests.append(kwargs)
+                message = type("Message", (), {"content": content})
+                return type("Response", (), {"choices": [type("Choice", (), {"message": message})]})
+
+        fake_client = type("Client", (), {"chat": type("Chat", (), {"completions": FakeCompletions()})})
+        monkeypatch.setattr(main, "get_openai_client", lambda: fake_client)
+
+        states = asyncio.run(main.analyze_frames_with_gpt4(["aaa", "bbb"]))
+        assert [len(s.player_cards) for s in states] == [1, 0]
+        assert states[1].dealer_total == 6
+        image_parts = [p for p in requests[0]["messages"][0]["content"] if p["type"] == "image_url"]
+        assert len(image_parts) == 2
+        assert requests[0]["response_format"]["json_schema"]["name"] == "blackjack_frames"
+
+    def test_empty_batch_rejected(self):
+        """Test a batch must contain at least one frame."""
+        response = client.post("/api/analyze-batch", json={"frames": []})
+        assert response.status_code == 422
+
+
+class TestOpenAIClient:
+    """Test the shared OpenAI client lifecycle."""
+
+    def test_client_reused_across_calls(self, monkeypatch):
+        """Test one client instance is shared by every request."""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(main, "_openai_client", None)
+        assert main.get_openai_client() is main.get_openai_client()
+
+    def test_missing_api_key(self, monkeypatch):
+        """Test a missing API key is reported instead of creating a client."""
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        monkeypatch.setattr(main, "_openai_client", None)
+        with pytest.raises(HTTPException):
+            main.get_openai_client()
+
+    def test_lifespan_creates_and_closes_client(self, monkeypatch, tmp_path):
+        """Test the app lifespan loads the client in the background and closes it."""
+        monkeypatch.setattr(main, "count_store", CountStore(str(tmp_path / "count.txt")))
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(main, "_openai_client", None)
+        with TestClient(app) as tc:
+            assert tc.get("/health").status_code == 200
+            for _ in range(200):
+                if main._openai_client is not None:
+                    break
+                time.sleep(0.01)
+            assert main._openai_client is not None
+        assert main._openai_client is None
+
+
 class TestGameStateModel:
     """Test GameState model."""
     
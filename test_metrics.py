@@ -0,0 +1,110 @@
+"""
+Tests for the per-stage latency metrics
+"""
+
+import asyncio
+
+from metrics import BUCKET_BOUNDS, LatencyHistogram, Metrics, MetricsMiddleware, server_timing_header
+
+
+class TestLatencyHistogram:
+    def test_empty(self):
+        assert LatencyHistogram().quantile(0.99) == 0.0
+
+    def test_quantiles_within_bucket_error(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.observe(ms / 1000)
+        for q in (0.5, 0.95, 0.99):
+            exact = q
+            assert exact <= histogram.quantile(q) <= exact * 2 ** 0.25
+
+    def test_quantile_capped_at_largest_sample(self):
+        histogram = LatencyHistogram()
+        histogram.observe(0.0123)
+        assert histogram.quantile(0.5) == 0.0123
+        histogram.observe(BUCKET_BOUNDS[-1] * 10)
+        assert histogram.quantile(0.99) == BUCKET_BOUNDS[-1] * 10
+
+    def test_sum_and_count(self):
+        histogram = LatencyHistogram()
+        histogram.observe(0.1)
+        histogram.observe(0.3)
+        assert histogram.count == 2
+        assert abs(histogram.sum - 0.4) < 1e-9
+
+
+class TestMetrics:
+    def test_timer_records_stage(self):
+        metrics = Metrics()
+        with metrics.timer("parse"):
+            pass
+        with metrics.timer("parse"):
+            pass
+        assert metrics.snapshot()["stages"]["parse"]["count"] == 2
+
+    def test_timer_records_on_error(self):
+        metrics = Metrics()
+        try:
+            with metrics.timer("model"):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert metrics.snapshot()["stages"]["model"]["count"] == 1
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.observe("model", 0.25)
+        metrics.error("invalid_image")
+        metrics.error("invalid_image")
+        text = metrics.render(
+            gauges=[("cache_hit_ratio", {"cache": "frame"}, 0.5)],
+            counters=[("model_tokens_total", {"kind": "prompt"}, 300)],
+        )
+        lines = text.splitlines()
+        assert 'blackjack_stage_seconds{stage="model",quantile="0.99"} 0.25' in lines
+        assert 'blackjack_stage_seconds_count{stage="model"} 1' in lines
+        assert 'blackjack_errors_total{type="invalid_image"} 2' in lines
+        assert "blackjack_requests_in_flight 0" in lines
+        assert "# TYPE blackjack_cache_hit_ratio gauge" in lines
+        assert 'blackjack_cache_hit_ratio{cache="frame"} 0.5' in lines
+        assert 'blackjack_model_tokens_total{kind="prompt"} 300' in lines
+
+    def test_label_values_escaped(self):
+        metrics = Metrics()
+        metrics.error('bad "quote"')
+        assert 'type="bad \\"quote\\""' in metrics.render()
+
+
+def test_server_timing_header():
+    assert server_timing_header([("decode", 0.0012), ("model", 0.3104)]) == "decode;dur=1.2, model;dur=310.4"
+
+
+class TestMiddleware:
+    def call(self, server_timing):
+        metrics = Metrics()
+        in_flight = []
+
+        async def app(scope, receive, send):
+            in_flight.append(metrics.in_flight)
+            with metrics.timer("verify"):
+                pass
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = MetricsMiddleware(app, metrics, server_timing=server_timing)
+        asyncio.run(middleware({"type": "http"}, None, send))
+        assert in_flight == [1]
+        assert metrics.in_flight == 0
+        return dict(sent[0]["headers"])
+
+    def test_server_timing_added(self):
+        assert self.call(True)[b"server-timing"].startswith(b"verify;dur=")
+
+    def test_server_timing_off(self):
+        assert b"server-timing" not in self.call(False)
@@ -0,0 +1,223 @@
+"""
+Tests for batched count persistence
+"""
+
+import asyncio
+import multiprocessing
+
+import pytest
+
+from persistence import CountStore, SharedCountStore, read_counts, write_counts_atomic
+from shoe import ShoeTracker
+from strategy import RANK_VALUES
+
+
+def hi_lo(rank):
+    value = RANK_VALUES[rank]
+    return 1 if value <= 6 else -1 if value >= 10 else 0
+
+
+class Card:
+    def __init__(self, rank, suit="hearts"):
+        self.rank, self.suit = rank, suit
+
+
+def add_ones(path, times):
+    store = SharedCountStore(path)
+    for _ in range(times):
+        store.add(1, "table-1")
+
+
+class TestCountFile:
+    """Test reading and atomically writing the count file."""
+
+    def test_missing_file_reads_empty(self, tmp_path):
+        assert read_counts(str(tmp_path / "missing.txt")) == {}
+
+    def test_invalid_file_reads_empty(self, tmp_path):
+        path = tmp_path / "count.txt"
+        path.write_text("")
+        assert read_counts(str(path)) == {}
+
+    def test_legacy_single_count(self, tmp_path):
+        """Test a pre-session count file loads as the default session."""
+        path = tmp_path / "count.txt"
+        path.write_text("-7")
+        assert read_counts(str(path)) == {"default": -7}
+
+    def test_atomic_write_leaves_no_temp_files(self, tmp_path):
+        path = tmp_path / "count.txt"
+        write_counts_atomic(str(path), {"default": -7, "table-2": 3})
+        assert read_counts(str(path)) == {"default": -7, "table-2": 3}
+        assert [p.name for p in tmp_path.iterdir()] == ["count.txt"]
+
+
+class TestCountStore:
+    """Test write-behind flushing."""
+
+    def test_update_does_not_write(self, tmp_path):
+        """Test updates stay in memory until flushed."""
+        path = tmp_path / "count.txt"
+        store = CountStore(str(path))
+        store.update(3)
+        store.update(-1, "table-2")
+        assert store.get() == 3
+        assert store.get("table-2") == -1
+        assert not path.exists()
+        assert store.flush() is True
+        assert read_counts(str(path)) == {"default": 3, "table-2": -1}
+        assert store.flush() is False
+
+    def test_remove(self, tmp_path):
+        """Test removed sessions are dropped from the next flush."""
+        path = tmp_path / "count.txt"
+        store = CountStore(str(path))
+        store.update(2, "table-2")
+        store.flush()
+        store.remove("table-2")
+        assert store.get("table-2") == 0
+        store.flush()
+        assert read_counts(str(path)) == {}
+
+    def test_flush_after_n_updates(self, tmp_path):
+        """Test the background task flushes once flush_every updates queue up."""
+        path = tmp_path / "count.txt"
+
+        async def scenario():
+            store = CountStore(str(path), flush_interval=60, flush_every=3)
+            store.start()
+            store.update(1)
+            store.update(2)
+            await asyncio.sleep(0.05)
+            assert not path.exists()
+            store.update(3)
+            for _ in range(100):
+                if path.exists():
+                    break
+                await asyncio.sleep(0.01)
+            assert read_counts(str(path)) == {"default": 3}
+            await store.close()
+
+        asyncio.run(scenario())
+
+    def test_flush_on_interval(self, tmp_path):
+        """Test a single update is flushed after the interval."""
+        path = tmp_path / "count.txt"
+
+        async def scenario():
+            store = CountStore(str(path), flush_interval=0.02, flush_every=1000)
+            store.start()
+            store.update(5)
+            await asyncio.sleep(0.2)
+            assert read_counts(str(path)) == {"default": 5}
+            await store.close()
+
+        asyncio.run(scenario())
+
+    def test_close_flushes_pending(self, tmp_path):
+        """Test shutdown writes the latest count."""
+        path = tmp_path / "count.txt"
+
+        async def scenario():
+            store = CountStore(str(path), flush_interval=60, flush_every=1000)
+            store.start()
+            store.update(9)
+            await store.close()
+
+        asyncio.run(scenario())
+        assert read_counts(str(path)) == {"default": 9}
+        assert CountStore(str(path)).get() == 9
+
+
+class TestSharedCountStore:
+    """Test the SQLite store shared by worker processes."""
+
+    def test_get_update_add(self, tmp_path):
+        store = SharedCountStore(str(tmp_path / "counts.db"))
+        assert store.get() == 0
+        store.update(3)
+        assert store.add(-5) == -2
+        assert store.add(2, "table-2") == 2
+        assert SharedCountStore(str(tmp_path / "counts.db")).get() == -2
+
+    def test_concurrent_increments_across_processes(self, tmp_path):
+        """Test increments from several processes are never lost."""
+        path = str(tmp_path / "counts.db")
+        SharedCountStore(path)
+        workers = [multiprocessing.Process(target=add_ones, args=(path, 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert [worker.exitcode for worker in workers] == [0] * 4
+        assert SharedCountStore(path).get("table-1") == 800
+
+    def test_shoe_state_follows_the_table(self, tmp_path):
+        """Test a worker picks up cards another worker already counted."""
+        path = str(tmp_path / "counts.db")
+        first, second = SharedCountStore(path), SharedCountStore(path)
+        tracker_a, tracker_b = ShoeTracker(hi_lo), ShoeTracker(hi_lo)
+        with first.shoe("t1", tracker_a):
+            tracker_a.update([Card("2"), Card("K")], [])
+        with second.shoe("t1", tracker_b):
+            assert tracker_b.update([Card("2"), Card("K"), Card("3")], []) == [("3", "hearts")]
+        assert tracker_b.running_count == 1
+        assert tracker_b.cards_seen == 3
+        with first.shoe("t1", tracker_a):
+            assert tracker_a.running_count == 1
+        second.add(4, "t1")
+        with first.shoe("t1", tracker_a):
+            assert tracker_a.running_count == 5
+
+    def test_failed_update_reloads_tracker(self, tmp_path):
+        """Test a tracker changed by a rolled-back update is reloaded from the database."""
+        store = SharedCountStore(str(tmp_path / "counts.db"))
+        tracker = ShoeTracker(hi_lo)
+        with store.shoe("t1", tracker):
+            tracker.update([Card("2")], [])
+        with pytest.raises(RuntimeError):
+            with store.shoe("t1", tracker):
+                tracker.update([Card("2"), Card("3")], [])
+                raise RuntimeError("frame failed")
+        with store.shoe("t1", tracker):
+            assert tracker.running_count == 1
+            assert tracker.cards_seen == 1
+        assert store.get("t1") == 1
+
+    def test_recreated_session_reloads_tracker(self, tmp_path):
+        """Test a session removed and written again is not mistaken for the copy a tracker holds."""
+        path = str(tmp_path / "counts.db")
+        first, second = SharedCountStore(path), SharedCountStore(path, idle_timeout=0)
+        tracker_a, tracker_b = ShoeTracker(hi_lo), ShoeTracker(hi_lo)
+        with first.shoe("t1", tracker_a):
+            tracker_a.update([Card("2")], [])
+        second.remove("t1")
+        with second.shoe("t1", tracker_b):
+            tracker_b.update([Card("K")], [])
+        with first.shoe("t1", tracker_a):
+            assert tracker_a.running_count == -1
+            assert tracker_a.cards_seen == 1
+
+    def test_remove_keeps_recently_used_sessions(self, tmp_path):
+        path = str(tmp_path / "counts.db")
+        store = SharedCountStore(path, idle_timeout=60)
+        store.update(3, "t1")
+        store.remove("t1")
+        assert store.get("t1") == 3
+        SharedCountStore(path, idle_timeout=0).remove("t1")
+        assert store.get("t1") == 0
+
+    def test_imports_count_file_once(self, tmp_path):
+        count_file = tmp_path / "count.txt"
+        write_counts_atomic(str(count_file), {"default": 4})
+        store = SharedCountStore(str(tmp_path / "counts.db"), import_path=str(count_file))
+        assert store.get() == 4
+        store.update(1)
+        assert SharedCountStore(str(tmp_path / "counts.db"), import_path=str(count_file)).get() == 1
+
+    def test_close_checkpoints(self, tmp_path):
+        path = tmp_path / "counts.db"
+        store = SharedCountStore(str(path))
+        store.update(7)
+        asyncio.run(store.close())
+        assert SharedCountStore(str(path)).get() == 7
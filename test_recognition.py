@@ -0,0 +1,105 @@
+"""
+Tests for the local card recognizer
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from recognition import (
+    RANKS, SUITS, CardTemplates, Recognizer, TemplateRecognizer, create_recognizer, find_card_regions,
+    min_confidence, render_card,
+)
+
+FELT = (30, 110, 50)
+
+
+@pytest.fixture(scope="module")
+def recognizer():
+    return TemplateRecognizer()
+
+
+def table_frame(dealer=(), player=(), size=(1600, 1200), card_width=200):
+    """A JPEG of cards laid out on felt: dealer's row on top, player's below."""
+    frame = Image.new("RGB", size, FELT)
+    for row, cards in ((0.08, dealer), (0.6, player)):
+        for i, (rank, suit) in enumerate(cards):
+            frame.paste(render_card(rank, suit, card_width), (100 + i * (card_width + 60), round(row * size[1])))
+    buf = io.BytesIO()
+    frame.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def ranks_and_suits(cards):
+    return [(card["rank"], card["suit"]) for card in cards]
+
+
+class TestTemplateRecognizer:
+    def test_reads_table(self, recognizer):
+        dealer = [("K", "spades"), ("7", "hearts")]
+        player = [("10", "diamonds"), ("6", "clubs"), ("A", "hearts")]
+        result = recognizer.recognize(table_frame(dealer, player))
+        assert ranks_and_suits(result["dealer_cards"]) == dealer
+        assert ranks_and_suits(result["player_cards"]) == player
+        assert min_confidence(result) > 0.7
+
+    @pytest.mark.parametrize("suit", SUITS)
+    def test_every_card_at_preprocessed_size(self, recognizer, suit):
+        """Every rank reads correctly in an 800px frame, as sent after preprocessing."""
+        for rank in RANKS:
+            result = recognizer.recognize(table_frame(player=[(rank, suit)], size=(800, 600), card_width=110))
+            assert ranks_and_suits(result["player_cards"]) == [(rank, suit)]
+
+    def test_empty_table(self, recognizer):
+        result = recognizer.recognize(table_frame())
+        assert result == {"player_cards": [], "dealer_cards": []}
+        assert min_confidence(result) == 0.0
+
+    @pytest.mark.parametrize("offset", [(30, 20), (40, 0), (60, 10)])
+    def test_fanned_cards_not_trusted(self, recognizer, offset):
+        """Overlapping cards merge into one region that is not read confidently."""
+        frame = Image.new("RGB", (800, 600), FELT)
+        frame.paste(render_card("9", "clubs", 110), (300, 350))
+        frame.paste(render_card("4", "hearts", 110), (300 + offset[0], 350 + offset[1]))
+        buf = io.BytesIO()
+        frame.save(buf, format="JPEG")
+        result = recognizer.recognize(buf.getvalue())
+        assert len(result["player_cards"]) <= 1
+        assert min_confidence(result) < 0.7
+
+
+class TestRegions:
+    def test_card_shaped_regions_only(self):
+        gray = np.zeros((60, 80), dtype=np.uint8)
+        gray[5:33, 5:25] = 255  # card: 20 x 28
+        gray[40:44, 30:78] = 255  # bright strip, wrong shape
+        assert find_card_regions(gray) == [(5, 5, 25, 33)]
+
+
+class TestTemplates:
+    def test_from_directory(self, tmp_path):
+        for rank in RANKS:
+            render_card(rank, "spades", 160).crop((10, 5, 45, 45)).save(tmp_path / f"rank_{rank}.png")
+        for suit in SUITS:
+            render_card("A", suit, 160).crop((10, 45, 40, 90)).save(tmp_path / f"suit_{suit}.png")
+        templates = CardTemplates.from_directory(str(tmp_path))
+        assert set(templates.ranks) == set(RANKS)
+        assert set(templates.suits) == set(SUITS)
+
+    def test_incomplete_directory(self, tmp_path):
+        render_card("A", "spades").save(tmp_path / "rank_A.png")
+        with pytest.raises(ValueError):
+            CardTemplates.from_directory(str(tmp_path))
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            create_recognizer("onnx")
+
+    def test_incomplete_backend(self):
+        class NoRecognize(Recognizer):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            NoRecognize()
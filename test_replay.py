@@ -0,0 +1,89 @@
+"""
+Tests for archive replay
+"""
+
+import asyncio
+import base64
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+import replay
+from archive import ArchiveReader, ArchiveWriter
+from persistence import CountStore
+from sessions import SessionStore
+
+REPLIES = [
+    '{"player_cards": [{"rank": "10", "suit": "hearts", "confidence": 0.9}], "dealer_cards": []}',
+    '{"player_cards": [{"rank": "10", "suit": "hearts", "confidence": 0.9}, '
+    '{"rank": "6", "suit": "clubs", "confidence": 0.9}], '
+    '"dealer_cards": [{"rank": "9", "suit": "spades", "confidence": 0.8}]}',
+]
+
+
+def frame(shade):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (shade, 100, 50)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def record_session(monkeypatch, directory):
+    """Post two frames through the app with the archive on, as production would."""
+    for name in ("count_store", "sessions", "archive", "analyze_frame_with_gpt4", "local_recognizer",
+                 "_batch_window_ms"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, "count_store", CountStore(str(directory / "count.txt")))
+    monkeypatch.setattr(main, "sessions", SessionStore(main.create_shoe_tracker))
+    monkeypatch.setattr(main.frame_cache, "max_entries", 0)
+    replies = list(REPLIES)
+
+    async def fake_analyze(image_base64):
+        text = replies.pop(0)
+        game_state = main.build_game_state(main.parse_model_response(text))
+        game_state._model_response = text
+        return game_state
+
+    monkeypatch.setattr(main, "analyze_frame_with_gpt4", fake_analyze)
+    writer = ArchiveWriter(str(directory / "archive"))
+    monkeypatch.setattr(main, "archive", writer)
+    client = TestClient(main.app)
+    for shade in (10, 200):
+        response = client.post("/api/analyze-frame", headers={"X-Session-ID": "table-1"},
+                               json={"image_base64": base64.b64encode(frame(shade)).decode("ascii")})
+        assert response.json()["success"]
+    assert writer.flush() == 2
+    return str(directory / "archive")
+
+
+class TestReplay:
+    """Test recording frames and replaying them through the pipeline."""
+
+    def test_frames_are_archived(self, monkeypatch, tmp_path):
+        with ArchiveReader(record_session(monkeypatch, tmp_path)) as reader:
+            assert len(reader) == 2
+            record = reader[1]
+            assert record.session_id == "table-1"
+            assert record.image == frame(200)
+            assert record.model_response == REPLIES[1]
+            assert record.game_state["recommendation"] == "H"
+            assert record.game_state["cumulative_running_count"] == 0
+
+    def test_recorded_replay_matches_archive(self, monkeypatch, tmp_path):
+        """Test replaying with the archived replies reproduces every frame."""
+        directory = record_session(monkeypatch, tmp_path)
+        with ArchiveReader(directory) as reader:
+            current = replay.isolate_pipeline(live=False)
+            summary = asyncio.run(replay.replay(reader, range(len(reader)), current))
+        assert summary["frames"] == 2
+        assert summary["mismatched"] == 0
+        assert summary["failed"] == 0
+
+    def test_differences_ignore_confidence(self):
+        archived = {"player_cards": [{"rank": "K", "suit": "hearts", "confidence": 0.9}], "recommendation": "S",
+                    "cumulative_running_count": -1, "true_count": 0.5}
+        replayed = dict(archived, player_cards=[{"rank": "K", "suit": "hearts", "confidence": 0.4}], true_count=0.1)
+        assert replay.differences(archived, replayed) == []
+        replayed["recommendation"] = "H"
+        assert replay.differences(archived, replayed) == ["recommendation"]
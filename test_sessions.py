@@ -0,0 +1,61 @@
+"""
+Tests for the session store
+"""
+
+import time
+
+from sessions import SessionStore, is_valid_session_id
+
+
+class TestSessionStore:
+    """Test session lookup and idle eviction."""
+
+    def test_created_on_first_use(self):
+        """Test a session and its tracker are created once."""
+        created = []
+        store = SessionStore(lambda sid: created.append(sid) or sid)
+        first = store.get("table-1")
+        assert store.get("table-1") is first
+        assert first.tracker == "table-1"
+        assert created == ["table-1"]
+        assert len(store) == 1
+
+    def test_idle_sessions_evicted(self):
+        """Test sessions idle past the timeout are dropped and reported."""
+        evicted = []
+        store = SessionStore(lambda sid: None, idle_timeout=0.01, on_evict=evicted.append)
+        store.get("old")
+        time.sleep(0.02)
+        store.get("new")
+        assert "old" not in store
+        assert "new" in store
+        assert evicted == ["old"]
+
+    def test_access_keeps_session_alive(self):
+        """Test a recently used session survives eviction."""
+        store = SessionStore(lambda sid: None, idle_timeout=0.05)
+        store.get("a")
+        store.get("b")
+        time.sleep(0.03)
+        store.get("a")
+        time.sleep(0.03)
+        assert store.evict_idle() == ["b"]
+        assert "a" in store
+
+    def test_peek_does_not_create(self):
+        store = SessionStore(lambda sid: None)
+        assert store.peek("missing") is None
+        assert len(store) == 0
+
+
+class TestSessionIds:
+    """Test session ID validation."""
+
+    def test_valid(self):
+        assert is_valid_session_id("table-1")
+        assert is_valid_session_id("esp32:AA.BB_cc")
+
+    def test_invalid(self):
+        assert not is_valid_session_id("")
+        assert not is_valid_session_id("has space")
+        assert not is_valid_session_id("x" * 65)
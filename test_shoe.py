@@ -0,0 +1,93 @@
+"""
+Tests for incremental shoe tracking
+"""
+
+from main import Card, GameState, get_hi_lo_count_value
+from shoe import ShoeTracker
+
+
+def card(rank, suit="hearts"):
+    return Card(rank=rank, suit=suit, confidence=0.9)
+
+
+def state(player=(), dealer=()):
+    return GameState(player_cards=[card(*c) for c in player], dealer_cards=[card(*c) for c in dealer])
+
+
+def replay(tracker, states):
+    """Feed recorded frames through the tracker, returning counts per frame."""
+    counts = []
+    for game_state in states:
+        tracker.update(game_state.player_cards, game_state.dealer_cards)
+        counts.append(tracker.running_count)
+    return counts
+
+
+# Two rounds as the camera saw them: cards held for several frames,
+# a hit, a dropped detection and the table clearing between rounds.
+RECORDED_ROUNDS = [
+    state(player=[("5", "hearts")]),
+    state(player=[("5", "hearts"), ("K", "spades")]),
+    state(player=[("5", "hearts"), ("K", "spades")], dealer=[("6", "clubs")]),
+    state(player=[("5", "hearts"), ("K", "spades")], dealer=[("6", "clubs")]),
+    state(player=[("5", "hearts")], dealer=[("6", "clubs")]),
+    state(player=[("5", "hearts"), ("K", "spades"), ("2", "diamonds")], dealer=[("6", "clubs")]),
+    state(player=[("5", "hearts"), ("K", "spades"), ("2", "diamonds")], dealer=[("6", "clubs"), ("A", "hearts")]),
+    state(),
+    state(),
+    state(player=[("5", "hearts"), ("9", "clubs")], dealer=[("3", "spades")]),
+    state(player=[("5", "hearts"), ("9", "clubs")], dealer=[("3", "spades")]),
+]
+
+
+class TestShoeTracker:
+    """Test the incremental running count."""
+
+    def test_replay_counts_each_card_once(self):
+        """Test a recorded frame sequence counts every physical card once."""
+        tracker = ShoeTracker(get_hi_lo_count_value)
+        counts = replay(tracker, RECORDED_ROUNDS)
+        assert counts == [1, 0, 1, 1, 1, 2, 1, 1, 1, 3, 3]
+        assert tracker.cards_seen == 8
+        assert tracker.round_number == 1
+
+    def test_single_empty_frame_does_not_end_round(self):
+        """Test one dropped detection does not recount the table."""
+        tracker = ShoeTracker(get_hi_lo_count_value, clear_frames=2)
+        replay(tracker, [state(player=[("2",)]), state(), state(player=[("2",)])])
+        assert tracker.running_count == 1
+        assert tracker.round_number == 0
+
+    def test_duplicate_cards_in_multi_deck_shoe(self):
+        """Test two identical cards on the table both count."""
+        tracker = ShoeTracker(get_hi_lo_count_value)
+        added = tracker.update([card("4"), card("4")], [])
+        assert len(added) == 2
+        assert tracker.running_count == 2
+
+    def test_update_returns_only_new_cards(self):
+        """Test unchanged frames report no new cards."""
+        tracker = ShoeTracker(get_hi_lo_count_value)
+        assert tracker.update([card("10")], []) == [("10", "hearts")]
+        assert tracker.update([card("10")], []) == []
+
+    def test_reset(self):
+        """Test reset starts a new shoe."""
+        tracker = ShoeTracker(get_hi_lo_count_value, running_count=5)
+        tracker.update([card("2")], [])
+        tracker.reset()
+        assert tracker.running_count == 0
+        assert tracker.cards_seen == 0
+        assert tracker.update([card("2")], []) == [("2", "hearts")]
+
+    def test_state_round_trip(self):
+        """Test a tracker loaded from another's state continues its round."""
+        tracker = ShoeTracker(get_hi_lo_count_value)
+        tracker.update([card("10"), card("4")], [card("6", "spades")])
+        other = ShoeTracker(get_hi_lo_count_value)
+        other.load(tracker.to_dict())
+        assert other.update([card("10"), card("4")], [card("6", "spades")]) == []
+        assert other.update([card("10"), card("4"), card("2")], [card("6", "spades")]) == [("2", "hearts")]
+        assert other.running_count == 2
+        assert other.cards_seen == 4
+        assert other.composition.remaining == tracker.composition.remaining - 1
@@ -0,0 +1,64 @@
+"""
+Tests for the Monte Carlo simulator
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from simulator import TableRules, add_card, simulate
+from strategy import RANK_VALUES, hand_total
+
+
+class TestAddCard:
+    """Test the vectorized hand arithmetic against hand_total."""
+
+    def test_matches_hand_total(self):
+        """Test random hands total the same as strategy.hand_total."""
+        rng = random.Random(7)
+        ranks = list(RANK_VALUES)
+        hands = [[rng.choice(ranks) for _ in range(rng.randint(2, 6))] for _ in range(500)]
+        width = max(len(hand) for hand in hands)
+
+        total = np.zeros(len(hands), dtype=np.int64)
+        soft = np.zeros(len(hands), dtype=np.int64)
+        for i in range(width):
+            values = np.array([RANK_VALUES[hand[i]] if i < len(hand) else 0 for hand in hands])
+            total, soft = add_card(total, soft, values)
+
+        for hand, t, s in zip(hands, total, soft):
+            assert (t, s > 0) == hand_total(hand)
+
+
+class TestSimulate:
+    """Test simulation runs and aggregation."""
+
+    def test_basic_strategy_edge(self):
+        """Test the basic strategy house edge lands near the known value."""
+        result = simulate(200_000, TableRules(decks=6), lanes=2048, seed=3)
+        assert result.rounds >= 200_000
+        assert -0.015 < result.ev < 0.005
+        assert 1.1 < result.variance < 1.5
+        assert sum(count for _, count in result.ev_by_true_count().values()) == result.rounds
+
+    def test_seed_is_reproducible(self):
+        a = simulate(20_000, lanes=1024, seed=11)
+        b = simulate(20_000, lanes=1024, seed=11)
+        assert a.total == b.total
+
+    def test_blackjack_payout_lowers_ev(self):
+        """Test 6:5 blackjack costs the player compared with 3:2."""
+        three_two = simulate(50_000, TableRules(blackjack_payout=1.5), lanes=2048, seed=5)
+        six_five = simulate(50_000, TableRules(blackjack_payout=1.2), lanes=2048, seed=5)
+        assert six_five.ev < three_two.ev
+
+    def test_process_pool(self):
+        """Test results from several workers are merged."""
+        result = simulate(20_000, workers=2, lanes=1024, seed=1)
+        assert result.rounds >= 20_000
+        assert result.hands >= result.rounds
+
+    def test_invalid_penetration(self):
+        with pytest.raises(ValueError):
+            TableRules(penetration=1.5)
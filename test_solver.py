@@ -0,0 +1,108 @@
+"""
+Tests for the composition-dependent strategy solver
+"""
+
+import pytest
+
+from main import Card, get_hi_lo_count_value
+from shoe import ShoeTracker
+from solver import Composition, StrategySolver, add_card, full_shoe
+
+
+def shoe_after(*ranks, decks=6):
+    composition = Composition(decks)
+    for rank in ranks:
+        composition.remove(rank)
+    return composition.key()
+
+
+class TestComposition:
+    def test_full_shoe(self):
+        assert sum(full_shoe(6)) == 312
+        assert full_shoe(1)[8] == 16
+
+    def test_remove_and_reset(self):
+        composition = Composition(1)
+        composition.remove('K')
+        composition.remove('A')
+        composition.remove('X')
+        assert composition.counts[8] == 15
+        assert composition.counts[9] == 3
+        assert composition.remaining == 50
+        composition.reset()
+        assert composition.remaining == 52
+
+    def test_tracker_removes_new_cards_once(self):
+        tracker = ShoeTracker(get_hi_lo_count_value, decks=1)
+        cards = [Card(rank="5", suit="hearts", confidence=0.9)]
+        tracker.update(cards, [])
+        tracker.update(cards, [])
+        assert tracker.composition.counts[3] == 3
+        tracker.reset()
+        assert tracker.composition.counts[3] == 4
+
+
+class TestAddCard:
+    def test_soft_and_hard(self):
+        assert add_card(0, False, 11) == (11, True)
+        assert add_card(11, True, 11) == (12, True)
+        assert add_card(17, True, 9) == (16, False)
+        assert add_card(15, False, 11) == (16, False)
+
+
+class TestSolver:
+    def test_dealer_distribution_sums_to_one(self):
+        solver = StrategySolver()
+        for upcard in range(2, 12):
+            assert sum(solver.dealer_distribution(tuple(full_shoe(6)), upcard)) == pytest.approx(1.0)
+
+    def test_dealer_bust_rate_vs_6(self):
+        bust = StrategySolver().dealer_distribution(tuple(full_shoe(6)), 6)[5]
+        assert bust == pytest.approx(0.423, abs=0.005)
+
+    def test_hit_soft_17_changes_outcomes(self):
+        deck = tuple(full_shoe(6))
+        stand = StrategySolver().dealer_distribution(deck, 6)
+        hit = StrategySolver(hit_soft_17=True).dealer_distribution(deck, 6)
+        assert hit[0] < stand[0]
+        assert hit[5] > stand[5]
+
+    def test_matches_basic_strategy_on_clear_hands(self):
+        solver = StrategySolver()
+        assert solver.best_action(shoe_after('5', '6', '6'), ['5', '6'], '6') == 'D'
+        assert solver.best_action(shoe_after('10', '10', '6'), ['10', '10'], '6') == 'S'
+        assert solver.best_action(shoe_after('8', '8', 'K'), ['8', '8'], 'K') == 'SP'
+        assert solver.best_action(shoe_after('A', 'A', '9'), ['A', 'A'], '9') == 'SP'
+        assert solver.best_action(shoe_after('10', '2', '7'), ['10', '2'], '7') == 'H'
+        assert solver.best_action(shoe_after('10', '3', '4', '6'), ['10', '3', '4'], '6') == 'S'
+
+    def test_composition_changes_decision(self):
+        """16 vs 10 stands once the small cards are gone."""
+        solver = StrategySolver()
+        assert solver.best_action(shoe_after('10', '6', '10', decks=1), ['10', '6'], '10') == 'H'
+        small = ['2', '3', '4', '5'] * 4
+        assert solver.best_action(shoe_after('10', '6', '10', *small, decks=1), ['10', '6'], '10') == 'S'
+
+    def test_multi_card_hand_cannot_double(self):
+        evs = StrategySolver().evaluate(shoe_after('2', '3', '6', '6'), ['2', '3', '6'], '6')
+        assert set(evs) == {'H', 'S'}
+
+    def test_bust_hand(self):
+        assert StrategySolver().best_action(shoe_after('10', '8', '5', '6'), ['10', '8', '5'], '6') is None
+
+    def test_results_cached(self):
+        solver = StrategySolver()
+        deck = shoe_after('10', '6', '7')
+        first = solver.evaluate(deck, ['10', '6'], '7')
+        misses = solver.misses
+        assert solver.evaluate(deck, ['10', '6'], '7') == first
+        assert solver.misses == misses
+        assert solver.hits >= 1
+
+    def test_cache_bounded(self):
+        solver = StrategySolver(cache_size=2)
+        for upcard in ('2', '3', '4', '5'):
+            solver.evaluate(tuple(full_shoe(1)), ['10', '6'], upcard)
+        stats = solver.stats()
+        assert stats["dealer_entries"] == 2
+        assert stats["decision_entries"] == 2
@@ -0,0 +1,145 @@
+"""
+Tests for the precomputed basic strategy tables
+"""
+
+from itertools import combinations_with_replacement
+
+import pytest
+from strategy import (
+    RANK_VALUES, STRATEGY_TABLE, build_strategy_table, get_strategy, hand_signature, hand_total, recommend,
+)
+
+# One rank per card value; suits and face cards do not change a decision
+VALUE_RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+
+
+def live_hands(max_cards=8):
+    """Every non-bust hand of one to max_cards cards, by card values."""
+    for n in range(1, max_cards + 1):
+        for hand in combinations_with_replacement(VALUE_RANKS, n):
+            if hand_total(hand)[0] <= 21:
+                yield list(hand)
+
+
+class TestStrategyTable:
+    """Test the flat strategy lookup table."""
+
+    def test_table_built_once(self):
+        """Rebuilding the table yields the module-level table."""
+        assert build_strategy_table() == STRATEGY_TABLE
+
+    def test_every_two_card_hand_has_action(self):
+        """Every combination of two player cards and an upcard resolves."""
+        for d in RANK_VALUES:
+            for p1 in RANK_VALUES:
+                for p2 in RANK_VALUES:
+                    total = RANK_VALUES[p1] + RANK_VALUES[p2]
+                    if total == 22:
+                        total = 12
+                    assert get_strategy(d, p1, p2, total) in {'H', 'S', 'D', 'SP'}
+
+
+class TestGetStrategy:
+    """Test individual basic strategy decisions."""
+
+    def test_hard_totals(self):
+        """Test hard total lookups."""
+        assert get_strategy('6', '10', '6', 16) == 'S'
+        assert get_strategy('7', '10', '6', 16) == 'H'
+        assert get_strategy('6', '6', '5', 11) == 'D'
+        assert get_strategy('3', '10', '2', 12) == 'H'
+
+    def test_soft_totals(self):
+        """Test soft total lookups with the ace in either position."""
+        assert get_strategy('5', 'A', '2', 13) == 'D'
+        assert get_strategy('5', '2', 'A', 13) == 'D'
+        assert get_strategy('8', 'A', '7', 18) == 'S'
+        assert get_strategy('9', 'A', '7', 18) == 'H'
+
+    def test_pairs(self):
+        """Test pair lookups, including face cards as ten-value pairs."""
+        assert get_strategy('K', '8', '8', 16) == 'SP'
+        assert get_strategy('A', 'A', 'A', 12) == 'SP'
+        assert get_strategy('6', 'K', 'Q', 20) == 'S'
+        assert get_strategy('7', '9', '9', 18) == 'S'
+
+    def test_blackjack_stands(self):
+        """Ace and a ten-value card stands instead of failing the lookup."""
+        assert get_strategy('10', 'A', 'K', 21) == 'S'
+
+    def test_unknown_rank(self):
+        """Unknown ranks raise KeyError."""
+        with pytest.raises(KeyError):
+            get_strategy('X', '2', '3', 5)
+
+
+class TestFullHand:
+    """Test recommendations for hands of any size."""
+
+    def test_every_hand_state_has_action(self):
+        """Every live hand against every upcard resolves to a legal action."""
+        for hand in live_hands():
+            for d in VALUE_RANKS:
+                action = recommend(d, hand)
+                if len(hand) == 2:
+                    assert action in {'H', 'S', 'D', 'SP'}
+                else:
+                    assert action in {'H', 'S'}
+                pair = len(hand) == 2 and RANK_VALUES[hand[0]] == RANK_VALUES[hand[1]]
+                for can_double, can_split in ((False, True), (True, False), (False, False)):
+                    restricted = recommend(d, hand, can_double, can_split)
+                    legal = {'H', 'S'}
+                    if can_double and len(hand) == 2:
+                        legal.add('D')
+                    if can_split and pair:
+                        legal.add('SP')
+                    assert restricted in legal
+                    if can_split and action == 'SP':
+                        assert restricted == 'SP'  # splitting does not depend on doubling
+
+    def test_two_card_hands_match_get_strategy(self):
+        """Two-card hands agree with the legacy two-card lookup."""
+        for p1 in RANK_VALUES:
+            for p2 in RANK_VALUES:
+                for d in RANK_VALUES:
+                    total = hand_total([p1, p2])[0]
+                    assert recommend(d, [p1, p2]) == get_strategy(d, p1, p2, total)
+
+    def test_hard_17_and_up_stands(self):
+        """Hard 17 or more stands, however many cards, unless it is a pair to split."""
+        for hand in live_hands():
+            total, soft = hand_total(hand)
+            if total >= 17 and not soft and hand != ['9', '9']:
+                assert all(recommend(d, hand) == 'S' for d in VALUE_RANKS)
+
+    def test_hits_after_first_two_cards(self):
+        """Hands that cannot double hit or stand instead."""
+        assert recommend('6', ['2', '3', '6']) == 'H'  # hard 11
+        assert recommend('6', ['2', '3', '7']) == 'S'  # hard 12 vs 6
+        assert recommend('7', ['2', '3', '7']) == 'H'
+        assert recommend('5', ['A', '2', '2']) == 'H'  # soft 15
+        assert recommend('5', ['A', '3', '4']) == 'S'  # soft 18
+        assert recommend('9', ['A', '3', '4']) == 'H'
+        assert recommend('6', ['A', '4', '4']) == 'S'  # soft 19 vs 6
+
+    def test_soft_hand_becomes_hard(self):
+        """An ace drops to 1 once the hand would bust."""
+        assert hand_signature(['A', '6', '9']) == (3, 16)
+        assert recommend('10', ['A', '6', '9']) == 'H'
+        assert recommend('5', ['A', '6', '9']) == 'S'
+
+    def test_split_hands(self):
+        """A split hand waiting for its second card hits; no-DAS and resplit limits apply."""
+        assert recommend('6', ['8']) == 'H'
+        assert recommend('6', ['A']) == 'H'
+        assert recommend('6', ['8', '8'], can_split=False) == 'S'
+        assert recommend('6', ['A', 'A'], can_split=False) == 'H'
+        assert recommend('6', ['5', '6'], can_double=False) == 'H'
+        assert recommend('6', ['8', '8'], can_double=False) == 'SP'
+        assert recommend('6', ['A', 'A'], can_double=False) == 'SP'
+        assert recommend('6', ['5', '5'], can_double=False) == 'H'  # hard 10 without the double
+        assert recommend('6', ['10', '10'], can_double=False) == 'S'
+
+    def test_bust_hand(self):
+        """A bust hand has no recommendation."""
+        assert recommend('6', ['10', '8', '5']) is None
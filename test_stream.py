@@ -0,0 +1,162 @@
+"""
+Tests for the MJPEG stream consumer, against a local stand-in for the camera
+"""
+
+import asyncio
+
+import pytest
+
+from stream import DEFAULT_BOUNDARY, LatestFrame, MJPEGParser, StreamConsumer, parse_boundary
+
+
+def part(body, boundary=DEFAULT_BOUNDARY, sized=True):
+    """One part as the firmware's stream handler writes it."""
+    headers = b"Content-Type: image/jpeg\r\n"
+    if sized:
+        headers += b"Content-Length: %d\r\n" % len(body)
+    headers += b"X-Timestamp: 12.000345\r\n\r\n"
+    return b"\r\n--" + boundary.encode() + b"\r\n" + headers + body
+
+
+FRAMES = [b"\xff\xd8first" * 50, b"\xff\xd8second\r\n--fake", b"\xff\xd8" + bytes(range(256)) * 4]
+
+
+class TestParser:
+    """Test incremental multipart parsing."""
+
+    @pytest.mark.parametrize("step", [1, 2, 5, 64, 100000])
+    def test_frames_split_across_chunks(self, step):
+        """Test any chunking of the stream yields the same frames."""
+        stream = b"".join(part(frame) for frame in FRAMES)
+        parser = MJPEGParser()
+        frames = []
+        for i in range(0, len(stream), step):
+            frames += parser.feed(stream[i:i + step])
+        assert [bytes(frame) for frame in frames] == FRAMES
+
+    def test_parts_without_content_length(self):
+        """Test unsized parts end at the next boundary."""
+        stream = part(b"one", sized=False) + part(b"two", sized=False) + part(b"three")
+        parser = MJPEGParser()
+        assert [bytes(frame) for frame in parser.feed(stream)] == [b"one", b"two", b"three"]
+
+    def test_leading_garbage_skipped(self):
+        """Test bytes before the first boundary are ignored."""
+        parser = MJPEGParser()
+        assert [bytes(f) for f in parser.feed(b"junk" * 100 + part(b"frame"))] == [b"frame"]
+
+    def test_parse_boundary(self):
+        """Test the boundary is read from the Content-Type header."""
+        assert parse_boundary("multipart/x-mixed-replace;boundary=abc") == "abc"
+        assert parse_boundary('multipart/x-mixed-replace; boundary="--abc"') == "abc"
+        assert parse_boundary("image/jpeg") is None
+
+
+class TestLatestFrame:
+    """Test the newest-frame-wins slot."""
+
+    def test_put_replaces_untaken_frame(self):
+        async def scenario():
+            slot = LatestFrame()
+            slot.put(1)
+            slot.put(2)
+            slot.put(3)
+            return await slot.take(), slot.dropped
+
+        assert asyncio.run(scenario()) == (3, 2)
+
+
+async def serve_mjpeg(frame_count, interval):
+    """Stand-in camera: serves frame_count numbered parts, then closes."""
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: multipart/x-mixed-replace;boundary=" + DEFAULT_BOUNDARY.encode() + b"\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        for i in range(frame_count):
+            writer.write(part(b"frame-%03d" % i))
+            await writer.drain()
+            await asyncio.sleep(interval)
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/stream"
+
+
+class TestStreamConsumer:
+    """Test pulling a live stream."""
+
+    def test_slow_analysis_gets_newest_frames(self):
+        """Test frames arriving during analysis are dropped, not queued."""
+        async def scenario():
+            server, url = await serve_mjpeg(frame_count=40, interval=0.005)
+            analyzed = []
+
+            async def handler(frame):
+                analyzed.append(bytes(frame))
+                await asyncio.sleep(0.05)
+                return len(analyzed)
+
+            consumer = StreamConsumer(url, handler, fps=0, reconnect_delay=10)
+            consumer.start()
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                if consumer.frames_received == 40 and not consumer.connected:
+                    break
+            await asyncio.sleep(0.1)
+            await consumer.close()
+            server.close()
+            await server.wait_closed()
+            return consumer, analyzed
+
+        consumer, analyzed = asyncio.run(scenario())
+        stats = consumer.stats()
+        assert stats["frames_received"] == 40
+        assert stats["frames_dropped"] > 0
+        assert stats["frames_analyzed"] == len(analyzed) < 40
+        assert analyzed[-1] == b"frame-039"
+        assert analyzed == sorted(analyzed)
+        assert consumer.last_result == len(analyzed)
+
+    def test_rate_limited(self):
+        """Test the handler runs at most fps times a second."""
+        async def scenario():
+            server, url = await serve_mjpeg(frame_count=60, interval=0.005)
+            calls = []
+
+            async def handler(frame):
+                calls.append(frame)
+
+            consumer = StreamConsumer(url, handler, fps=10, reconnect_delay=10)
+            consumer.start()
+            await asyncio.sleep(0.35)
+            await consumer.close()
+            server.close()
+            await server.wait_closed()
+            return calls
+
+        assert 2 <= len(asyncio.run(scenario())) <= 5
+
+    def test_unreachable_stream_counts_errors(self):
+        """Test connection failures are retried, not raised."""
+        async def scenario():
+            server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            server.close()
+            await server.wait_closed()
+
+            async def handler(frame):
+                pass
+
+            consumer = StreamConsumer(f"http://127.0.0.1:{port}/stream", handler, reconnect_delay=0.01)
+            consumer.start()
+            await asyncio.sleep(0.1)
+            await consumer.close()
+            return consumer.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["errors"] >= 1
+        assert stats["connected"] is False